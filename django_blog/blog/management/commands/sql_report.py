@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from django_blog import profiling
+
+
+class Command(BaseCommand):
+    help = "Show the views and duplicated queries costing the most database time in profiled requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help="Rows per section (default: 10)"
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help="Print the report as JSON"
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help="Discard the collected samples after reporting"
+        )
+
+    def handle(self, *args, **options):
+        report = profiling.summarize(profiling.collect(), options['limit'])
+        if options['reset']:
+            profiling.reset()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        if not report['requests']:
+            self.stdout.write("No profiled requests yet; set SQL_PROFILING_SAMPLE_RATE above 0")
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Top views by database time ({report['requests']} requests)"))
+        for view in report['views']:
+            self.stdout.write(
+                f"{view['db_ms']:>10.1f}ms  {view['requests']:>6} req  {view['avg_queries']:>6.1f} q/req  "
+                f"{view['avg_db_ms']:>8.1f}ms/req  {view['view']}"
+            )
+        self.stdout.write(self.style.MIGRATE_HEADING("Top duplicated queries (likely N+1)"))
+        if not report['duplicates']:
+            self.stdout.write("None")
+        for entry in report['duplicates']:
+            self.stdout.write(f"{entry['executions']:>10} runs  {entry['requests']:>6} req  {entry['view']}")
+            self.stdout.write(f"    {entry['sql'][:300]}")
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_index(apps, schema_editor):
+    from collections import Counter
+
+    from blog.search import BATCH_SIZE, CONTENT_WEIGHT, TAG_WEIGHT, TITLE_WEIGHT, tokenize
+
+    Post = apps.get_model('blog', 'Post')
+    PostSearchTerm = apps.get_model('blog', 'PostSearchTerm')
+    rows = []
+    for post in Post.objects.prefetch_related('tags').iterator(chunk_size=BATCH_SIZE):
+        scores = Counter()
+        for tag in post.tags.all():
+            for term in tokenize(tag.name):
+                scores[term] += TAG_WEIGHT
+        for term in tokenize(post.title):
+            scores[term] += TITLE_WEIGHT
+        for term in tokenize(post.content):
+            scores[term] += CONTENT_WEIGHT
+        rows.extend(PostSearchTerm(term=term, post_id=post.pk, score=score) for term, score in scores.items())
+    PostSearchTerm.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_alter_post_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('score', models.PositiveIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.post')),
+            ],
+            options={
+                'unique_together': {('term', 'post')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
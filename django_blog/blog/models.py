@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_save
 from django.urls import reverse
 from django.utils import timezone
 from taggit.managers import TaggableManager
@@ -44,6 +44,35 @@ class Comment(models.Model):
 		return f"Comment by {self.author} on {self.post}"
 
 
+class PostSearchTerm(models.Model):
+	"""Inverted index row: one per (term, post), scored by weighted term frequency (see search.py)"""
+	term = models.CharField(max_length=64)
+	post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+	score = models.PositiveIntegerField()
+
+	class Meta:
+		unique_together = ("term", "post")
+
+	def __str__(self):
+		return f"{self.term!r} in post {self.post_id}"
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, **kwargs):
+	from . import search
+
+	search.index_post(instance)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_search_index_on_tags(sender, instance, action, **kwargs):
+	# taggit sends m2m_changed for the post whose tags changed
+	if isinstance(instance, Post) and action in ("post_add", "post_remove", "post_clear"):
+		from . import search
+
+		search.index_post(instance)
+
+
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
 	if created:
@@ -0,0 +1,158 @@
+"""
+Full-text search over blog posts.
+
+Posts are indexed into PostSearchTerm, an inverted index holding one row per
+(term, post) with a weighted term frequency: tags and title count more than
+the body. A search is an indexed lookup on the query terms instead of
+icontains scans over title, content and tags, results are ranked by summed
+score, and snippets are cut from the content with matches highlighted.
+
+index_post() refreshes a single post and is called from the post_save and
+tag-change receivers in models.py; rebuild() reindexes everything.
+
+The tokenizer and snippet rules match social_media_api's posts/search.py so
+both sites find the same words, but the projects are deployed separately and
+share no package; tests.py pins the behaviour here.
+"""
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.utils.html import escape
+
+from .models import Post, PostSearchTerm
+
+TAG_WEIGHT = 4
+TITLE_WEIGHT = 4
+CONTENT_WEIGHT = 1
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 16
+SNIPPET_WORDS = 30
+BATCH_SIZE = 1000
+
+TOKEN_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have he her his i if in into is it its '
+    'me my no not of on or our she so such that the their them then there these they '
+    'this to was we were will with you your'.split()
+)
+
+
+def normalize(token):
+    """Lowercase and strip a plural 's' so 'posts' finds 'post'"""
+    token = token.lower()
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Normalized index terms of text, in order, without stop words"""
+    terms = []
+    for token in TOKEN_RE.findall(text or ''):
+        term = normalize(token)
+        if term not in STOP_WORDS and len(term) <= MAX_TERM_LENGTH:
+            terms.append(term)
+    return terms
+
+
+def weighted_terms(post):
+    """Term -> score for one post"""
+    scores = Counter()
+    for tag in post.tags.all():
+        for term in tokenize(tag.name):
+            scores[term] += TAG_WEIGHT
+    for term in tokenize(post.title):
+        scores[term] += TITLE_WEIGHT
+    for term in tokenize(post.content):
+        scores[term] += CONTENT_WEIGHT
+    return scores
+
+
+def index_posts(posts):
+    """Replace the index rows of the given posts"""
+    posts = list(posts)
+    if not posts:
+        return
+    rows = [
+        PostSearchTerm(term=term, post_id=post.pk, score=score)
+        for post in posts
+        for term, score in weighted_terms(post).items()
+    ]
+    with transaction.atomic():
+        PostSearchTerm.objects.filter(post_id__in=[post.pk for post in posts]).delete()
+        PostSearchTerm.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def index_post(post):
+    index_posts([post])
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Reindex every post in pk order; returns the number of posts indexed"""
+    total, last_pk = 0, 0
+    while True:
+        batch = list(Post.objects.filter(pk__gt=last_pk).order_by('pk').prefetch_related('tags')[:batch_size])
+        if not batch:
+            return total
+        index_posts(batch)
+        total += len(batch)
+        last_pk = batch[-1].pk
+
+
+def query_terms(query):
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def search(queryset, query):
+    """
+    Posts of queryset containing every term of query, best match first,
+    each annotated with its `rank`.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    hits = (
+        PostSearchTerm.objects.filter(term__in=terms)
+        .values('post_id')
+        .annotate(matched=Count('term'))
+        .filter(matched=len(terms))
+        .values('post_id')
+    )
+    scores = (
+        PostSearchTerm.objects.filter(post_id=OuterRef('pk'), term__in=terms)
+        .values('post_id')
+        .annotate(total=Sum('score'))
+        .values('total')
+    )
+    return (
+        queryset.filter(pk__in=hits)
+        .annotate(rank=Subquery(scores, output_field=IntegerField()))
+        .order_by('-rank', '-created_at', '-id')
+    )
+
+
+def snippet(text, query, words=SNIPPET_WORDS):
+    """
+    HTML-safe excerpt of text: a window of `words` words starting just before
+    the first match, with matches wrapped in <mark>.
+    """
+    terms = set(query_terms(query))
+    tokens = list(TOKEN_RE.finditer(text or ''))
+    if not tokens:
+        return ''
+    first = next((i for i, token in enumerate(tokens) if normalize(token.group()) in terms), 0)
+    start = max(first - 3, 0)
+    window = tokens[start:start + words]
+
+    parts = []
+    position = window[0].start()
+    for token in window:
+        parts.append(escape(text[position:token.start()]))
+        if normalize(token.group()) in terms:
+            parts.append(f'<mark>{escape(token.group())}</mark>')
+        else:
+            parts.append(escape(token.group()))
+        position = token.end()
+    return ''.join(parts)
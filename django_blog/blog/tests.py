@@ -1,3 +1,105 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_blog import profiling
+from . import search
+from .models import Post, PostSearchTerm
+
+
+class SearchTestCase(TestCase):
+    """Test cases for the inverted-index post search"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='pass123')
+        self.title_hit = Post.objects.create(author=self.user, title='Django tips', content='Small things')
+        self.content_hit = Post.objects.create(
+            author=self.user, title='Weekend', content='Notes on <b>Django</b> templates and posts'
+        )
+        self.miss = Post.objects.create(author=self.user, title='Python', content='Generators')
+
+    def test_tokenize(self):
+        """Test terms are lowercased, singularized and stripped of stop words"""
+        self.assertEqual(search.tokenize('The Posts of a class'), ['post', 'class'])
+
+    def test_index_follows_saves_and_tags(self):
+        """Test editing a post or its tags replaces its index terms"""
+        self.miss.content = 'Decorators'
+        self.miss.save()
+        self.miss.tags.add('functional')
+        terms = set(PostSearchTerm.objects.filter(post=self.miss).values_list('term', flat=True))
+        self.assertEqual(terms, {'python', 'decorator', 'functional'})
+
+    def test_search_ranks_and_requires_every_term(self):
+        """Test title matches rank first and every query word must match"""
+        found = search.search(Post.objects.all(), 'django')
+        self.assertEqual(list(found), [self.title_hit, self.content_hit])
+        self.assertEqual(list(search.search(Post.objects.all(), 'django templates')), [self.content_hit])
+        self.assertFalse(search.search(Post.objects.all(), 'the').exists())
+
+    def test_search_view(self):
+        """Test /search/ renders highlighted, escaped snippets without LIKE scans"""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('blog:search_results'), {'query': 'django'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['posts']), [self.title_hit, self.content_hit])
+        self.assertContains(response, '&lt;b&gt;<mark>Django</mark>&lt;/b&gt;')
+        self.assertFalse(any(' LIKE ' in query['sql'] for query in captured.captured_queries))
+
+    def test_posts_by_tag_view(self):
+        """Test /tags/<slug>/ lists the posts carrying the tag"""
+        self.content_hit.tags.add('django')
+        response = self.client.get(reverse('blog:posts_by_tag', args=['django']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['posts']), [self.content_hit])
+
+
+@override_settings(SQL_PROFILING_SAMPLE_RATE=1, SQL_PROFILING_CACHE_ALIAS='default')
+class SQLProfilingTestCase(TestCase):
+    """Test cases for the sampled SQL profiling middleware"""
+
+    def setUp(self):
+        profiling.reset()
+        self.user = User.objects.create_user(username='profiled', password='pass123')
+        Post.objects.create(author=self.user, title='Profiled', content='Body')
+
+    def test_server_timing_header(self):
+        """Test profiled pages report database and template time"""
+        response = self.client.get(reverse('blog:search_results'), {'query': 'profiled'})
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries, \d+ duplicated", render;dur=[\d.]+, app;dur=')
+        [sample] = profiling.REPORT.snapshot()
+        self.assertEqual(sample['view'], 'blog:search_results')
+        self.assertGreater(sample['queries'], 0)
+
+    @override_settings(SQL_PROFILING_SAMPLE_RATE=0)
+    def test_disabled_profiling_installs_nothing(self):
+        """Test a zero sample rate leaves the middleware out entirely"""
+        with patch.object(profiling, 'install_query_hooks') as install:
+            with self.assertRaises(MiddlewareNotUsed):
+                profiling.SQLProfilingMiddleware(lambda request: None)
+        install.assert_not_called()
+        response = self.client.get(reverse('blog:search_results'), {'query': 'profiled'})
+        self.assertNotIn('Server-Timing', response)
+
+    def test_processes_flush_to_separate_slots(self):
+        """Test each process claims its own slot and the report merges them"""
+        with patch.object(profiling.os, 'getpid', return_value=101):
+            profiling.flush([{'view': 'a'}])
+        with patch.object(profiling.os, 'getpid', return_value=102):
+            profiling.flush([{'view': 'b'}])
+        self.assertNotEqual(profiling._slots[101], profiling._slots[102])
+        self.assertEqual(sorted(sample['view'] for sample in profiling.collect()), ['a', 'b'])
+
+    def test_sql_report_command(self):
+        """Test the report lists profiled views"""
+        self.client.get(reverse('blog:search_results'), {'query': 'profiled'})
+        out = StringIO()
+        call_command('sql_report', stdout=out)
+        self.assertIn('blog:search_results', out.getvalue())
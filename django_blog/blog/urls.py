@@ -17,6 +17,9 @@ urlpatterns = [
     path("comment/<int:pk>/update/", views.CommentUpdateView.as_view(), name="comment_update"),
     path("comment/<int:pk>/delete/", views.CommentDeleteView.as_view(), name="comment_delete"),
 
+    # Search
+    path("search/", views.SearchResultsView.as_view(), name="search_results"),
+
     # Posts by tag
-    path("tags/<str:tag_name>/", views.PostByTagListView.as_view(), name="posts_by_tag"),
+    path("tags/<slug:tag_slug>/", views.TaggedPostListView.as_view(), name="posts_by_tag"),
 ]
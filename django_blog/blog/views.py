@@ -49,7 +49,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from .models import Post, Comment
 from .forms import PostForm, CommentForm
-from django.db.models import Q
+from . import search
 from taggit.models import Tag
 
 
@@ -135,14 +135,19 @@ class SearchResultsView(ListView):
     model = Post
     template_name = 'blog/search_results.html'
     context_object_name = 'posts'
+    paginate_by = 10
 
     def get_queryset(self):
-        query = self.request.GET.get('query')
-        if query:
-            return Post.objects.filter(
-                Q(title__icontains=query) | Q(content__icontains=query) | Q(tags__name__icontains=query)
-            ).distinct()
-        return Post.objects.none()
+        # ranked lookup on the inverted index instead of icontains scans
+        self.query = self.request.GET.get('query', '').strip()
+        return search.search(Post.objects.all(), self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        for post in context['posts']:
+            post.snippet = search.snippet(post.content, self.query)
+        return context
     
 class TaggedPostListView(ListView):
     model = Post
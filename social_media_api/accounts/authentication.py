@@ -0,0 +1,183 @@
+"""
+Token authentication without a database lookup per request.
+
+DRF's TokenAuthentication selects the Token and its user on every request.
+CachedTokenAuthentication looks the key up in two tiers first:
+
+- a bounded in-process LRU, entries living TOKEN_AUTH_LOCAL_TTL seconds;
+- optionally a shared cache (TOKEN_AUTH_CACHE_ALIAS, Redis in production),
+  entries living TOKEN_AUTH_CACHE_TTL seconds.
+
+Only a miss in both reaches the database. Deleting or replacing a token
+(logout, rotation) and saving its user (password change, deactivation)
+forget the key in the shared cache and this process's LRU straight away;
+other processes' LRUs drop it within TOKEN_AUTH_LOCAL_TTL, so keep that short.
+
+JWTAuthentication accepts the access tokens issued with AUTH_MODE = 'jwt'
+(see tokens.py): `Authorization: Bearer <access token>`. It loads the user
+and the token's revocation state in one query.
+
+Settings:
+    TOKEN_AUTH_LOCAL_SIZE  - LRU capacity per process, 0 disables it (default 10000)
+    TOKEN_AUTH_LOCAL_TTL   - LRU entry lifetime in seconds (default 30)
+    TOKEN_AUTH_CACHE_ALIAS - entry in CACHES for the shared tier, None disables it (default None)
+    TOKEN_AUTH_CACHE_TTL   - shared entry lifetime in seconds (default 300)
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+
+from . import tokens
+
+KEY_PREFIX = 'auth-token'
+
+
+def setting(name, default):
+    return getattr(settings, f'TOKEN_AUTH_{name}', default)
+
+
+class LRUCache:
+    """Size-bounded mapping with per-entry expiry, safe to share between threads"""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        with self.lock:
+            for key in [key for key, (value, _) in self.entries.items() if predicate(value)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+LOCAL = LRUCache(setting('LOCAL_SIZE', 10000), setting('LOCAL_TTL', 30))
+
+
+def get_shared_cache():
+    alias = setting('CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def token_key(key):
+    return f'{KEY_PREFIX}:key:{key}'
+
+
+def user_key(user_id):
+    return f'{KEY_PREFIX}:user:{user_id}'
+
+
+def remember(token):
+    """Cache a token with its user loaded"""
+    LOCAL.set(token.key, token)
+    shared = get_shared_cache()
+    if shared is not None:
+        ttl = setting('CACHE_TTL', 300)
+        shared.set_many({token_key(token.key): token, user_key(token.user_id): token.key}, ttl)
+
+
+def forget_token(key):
+    """Drop one token key from both tiers, now and again after commit"""
+    def drop():
+        LOCAL.delete(key)
+        shared = get_shared_cache()
+        if shared is not None:
+            shared.delete(token_key(key))
+
+    drop()
+    transaction.on_commit(drop)
+
+
+def forget_user(user_id):
+    """Drop whatever token of user_id is cached, e.g. after the user changed"""
+    def drop():
+        LOCAL.delete_where(lambda token: token.user_id == user_id)
+        shared = get_shared_cache()
+        if shared is not None:
+            key = shared.get(user_key(user_id))
+            if key is not None:
+                shared.delete_many([token_key(key), user_key(user_id)])
+
+    drop()
+    transaction.on_commit(drop)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in for TokenAuthentication that serves known keys from cache"""
+
+    def authenticate_credentials(self, key):
+        token = LOCAL.get(key)
+        if token is None:
+            shared = get_shared_cache()
+            token = shared.get(token_key(key)) if shared is not None else None
+            if token is not None:
+                LOCAL.set(key, token)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            remember(token)
+
+        # cached instances are shared between requests, so hand out a copy
+        user = copy.copy(token.user)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, token)
+
+
+class JWTAuthentication(BaseAuthentication):
+    """Authenticate `Bearer` access tokens without a Token table lookup"""
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            return tokens.decode(auth[1].decode(), tokens.ACCESS)
+        except (tokens.InvalidToken, UnicodeError) as e:
+            raise exceptions.AuthenticationFailed(str(e))
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,218 @@
+"""
+Cached follow graph.
+
+Each user's following ids and follower ids are kept in the cache as sorted
+array('q') values, 8 bytes per edge, so membership is a bisect and counts
+are a len() without touching the accounts_customuser_followers table. A
+missing entry is loaded from the database on first use, together with every
+other miss of the same call, in one query per direction.
+
+Entries are versioned rather than edited: each user has a version counter,
+and their entries are stored under the version read before the database was
+queried. Follow/unfollow (through m2m_changed) bump both endpoints' versions
+with cache.incr once the transaction commits, so readers reload from the
+database. A rolled-back follow never reaches the cache, and an entry loaded
+from pre-commit rows is left behind under the old version instead of
+overwriting the new state. Within the changing transaction itself, lookups
+still see the committed graph. Entries live FOLLOW_GRAPH_TIMEOUT seconds;
+`manage.py rebuild_follow_graph` reloads everything from the database.
+
+Only a cache shared by every process keeps the versions consistent, so with
+FOLLOW_GRAPH_CACHE_ALIAS = None (per-process memory) every lookup reads the
+database instead.
+
+Settings:
+    FOLLOW_GRAPH_CACHE_ALIAS - entry in CACHES to use, None disables caching (default 'default')
+    FOLLOW_GRAPH_TIMEOUT     - seconds an entry lives (default 24 hours)
+"""
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+KEY_PREFIX = 'follow-graph'
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+BATCH_SIZE = 1000
+
+
+def setting(name, default):
+    return getattr(settings, f'FOLLOW_GRAPH_{name}', default)
+
+
+def timeout():
+    return setting('TIMEOUT', 24 * 60 * 60)
+
+
+def get_cache():
+    alias = setting('CACHE_ALIAS', 'default')
+    return caches[alias] if alias else None
+
+
+def version_key(user_id):
+    return f'{KEY_PREFIX}:version:{user_id}'
+
+
+def graph_key(direction, user_id, version):
+    return f'{KEY_PREFIX}:{direction}:{user_id}:{version}'
+
+
+def versions(cache, user_ids):
+    """{user_id: current version}, starting missing counters at a fresh value"""
+    keys = {version_key(user_id): user_id for user_id in user_ids}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # never 1, so an evicted counter cannot resurrect entries stored under an old version
+        fresh = time.time_ns()
+        for key in missing:
+            cache.add(key, fresh, None)
+        found.update(cache.get_many(missing))
+    return {user_id: found.get(key, 0) for key, user_id in keys.items()}
+
+
+def contains(ids, user_id):
+    """Whether the sorted array ids holds user_id"""
+    i = bisect_left(ids, user_id)
+    return i < len(ids) and ids[i] == user_id
+
+
+def query(direction, user_ids):
+    """{user_id: sorted array of ids} for direction, read from the through table"""
+    from .models import CustomUser
+
+    Follow = CustomUser.followers.through
+    # a row (from=A, to=B) means B follows A
+    if direction == FOLLOWING:
+        owner, other = 'to_customuser_id', 'from_customuser_id'
+    else:
+        owner, other = 'from_customuser_id', 'to_customuser_id'
+    user_ids = list(user_ids)
+    result = {user_id: array('q') for user_id in user_ids}
+    # BATCH_SIZE owners per statement, so no query carries an unbounded id list
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        edges = (
+            Follow.objects.filter(**{f'{owner}__in': user_ids[start:start + BATCH_SIZE]})
+            .order_by(owner, other).values_list(owner, other)
+        )
+        for owner_id, other_id in edges:
+            result[owner_id].append(other_id)
+    return result
+
+
+def load(direction, user_ids):
+    """{user_id: sorted array of ids} for direction, loading misses from the database"""
+    user_ids = list(dict.fromkeys(user_ids))
+    cache = get_cache()
+    if cache is None:
+        return query(direction, user_ids)
+    # read the versions before the rows, so a change committed in between bumps past what we store
+    current = versions(cache, user_ids)
+    keys = {user_id: graph_key(direction, user_id, current[user_id]) for user_id in user_ids}
+    found = cache.get_many(list(keys.values()))
+    result = {}
+    missing = []
+    for user_id in user_ids:
+        ids = found.get(keys[user_id])
+        if ids is None:
+            missing.append(user_id)
+        else:
+            result[user_id] = ids
+    if missing:
+        loaded = query(direction, missing)
+        cache.set_many({keys[user_id]: ids for user_id, ids in loaded.items()}, timeout())
+        result.update(loaded)
+    return result
+
+
+def following_ids(user_id):
+    """Sorted array of the ids user_id follows"""
+    return load(FOLLOWING, [user_id])[user_id]
+
+
+def follower_ids(user_id):
+    """Sorted array of the ids following user_id"""
+    return load(FOLLOWERS, [user_id])[user_id]
+
+
+def is_following(follower_id, followee_id):
+    return contains(following_ids(follower_id), followee_id)
+
+
+def following_count(user_id):
+    return len(following_ids(user_id))
+
+
+def follower_count(user_id):
+    return len(follower_ids(user_id))
+
+
+def bump(user_ids):
+    """Move each user's entries to a new version, so the next lookup reloads them"""
+    cache = get_cache()
+    if cache is None:
+        return
+    for user_id in user_ids:
+        try:
+            cache.incr(version_key(user_id))
+        except ValueError:
+            # no counter: the next lookup starts a fresh one
+            pass
+
+
+def forget(user_ids):
+    """Invalidate both entries of each user once the transaction commits"""
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: bump(user_ids))
+
+
+def changed(edges):
+    """Invalidate the entries of both endpoints of (follower_id, followee_id) edges after commit"""
+    forget({user_id for edge in edges for user_id in edge})
+
+
+def forget_neighbourhood(user_id):
+    """Invalidate user_id's entries and those of everyone linked to it, e.g. before its edges are cleared"""
+    neighbours = set(query(FOLLOWING, [user_id])[user_id]) | set(query(FOLLOWERS, [user_id])[user_id])
+    forget([user_id, *neighbours])
+
+
+def rebuild(user_ids=None, batch_size=BATCH_SIZE):
+    """
+    Reload the entries of user_ids, or of every user, from the database.
+    Two queries per batch_size users. Returns the number of users reloaded.
+    """
+    from .models import CustomUser
+
+    cache = get_cache()
+    if cache is None:
+        return 0
+    if user_ids is None:
+        user_ids = CustomUser.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    total = 0
+
+    def reload(batch):
+        current = versions(cache, batch)
+        for direction in (FOLLOWING, FOLLOWERS):
+            cache.set_many(
+                {
+                    graph_key(direction, owner_id, current[owner_id]): ids
+                    for owner_id, ids in query(direction, batch).items()
+                },
+                timeout()
+            )
+
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) == batch_size:
+            reload(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        reload(batch)
+        total += len(batch)
+    return total
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts import graph
+
+
+class Command(BaseCommand):
+    help = "Reload every user's cached following and follower ids from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=graph.BATCH_SIZE,
+            help=f"Number of users reloaded per pair of queries (default: {graph.BATCH_SIZE})"
+        )
+
+    def handle(self, *args, **options):
+        total = graph.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reloaded the follow graph of {total} users"))
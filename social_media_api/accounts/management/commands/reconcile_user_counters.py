@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.models import CustomUser
+from posts.models import Post
+
+Follow = CustomUser.followers.through
+
+# counter field -> (model, column pointing at the counted user); a row (from=A, to=B) means B follows A
+COUNTERS = {
+    'followers_count': (Follow, 'from_customuser'),
+    'following_count': (Follow, 'to_customuser'),
+    'posts_count': (Post, 'author'),
+}
+
+
+def actual_count(model, column):
+    """Correlated subquery counting model rows that point at the outer user"""
+    counts = (
+        model.objects.filter(**{column: OuterRef('pk')})
+        .order_by()
+        .values(column)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute CustomUser.followers_count, following_count and posts_count where they have drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help="Number of user ids covered by each UPDATE (default: 5000)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report drifted users without writing"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        last_id = CustomUser.objects.aggregate(last=Max('pk'))['last'] or 0
+        fixed = dict.fromkeys(COUNTERS, 0)
+
+        for start in range(0, last_id, batch_size):
+            window = CustomUser.objects.filter(pk__gt=start, pk__lte=start + batch_size)
+            with transaction.atomic():
+                for field, (model, column) in COUNTERS.items():
+                    drifted = window.annotate(actual=actual_count(model, column)).exclude(**{field: F('actual')})
+                    if dry_run:
+                        fixed[field] += drifted.count()
+                    else:
+                        ids = list(drifted.values_list('pk', flat=True))
+                        if ids:
+                            fixed[field] += CustomUser.objects.filter(pk__in=ids).update(**{field: actual_count(model, column)})
+
+        verb = "Would fix" if dry_run else "Fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {fixed['followers_count']} follower counters, {fixed['following_count']} following counters "
+            f"and {fixed['posts_count']} post counters"
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from accounts import recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute \"who to follow\" recommendations of users whose follows changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='everyone',
+            help="Recompute every user, also picking up engagement and second-degree changes"
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=recommendations.BATCH_SIZE,
+            help=f"Number of users scored together (default: {recommendations.BATCH_SIZE})"
+        )
+
+    def handle(self, *args, **options):
+        total = recommendations.refresh(everyone=options['everyone'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed recommendations of {total} users"))
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:08
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Follow = CustomUser.followers.through
+    Post = apps.get_model('posts', 'Post')
+    # a row (from=A, to=B) means B follows A
+    for field, model, column in (
+        ('followers_count', Follow, 'from_customuser'),
+        ('following_count', Follow, 'to_customuser'),
+        ('posts_count', Post, 'author'),
+    ):
+        counts = (
+            model.objects.filter(**{column: OuterRef('pk')})
+            .order_by()
+            .values(column)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        CustomUser.objects.update(**{field: Coalesce(Subquery(counts, output_field=IntegerField()), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, help_text='Denormalized number of followers, kept in step by signals'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, help_text='Denormalized number of followed users, kept in step by signals'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, help_text='Denormalized number of posts, kept in step by signals'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_counters'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('mutual_count', models.PositiveIntegerField(help_text='Number of users followed by user who follow the candidate')),
+                ('engagement_count', models.PositiveIntegerField(help_text="Recent likes and comments by user on the candidate's posts")),
+            ],
+            options={
+                'ordering': ['-score', 'candidate'],
+            },
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='recommendations_stale',
+            field=models.BooleanField(default=True, help_text="Whether the user's follow recommendations need recomputing (see accounts/recommendations.py)"),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('recommendations_stale', True)), fields=['id'], name='accounts_user_reco_stale_idx'),
+        ),
+        migrations.AddField(
+            model_name='recommendation',
+            name='candidate',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='recommendation',
+            name='user',
+            field=models.ForeignKey(help_text='The user the candidate is recommended to', on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='recommendation',
+            index=models.Index(fields=['user', '-score', 'candidate'], name='accounts_re_user_id_677f83_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recommendation',
+            unique_together={('user', 'candidate')},
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('jti', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='tokens_revoked_at',
+            field=models.DateTimeField(blank=True, help_text='JWTs issued at or before this time are rejected (see accounts/tokens.py)', null=True),
+        ),
+    ]
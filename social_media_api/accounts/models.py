@@ -1,6 +1,11 @@
 # accounts/models.py
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from social_media_api.caching import invalidate
 
 class CustomUser(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
@@ -11,6 +16,27 @@ class CustomUser(AbstractUser):
         related_name='following',
         blank=True
     )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Denormalized number of followers, kept in step by signals"
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Denormalized number of followed users, kept in step by signals"
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Denormalized number of posts, kept in step by signals"
+    )
+    recommendations_stale = models.BooleanField(
+        default=True,
+        help_text="Whether the user's follow recommendations need recomputing (see accounts/recommendations.py)"
+    )
+    tokens_revoked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="JWTs issued at or before this time are rejected (see accounts/tokens.py)"
+    )
 
     def follow(self, user):
         """Follow another user"""
@@ -23,10 +49,235 @@ class CustomUser(AbstractUser):
         self.following.remove(user)
 
     def is_following(self, user):
-        return self.following.filter(pk=user.pk).exists()
+        from . import graph
+
+        return graph.is_following(self.pk, user.pk)
+
+    def follow_many(self, user_ids):
+        """
+        Follow every user in user_ids with one lookup and one bulk insert.
+        Returns (results, followed_ids) where results maps each requested id to
+        'followed', 'already_following', 'not_found' or 'self'.
+        """
+        Follow = CustomUser.followers.through
+        user_ids = list(dict.fromkeys(user_ids))
+        results = {user_id: 'not_found' for user_id in user_ids}
+        if self.pk in results:
+            results[self.pk] = 'self'
+
+        candidates = [user_id for user_id in user_ids if user_id != self.pk]
+        existing = dict(
+            CustomUser.objects.filter(pk__in=candidates)
+            .annotate(followed=models.Exists(Follow.objects.filter(
+                from_customuser=models.OuterRef('pk'), to_customuser=self
+            )))
+            .values_list('pk', 'followed')
+        )
+        new_ids = set()
+        for user_id, followed in existing.items():
+            results[user_id] = 'already_following' if followed else 'followed'
+            if not followed:
+                new_ids.add(user_id)
+
+        if new_ids:
+            with transaction.atomic():
+                Follow.objects.bulk_create(
+                    [Follow(from_customuser_id=user_id, to_customuser_id=self.pk) for user_id in new_ids],
+                    ignore_conflicts=True
+                )
+                # bulk_create bypasses the related manager, so announce the change like .add() would
+                m2m_changed.send(
+                    sender=Follow, instance=self, action='post_add', reverse=True,
+                    model=CustomUser, pk_set=new_ids, using=self._state.db
+                )
+        return results, new_ids
+
+    def unfollow_many(self, user_ids):
+        """
+        Unfollow every user in user_ids with one lookup and one DELETE.
+        Returns a dict mapping each requested id to 'unfollowed' or 'not_following'.
+        """
+        Follow = CustomUser.followers.through
+        user_ids = list(dict.fromkeys(user_ids))
+        edges = Follow.objects.filter(to_customuser=self, from_customuser_id__in=user_ids)
+        removed_ids = set(edges.values_list('from_customuser_id', flat=True))
+        if removed_ids:
+            with transaction.atomic():
+                edges.delete()
+                m2m_changed.send(
+                    sender=Follow, instance=self, action='post_remove', reverse=True,
+                    model=CustomUser, pk_set=removed_ids, using=self._state.db
+                )
+        return {user_id: 'unfollowed' if user_id in removed_ids else 'not_following' for user_id in user_ids}
 
     def __str__(self):
         return self.username
 
     class Meta:
-        ordering = ['username']
\ No newline at end of file
+        ordering = ['username']
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(recommendations_stale=True),
+                name='accounts_user_reco_stale_idx'
+            ),
+        ]
+
+
+class Recommendation(models.Model):
+    """
+    Precomputed "who to follow" row: one per (user, candidate), the top
+    RECOMMENDATIONS_SIZE candidates per user.
+    """
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        help_text="The user the candidate is recommended to"
+    )
+    candidate = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField()
+    mutual_count = models.PositiveIntegerField(
+        help_text="Number of users followed by user who follow the candidate"
+    )
+    engagement_count = models.PositiveIntegerField(
+        help_text="Recent likes and comments by user on the candidate's posts"
+    )
+
+    class Meta:
+        ordering = ['-score', 'candidate']
+        unique_together = ('user', 'candidate')
+        indexes = [
+            models.Index(fields=['user', '-score', 'candidate']),
+        ]
+
+    def __str__(self):
+        return f"{self.candidate_id} recommended to {self.user_id}"
+
+
+class RevokedToken(models.Model):
+    """Denylisted JWT, kept until the token would have expired anyway"""
+    jti = models.CharField(max_length=32, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+def adjust_user_counter(user_ids, field, delta):
+    """Atomically add delta to one of each user's denormalized counters"""
+    CustomUser.objects.filter(pk__in=user_ids).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_user_cache(sender, update_fields=None, **kwargs):
+    """Cached user listings and embedded authors go stale when a user changes"""
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate('users')
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def forget_cached_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """Cached tokens carry the user, so a password change or deactivation must drop them"""
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    from .authentication import forget_user
+    from .tokens import revoke_user
+
+    forget_user(instance.pk)
+    # JWTs cannot be recalled, so a new password or a deactivation revokes them all;
+    # a deleted user's tokens already fail the user lookup
+    if kwargs.get('signal') is post_save and not kwargs.get('created') and (
+        instance._password is not None or not instance.is_active
+    ):
+        revoke_user(instance)
+
+
+@receiver([post_save, post_delete], sender='authtoken.Token')
+def forget_cached_token(sender, instance, **kwargs):
+    from .authentication import forget_token
+
+    forget_token(instance.key)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def decrement_neighbour_counters(sender, instance, **kwargs):
+    """Deleting a user cascades over its edges without m2m_changed"""
+    Follow = CustomUser.followers.through
+    followee_ids = Follow.objects.filter(to_customuser=instance).values('from_customuser_id')
+    follower_ids = Follow.objects.filter(from_customuser=instance).values('to_customuser_id')
+    adjust_user_counter(followee_ids, 'followers_count', -1)
+    adjust_user_counter(follower_ids, 'following_count', -1)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def forget_deleted_user_graph(sender, instance, **kwargs):
+    """Deleting a user cascades over its edges without m2m_changed"""
+    from . import graph
+
+    graph.forget_neighbourhood(instance.pk)
+
+
+@receiver(m2m_changed, sender=CustomUser.followers.through)
+def sync_follow_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep the cached follow graph in step with the through table.
+    reverse=False means instance.followers changed, reverse=True means instance.following changed.
+    """
+    from . import graph
+
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            edges = [(instance.pk, user_id) for user_id in pk_set]
+        else:
+            edges = [(user_id, instance.pk) for user_id in pk_set]
+        graph.changed(edges)
+    elif action == 'pre_clear':
+        graph.forget_neighbourhood(instance.pk)
+
+
+@receiver(m2m_changed, sender=CustomUser.followers.through)
+def sync_follow_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep followers_count and following_count in step with the through table,
+    and mark the followers' recommendations stale in the same UPDATE.
+    reverse=False means instance.followers changed, reverse=True means instance.following changed.
+    """
+    Follow = CustomUser.followers.through
+    own, others = ('following_count', 'followers_count') if reverse else ('followers_count', 'following_count')
+    if reverse:
+        edges = Follow.objects.filter(to_customuser=instance)
+        other_id = 'from_customuser_id'
+    else:
+        edges = Follow.objects.filter(from_customuser=instance)
+        other_id = 'to_customuser_id'
+
+    if action == 'pre_remove':
+        # remove() reports every id it was given, so keep only the edges that exist
+        pk_set.intersection_update(edges.filter(**{f'{other_id}__in': pk_set}).values_list(other_id, flat=True))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        delta = 1 if action == 'post_add' else -1
+        follower_ids = [instance.pk] if reverse else list(pk_set)
+        # both ends in one UPDATE
+        CustomUser.objects.filter(pk__in=[instance.pk, *pk_set]).update(**{
+            'recommendations_stale': Case(
+                When(pk__in=follower_ids, then=True),
+                default=F('recommendations_stale'), output_field=models.BooleanField()
+            ),
+            own: Case(
+                When(pk=instance.pk, then=Greatest(F(own) + delta * len(pk_set), 0)),
+                default=F(own), output_field=models.PositiveIntegerField()
+            ),
+            others: Case(
+                When(pk__in=pk_set, then=Greatest(F(others) + delta, 0)),
+                default=F(others), output_field=models.PositiveIntegerField()
+            ),
+        })
+    elif action == 'pre_clear':
+        adjust_user_counter(edges.values(other_id), others, -1)
+        CustomUser.objects.filter(pk=instance.pk).update(**{own: 0, 'recommendations_stale': True})
@@ -0,0 +1,184 @@
+"""
+"Who to follow" recommendations.
+
+A user's candidates are the accounts followed by the accounts they follow
+(friends of friends), scored by how many of the user's followees follow
+them, plus the authors of posts the user recently liked or commented on.
+Scores are computed a batch of users at a time straight off the cached
+follow graph (graph.py): adjacency arrays are fetched together and each
+user's friends of friends are tallied by a Counter over the concatenated
+arrays, so the inner loop runs in C rather than as per-user ORM queries.
+The fan-in is bounded twice: each user expands at most FANOUT_LIMIT
+followees, and the batch's users are scored in groups whose second-degree
+arrays number at most FANIN_LIMIT, so memory and lookups stay flat however
+much of the graph a batch reaches. Engagement is two aggregate queries per
+batch.
+
+The top RECOMMENDATIONS_SIZE candidates per user are stored as
+Recommendation rows, so serving them is one indexed query. Following or
+unfollowing someone marks the follower stale, in the same UPDATE that
+adjusts the follow counters; `manage.py refresh_recommendations` recomputes
+the stale users only, or everyone with --all (engagement and second-degree
+changes are only picked up by the latter).
+
+Settings:
+    RECOMMENDATIONS_SIZE              - candidates stored per user (default 50)
+    RECOMMENDATIONS_ENGAGEMENT_WEIGHT - score of one recent like or comment; a mutual follow scores 1 (default 0.5)
+    RECOMMENDATIONS_ENGAGEMENT_DAYS   - how far back engagement counts (default 30)
+    RECOMMENDATIONS_FANOUT_LIMIT      - followees expanded per user, newest accounts first (default 1000)
+    RECOMMENDATIONS_FANIN_LIMIT       - second-degree arrays held at once (default 10000)
+"""
+import heapq
+from collections import Counter
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from . import graph
+from .models import CustomUser, Recommendation
+
+BATCH_SIZE = 200
+
+
+def setting(name, default):
+    return getattr(settings, f'RECOMMENDATIONS_{name}', default)
+
+
+def engagement(user_ids):
+    """{user_id: Counter(author_id -> recent likes and comments)} for user_ids"""
+    from posts.models import Comment, Like
+
+    since = timezone.now() - timedelta(days=setting('ENGAGEMENT_DAYS', 30))
+    result = {user_id: Counter() for user_id in user_ids}
+    for model, user_field in ((Like, 'user_id'), (Comment, 'author_id')):
+        rows = (
+            model.objects.filter(**{f'{user_field}__in': user_ids}, created_at__gte=since)
+            .order_by()
+            .values(user_field, 'post__author_id')
+            .annotate(total=Count('pk'))
+            .values_list(user_field, 'post__author_id', 'total')
+        )
+        for user_id, author_id, total in rows:
+            result[user_id][author_id] += total
+    return result
+
+
+def groups(expanded, limit):
+    """
+    Split the users of expanded ({user_id: followee ids}) into lists whose
+    followees number at most limit together; a user over it on its own
+    makes a group of one.
+    """
+    group, followees = [], set()
+    for user_id, ids in expanded.items():
+        if group and len(followees.union(ids)) > limit:
+            yield group
+            group, followees = [], set()
+        group.append(user_id)
+        followees.update(ids)
+    if group:
+        yield group
+
+
+def score(user_ids):
+    """
+    Top candidates of each user in user_ids.
+    Returns {user_id: [(candidate_id, score, mutual_count, engagement_count), ...]}, best first.
+    """
+    user_ids = list(user_ids)
+    limit = setting('FANOUT_LIMIT', 1000)
+    following = graph.load(graph.FOLLOWING, user_ids)
+    expanded = {user_id: ids[-limit:] for user_id, ids in following.items()}
+    engaged = engagement(user_ids)
+    weight = setting('ENGAGEMENT_WEIGHT', 0.5)
+    size = setting('SIZE', 50)
+
+    result = {}
+    for group in groups(expanded, setting('FANIN_LIMIT', 10000)):
+        second = graph.load(graph.FOLLOWING, set(chain.from_iterable(expanded[user_id] for user_id in group)))
+        for user_id in group:
+            result[user_id] = top_candidates(
+                user_id, following[user_id], expanded[user_id], second, engaged[user_id], weight, size
+            )
+    return result
+
+
+def top_candidates(user_id, following, expanded, second, engagement_counts, weight, size):
+    """One user's best candidates, tallied from the arrays in second of the followees in expanded"""
+    mutual = Counter(chain.from_iterable(second[followee_id] for followee_id in expanded))
+    candidates = (
+        (candidate_id, mutual[candidate_id] + weight * engagement_counts[candidate_id])
+        for candidate_id in mutual.keys() | engagement_counts.keys()
+        if candidate_id != user_id and not graph.contains(following, candidate_id)
+    )
+    return [
+        (candidate_id, total, mutual[candidate_id], engagement_counts[candidate_id])
+        for candidate_id, total in heapq.nlargest(size, candidates, key=lambda item: (item[1], -item[0]))
+    ]
+
+
+def refresh_batch(user_ids):
+    """Recompute and store the recommendations of user_ids"""
+    # cleared first, so a follow made while scoring marks the user stale again
+    CustomUser.objects.filter(pk__in=user_ids).update(recommendations_stale=False)
+    scored = score(user_ids)
+    with transaction.atomic():
+        Recommendation.objects.filter(user_id__in=user_ids).delete()
+        Recommendation.objects.bulk_create([
+            Recommendation(
+                user_id=user_id, candidate_id=candidate_id, score=total,
+                mutual_count=mutual_count, engagement_count=engagement_count
+            )
+            for user_id, rows in scored.items()
+            for candidate_id, total, mutual_count, engagement_count in rows
+        ])
+
+
+def refresh(user_ids=None, everyone=False, batch_size=BATCH_SIZE):
+    """
+    Recompute the recommendations of user_ids, or of every stale user (every
+    user with everyone=True). Returns the number of users refreshed.
+    """
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            refresh_batch(user_ids[start:start + batch_size])
+        return len(user_ids)
+
+    users = CustomUser.objects.all() if everyone else CustomUser.objects.filter(recommendations_stale=True)
+    total = 0
+    last_id = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return total
+        refresh_batch(batch)
+        total += len(batch)
+        last_id = batch[-1]
+
+
+def for_user(user, limit=None):
+    """
+    The user's stored recommendations, best first, in one query.
+    Candidates followed since the last refresh (and the user, should a row
+    name them) are filtered out in SQL before the limit is applied, which
+    is capped at the RECOMMENDATIONS_SIZE rows stored.
+    """
+    size = setting('SIZE', 50)
+    if limit is not None and limit < 1:
+        raise ValueError(f'limit must be positive, not {limit}')
+    limit = min(limit or size, size)
+    Follow = CustomUser.followers.through
+    # a row (from=A, to=B) means B follows A
+    followed = Follow.objects.filter(to_customuser_id=user.pk, from_customuser_id=OuterRef('candidate_id'))
+    rows = (
+        Recommendation.objects.filter(user=user)
+        .exclude(candidate_id=user.pk)
+        .filter(~Exists(followed))
+        .select_related('candidate')
+    )
+    return list(rows[:limit])
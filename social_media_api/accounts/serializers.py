@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 
+from social_media_api.fieldsets import SparseFieldsMixin
+
 User = get_user_model()
 
 
@@ -21,8 +25,9 @@ class RegisterSerializer(serializers.ModelSerializer):
             password=validated_data['password']
         )
 
-        # create an auth token for the new user
-        Token.objects.create(user=user)
+        # create an auth token for the new user; JWT mode issues tokens without a row
+        if getattr(settings, 'AUTH_MODE', 'token') != 'jwt':
+            Token.objects.create(user=user)
         return user
 
 
@@ -31,12 +36,50 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'followers']
+        expandable_fields = {
+            'followers': lambda: SimpleUserSerializer(many=True, read_only=True),
+        }
+
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    A user's profile with precomputed counts.
+    Followers and followed users are linked to their paginated lists
+    rather than embedded, so popular accounts cost the same to render;
+    ?expand= swaps a link for a bounded preview the view attaches.
+    """
+    followers = serializers.SerializerMethodField()
+    following = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = [
+            'id', 'username', 'email', 'bio', 'profile_picture',
+            'followers_count', 'following_count', 'posts_count', 'followers', 'following',
+        ]
+        read_only_fields = fields
+        expandable_fields = {
+            # the newest few, loaded by the view when asked for
+            'followers': lambda: SimpleUserSerializer(source='recent_followers', many=True, read_only=True),
+            'following': lambda: SimpleUserSerializer(source='recent_following', many=True, read_only=True),
+        }
+
+    def list_url(self, name, obj):
+        url = f"{reverse(name)}?user_id={obj.pk}"
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
-class SimpleUserSerializer(serializers.ModelSerializer):
+    def get_followers(self, obj):
+        return self.list_url('followers-list', obj)
+
+    def get_following(self, obj):
+        return self.list_url('following-list', obj)
+
+
+class SimpleUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'first_name', 'last_name', 'email')
@@ -45,4 +88,20 @@ class SimpleUserSerializer(serializers.ModelSerializer):
 
 class FollowActionSerializer(serializers.Serializer):
     # minimal serializer for POST actions (not strictly required but helpful)
-    user_id = serializers.IntegerField()
\ No newline at end of file
+    user_id = serializers.IntegerField()
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    # batch follow/unfollow payload: {"user_ids": [1, 2, 3]}
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
+
+
+class RecommendationSerializer(serializers.Serializer):
+    user = SimpleUserSerializer(source='candidate', read_only=True)
+    score = serializers.FloatField(read_only=True)
+    mutual_count = serializers.IntegerField(read_only=True)
+    engagement_count = serializers.IntegerField(read_only=True)
@@ -1,3 +1,516 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from notifications.models import Notification
+from posts.models import Post
+from . import authentication, graph, recommendations
+from .serializers import ProfileSerializer, UserSerializer
+from .models import RevokedToken
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATIONS_BACKEND='notifications.pipeline.LocalBackend')
+class BulkFollowAPITestCase(APITestCase):
+    """Test cases for the batch follow/unfollow endpoints"""
+
+    def setUp(self):
+        self.actor = User.objects.create_user(username='actor', password='pass123')
+        self.targets = [User.objects.create_user(username=f'target{i}', password='pass123') for i in range(3)]
+        self.client.force_authenticate(user=self.actor)
+
+    def test_bulk_follow_reports_per_id_results(self):
+        """Test every requested id gets its own outcome"""
+        self.actor.following.add(self.targets[0])
+        ids = [t.pk for t in self.targets] + [self.actor.pk, 999999]
+        response = self.client.post('/api/accounts/follow/batch/', {'user_ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], {
+            self.targets[0].pk: 'already_following',
+            self.targets[1].pk: 'followed',
+            self.targets[2].pk: 'followed',
+            self.actor.pk: 'self',
+            999999: 'not_found',
+        })
+        self.assertEqual(set(self.actor.following.all()), set(self.targets))
+        self.assertEqual(
+            set(Notification.objects.values_list('recipient_id', flat=True)),
+            {self.targets[1].pk, self.targets[2].pk}
+        )
+
+    @override_settings(NOTIFICATIONS_BACKEND='notifications.pipeline.OutboxBackend')
+    def test_bulk_follow_query_count_is_constant(self):
+        """Test the number of queries does not grow with the batch size"""
+        more = [User.objects.create_user(username=f'extra{i}', password='pass123') for i in range(20)]
+        with self.assertNumQueries(7):
+            self.client.post('/api/accounts/follow/batch/', {'user_ids': [u.pk for u in more]}, format='json')
+        self.assertEqual(self.actor.following.count(), 20)
+
+    def test_bulk_unfollow(self):
+        """Test unfollowing several users at once"""
+        self.actor.following.add(self.targets[0], self.targets[1])
+        ids = [self.targets[0].pk, self.targets[2].pk]
+        response = self.client.post('/api/accounts/unfollow/batch/', {'user_ids': ids}, format='json')
+        self.assertEqual(response.data['results'], {
+            self.targets[0].pk: 'unfollowed',
+            self.targets[2].pk: 'not_following',
+        })
+        self.assertEqual(list(self.actor.following.all()), [self.targets[1]])
+
+    def test_follow_status(self):
+        """Test the batched relationship lookup"""
+        self.actor.following.add(self.targets[0])
+        self.targets[1].following.add(self.actor)
+        ids = ','.join(str(t.pk) for t in self.targets[:2])
+        response = self.client.get(f'/api/accounts/follow/status/?user_ids={ids}')
+        self.assertEqual(response.data['results'], {
+            self.targets[0].pk: {'following': True, 'followed_by': False},
+            self.targets[1].pk: {'following': False, 'followed_by': True},
+        })
+
+    def test_bulk_follow_rejects_empty_list(self):
+        response = self.client.post('/api/accounts/follow/batch/', {'user_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    """Test cases for the cached token authentication backend"""
+
+    def setUp(self):
+        authentication.LOCAL.clear()
+        self.user = User.objects.create_user(username='cached', password='pass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_the_token_lookup(self):
+        """Test only the first request queries the token"""
+        with self.assertNumQueries(2):
+            self.client.get('/api/accounts/profile/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.data['username'], 'cached')
+
+    def test_logout_revokes_cached_token(self):
+        """Test a logged out token is rejected even though it was cached"""
+        self.client.get('/api/accounts/profile/')
+        response = self.client.post('/api/accounts/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_changes_evict_cached_token(self):
+        """Test deactivating a user takes effect on the next request"""
+        self.client.get('/api/accounts/profile/')
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_AUTH_CACHE_ALIAS='default')
+    def test_shared_tier_fills_the_local_cache(self):
+        """Test a key cached by another process is served without a query"""
+        self.client.get('/api/accounts/profile/')
+        authentication.LOCAL.clear()
+        with self.assertNumQueries(1):
+            self.client.get('/api/accounts/profile/')
+
+    def test_lru_is_bounded(self):
+        """Test the least recently used entry is evicted first"""
+        lru = authentication.LRUCache(size=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+
+@override_settings(
+    AUTH_MODE='jwt',
+    JWT_SIGNING_KEYS=[('new', 'new-secret'), ('old', 'old-secret')],
+)
+class JWTAuthenticationTestCase(APITestCase):
+    """Test cases for the stateless JWT mode"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stateless', password='pass123', email='s@example.com')
+
+    def login(self):
+        response = self.client.post('/api/accounts/login/', {'username': 'stateless', 'password': 'pass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('token', response.data)
+        return response.data
+
+    def test_access_token_authenticates_with_one_query(self):
+        """Test a bearer token loads its user and revocation state together"""
+        pair = self.login()
+        self.assertFalse(Token.objects.exists())
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.client.get('/api/notifications/unread-count/')
+        # the user with its revocation state, then the unread count
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the profile view rereads the user for fresh counters
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.data['email'], 's@example.com')
+
+    def test_deactivation_rejects_tokens_at_once(self):
+        """Test the token's user is checked, not assumed active"""
+        pair = self.login()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocations_survive_cache_eviction(self):
+        """Test revocations are stored in the database, not the evictable cache"""
+        pair = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.client.post('/api/accounts/logout/', {'refresh': pair['refresh']})
+        cache.clear()
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': pair['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+    def test_refresh_rotates_the_pair(self):
+        """Test a refresh token can only be exchanged once"""
+        pair = self.login()
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': pair['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': pair['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': pair['access']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_and_password_change_revoke(self):
+        """Test logout denies the token and a password change revokes them all"""
+        pair = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.client.post('/api/accounts/logout/')
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()
+        pair = self.login()
+        self.user.set_password('changed123')
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_retired_keys_are_rejected(self):
+        """Test tokens signed with a key dropped from the list stop working"""
+        pair = self.login()
+        with self.settings(JWT_SIGNING_KEYS=[('newer', 'newer-secret'), ('new', 'new-secret')]):
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+            self.assertEqual(self.client.get('/api/accounts/profile/').status_code, status.HTTP_200_OK)
+        with self.settings(JWT_SIGNING_KEYS=[('newer', 'newer-secret')]):
+            self.assertEqual(self.client.get('/api/accounts/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(FOLLOW_GRAPH_CACHE_ALIAS='default')
+class FollowGraphTestCase(APITestCase):
+    """Test cases for the cached follow graph"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'node{i}', password='pass123') for i in range(4)]
+
+    def tearDown(self):
+        # version counters outlive the test database rows
+        cache.clear()
+
+    def test_lookups_are_served_from_cache(self):
+        """Test committed follows invalidate the cache, and lookups after a reload need no query"""
+        a, b, c, _ = self.users
+        with self.captureOnCommitCallbacks(execute=True):
+            a.follow(b)
+            a.follow(c)
+            c.follow(b)
+        graph.rebuild([a.pk, b.pk])
+        with self.assertNumQueries(0):
+            self.assertTrue(a.is_following(b))
+            self.assertFalse(b.is_following(a))
+            self.assertEqual(list(graph.following_ids(a.pk)), sorted([b.pk, c.pk]))
+            self.assertEqual(graph.follower_count(b.pk), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            a.unfollow(b)
+        self.assertFalse(a.is_following(b))
+        self.assertEqual(list(graph.follower_ids(b.pk)), [c.pk])
+
+    def test_uncommitted_follows_stay_out_of_the_cache(self):
+        """Test a follow only reaches the cache once its transaction commits"""
+        a, b, _, _ = self.users
+        self.assertFalse(a.is_following(b))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            a.follow(b)
+        # until the transaction commits the cache still holds the committed graph
+        self.assertFalse(a.is_following(b))
+        for callback in callbacks:
+            callback()
+        self.assertTrue(a.is_following(b))
+
+    def test_bulk_changes_and_clear(self):
+        """Test bulk follows, bulk unfollows and clear() keep the cache in step"""
+        a, b, c, d = self.users
+        graph.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            d.follow_many([a.pk, b.pk, c.pk])
+        self.assertEqual(list(graph.following_ids(d.pk)), [a.pk, b.pk, c.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            d.unfollow_many([a.pk])
+        self.assertEqual(graph.follower_count(a.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            d.following.clear()
+        self.assertEqual(list(graph.following_ids(d.pk)), [])
+        self.assertEqual(list(graph.follower_ids(b.pk)), [])
+
+    def test_deleted_users_leave_the_graph(self):
+        a, b, _, _ = self.users
+        with self.captureOnCommitCallbacks(execute=True):
+            a.follow(b)
+        self.assertEqual(list(graph.follower_ids(b.pk)), [a.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertEqual(list(graph.follower_ids(b.pk)), [])
+
+    def test_rebuild_picks_up_writes_that_bypassed_signals(self):
+        """Test rebuild reloads entries from the through table"""
+        a, b, _, _ = self.users
+        self.assertFalse(a.is_following(b))
+        Follow = User.followers.through
+        Follow.objects.create(from_customuser=b, to_customuser=a)
+        self.assertFalse(a.is_following(b))
+        self.assertEqual(graph.rebuild(), 4)
+        self.assertTrue(a.is_following(b))
+        self.assertEqual(graph.follower_count(b.pk), 1)
+
+    @override_settings(FOLLOW_GRAPH_CACHE_ALIAS=None)
+    def test_unshared_cache_reads_the_database(self):
+        """Test without a shared cache every lookup queries the follow table"""
+        a, b, _, _ = self.users
+        a.follow(b)
+        with self.assertNumQueries(1):
+            self.assertTrue(a.is_following(b))
+        self.assertEqual(graph.rebuild(), 0)
+
+
+class UserCountersTestCase(APITestCase):
+    """Test cases for the denormalized follower, following and post counters"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'counted{i}', password='pass123') for i in range(4)]
+
+    def counts(self):
+        return list(User.objects.filter(pk__in=[u.pk for u in self.users]).order_by('pk').values_list(
+            'followers_count', 'following_count', 'posts_count'
+        ))
+
+    def test_follow_paths_keep_counts(self):
+        """Test single, batch, redundant and clear() changes are all counted"""
+        a, b, c, d = self.users
+        a.follow(b)
+        a.follow(b)
+        d.follow_many([a.pk, b.pk, c.pk])
+        self.assertEqual(self.counts(), [(1, 1, 0), (2, 0, 0), (1, 0, 0), (0, 3, 0)])
+        a.unfollow(c)
+        d.unfollow_many([a.pk])
+        self.assertEqual(self.counts(), [(0, 1, 0), (2, 0, 0), (1, 0, 0), (0, 2, 0)])
+        b.followers.clear()
+        self.assertEqual(self.counts(), [(0, 0, 0), (0, 0, 0), (1, 0, 0), (0, 1, 0)])
+
+    def test_post_and_user_deletion_keep_counts(self):
+        a, b, c, _ = self.users
+        post = Post.objects.create(author=a, title='Counted', content='Body')
+        Post.objects.create(author=a, title='Counted too', content='Body')
+        a.follow(b)
+        c.follow(a)
+        post.delete()
+        b.delete()
+        self.assertEqual(User.objects.get(pk=a.pk).posts_count, 1)
+        self.assertEqual(User.objects.get(pk=a.pk).following_count, 0)
+        self.assertEqual(User.objects.get(pk=c.pk).following_count, 1)
+
+    def test_profile_returns_counts_and_list_links(self):
+        """Test the profile embeds counts instead of the follower list"""
+        a, b, c, _ = self.users
+        b.follow(a)
+        c.follow(a)
+        self.client.force_authenticate(user=a)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.data['followers_count'], 2)
+        self.assertEqual(response.data['followers'], f'http://testserver/api/accounts/followers/?user_id={a.pk}')
+        followers = self.client.get(response.data['followers'])
+        self.assertEqual({u['id'] for u in followers.data['results']}, {b.pk, c.pk})
+
+    def test_follow_lists_are_keyset_paged_joins(self):
+        """Test follow lists join the follow table and page by id instead of embedding id lists"""
+        a, b, c, d = self.users
+        for follower in (b, c, d):
+            follower.follow(a)
+        self.client.force_authenticate(user=b)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f'/api/accounts/followers/?user_id={a.pk}&page_size=2')
+        self.assertEqual([u['id'] for u in response.data['results']], [d.pk, c.pk])
+        sql = captured.captured_queries[-1]['sql']
+        self.assertIn('JOIN', sql)
+        self.assertNotIn(' IN (', sql)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([u['id'] for u in response.data['results']], [b.pk])
+        self.assertIsNone(response.data['next'])
+        response = self.client.get('/api/accounts/following/')
+        self.assertEqual([u['id'] for u in response.data['results']], [a.pk])
+
+    def test_profile_revalidates_until_counts_change(self):
+        """Test an unchanged profile is a 304 without serializing, and a new follower changes its ETag"""
+        a, b, _, _ = self.users
+        self.client.force_authenticate(user=a)
+        etag = self.client.get('/api/accounts/profile/')['ETag']
+        with self.assertNumQueries(1), patch.object(ProfileSerializer, 'to_representation', side_effect=AssertionError):
+            response = self.client.get('/api/accounts/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        b.follow(a)
+        response = self.client.get('/api/accounts/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_reconcile_fixes_drift(self):
+        a, b, _, _ = self.users
+        a.follow(b)
+        User.objects.filter(pk=b.pk).update(followers_count=7, posts_count=3)
+        out = StringIO()
+        call_command('reconcile_user_counters', stdout=out)
+        self.assertIn('Fixed 1 follower counters, 0 following counters and 1 post counters', out.getvalue())
+        self.assertEqual(self.counts()[1], (1, 0, 0))
+
+
+class RecommendationsTestCase(APITestCase):
+    """Test cases for the "who to follow" recommendations"""
+
+    def setUp(self):
+        self.me, self.friend1, self.friend2, self.popular, self.niche, self.author = [
+            User.objects.create_user(username=name, password='pass123')
+            for name in ('me', 'friend1', 'friend2', 'popular', 'niche', 'author')
+        ]
+        self.me.follow_many([self.friend1.pk, self.friend2.pk])
+        self.friend1.follow_many([self.popular.pk, self.niche.pk, self.me.pk])
+        self.friend2.follow(self.popular)
+        post = Post.objects.create(author=self.author, title='Liked', content='Body')
+        post.likes.create(user=self.me)
+        self.client.force_authenticate(user=self.me)
+
+    def test_scores_mutual_follows_and_engagement(self):
+        """Test friends of friends rank by mutual follows, then engaged authors"""
+        recommendations.refresh([self.me.pk])
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/accounts/recommendations/')
+        results = [(r['user']['username'], r['mutual_count'], r['engagement_count']) for r in response.data['results']]
+        self.assertEqual(results, [('popular', 2, 0), ('niche', 1, 0), ('author', 0, 1)])
+
+    def test_follows_mark_stale_and_hide_followed_candidates(self):
+        """Test a follow hides the candidate at once and the refresh picks up stale users only"""
+        recommendations.refresh(everyone=True)
+        self.assertFalse(User.objects.filter(recommendations_stale=True).exists())
+        self.me.follow(self.popular)
+        # the followed candidate is dropped before the limit, so two still come back
+        response = self.client.get('/api/accounts/recommendations/?limit=2')
+        self.assertEqual([r['user']['username'] for r in response.data['results']], ['niche', 'author'])
+        self.assertEqual(list(User.objects.filter(recommendations_stale=True)), [self.me])
+        self.assertEqual(recommendations.refresh(), 1)
+        response = self.client.get('/api/accounts/recommendations/')
+        self.assertEqual([r['user']['username'] for r in response.data['results']], ['niche', 'author'])
+
+    def test_limit_must_be_positive(self):
+        """Test zero, negative and non-numeric limits are a 400 rather than a server error"""
+        recommendations.refresh([self.me.pk])
+        for limit in ('0', '-1', 'two', ''):
+            response = self.client.get('/api/accounts/recommendations/', {'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, limit)
+
+    def test_limit_is_capped_at_the_stored_size(self):
+        """Test a limit above RECOMMENDATIONS_SIZE returns at most that many"""
+        recommendations.refresh([self.me.pk])
+        with self.settings(RECOMMENDATIONS_SIZE=2):
+            response = self.client.get('/api/accounts/recommendations/?limit=1000')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['user']['username'] for r in response.data['results']], ['popular', 'niche'])
+
+    @override_settings(RECOMMENDATIONS_FANIN_LIMIT=1)
+    def test_fan_in_is_loaded_in_bounded_groups(self):
+        """Test each load of second-degree arrays stays within the fan-in limit"""
+        loads = []
+        load = graph.load
+
+        def counting_load(direction, user_ids):
+            loads.append(len(set(user_ids)))
+            return load(direction, user_ids)
+
+        expected = recommendations.score([self.me.pk, self.friend1.pk, self.friend2.pk])
+        with override_settings(RECOMMENDATIONS_FANIN_LIMIT=10000), patch.object(graph, 'load', counting_load):
+            recommendations.score([self.me.pk, self.friend1.pk, self.friend2.pk])
+        self.assertEqual(len(loads), 2)
+        loads.clear()
+        with patch.object(graph, 'load', counting_load):
+            scored = recommendations.score([self.me.pk, self.friend1.pk, self.friend2.pk])
+        self.assertEqual(scored, expected)
+        # the first load is the users' own arrays; a user over the limit is expanded alone
+        self.assertEqual(len(loads), 4)
+
+
+class UserSerializerFieldsTestCase(APITestCase):
+    """Test sparse fieldsets and expansion on the user serializers and the views rendering them"""
+
+    def test_fields_and_expand(self):
+        """Test fields= trims the user and expand= embeds followers instead of ids"""
+        user = User.objects.create_user(username='shown', password='pass123')
+        fan = User.objects.create_user(username='fan', password='pass123')
+        fan.following.add(user)
+        self.assertEqual(UserSerializer(user, fields=['id', 'username']).data, {'id': user.pk, 'username': 'shown'})
+        data = UserSerializer(user, fields=['id'], expand=['followers']).data
+        self.assertEqual([follower['username'] for follower in data['followers']], ['fan'])
+        self.assertEqual(UserSerializer(user).data['followers'], [fan.pk])
+
+    def test_profile_fields_and_expand(self):
+        """Test the profile takes ?fields= and swaps a list link for a preview with ?expand="""
+        user = User.objects.create_user(username='shown', password='pass123')
+        fans = [User.objects.create_user(username=f'fan{i}', password='pass123') for i in range(2)]
+        for fan in fans:
+            fan.follow(user)
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/accounts/profile/?fields=id,followers_count')
+        self.assertEqual(response.data, {'id': user.pk, 'followers_count': 2})
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/accounts/profile/?fields=id&expand=followers')
+        self.assertEqual([fan['username'] for fan in response.data['followers']], ['fan1', 'fan0'])
+        self.assertEqual(set(response.data), {'id', 'followers'})
+        fans[0].username = 'renamed'
+        fans[0].save()
+        response = self.client.get(
+            '/api/accounts/profile/?fields=id&expand=followers', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_follow_lists_take_fields(self):
+        """Test ?fields= trims follow list entries and the columns read for them"""
+        user = User.objects.create_user(username='shown', password='pass123')
+        fan = User.objects.create_user(username='fan', password='pass123', email='fan@example.com')
+        fan.follow(user)
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/accounts/followers/?fields=id,username')
+        self.assertEqual(response.data['results'], [{'id': fan.pk, 'username': 'fan'}])
+        self.assertNotIn('email', captured.captured_queries[-1]['sql'])
+        response = self.client.get('/api/accounts/following/?fields=id')
+        self.assertEqual(response.data['results'], [])
+        response = self.client.get(f'/api/accounts/following/?user_id={fan.pk}&fields=email')
+        self.assertEqual(response.data['results'], [{'email': ''}])
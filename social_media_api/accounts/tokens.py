@@ -0,0 +1,140 @@
+"""
+Stateless JWT access and refresh tokens.
+
+With AUTH_MODE = 'jwt', login and registration hand out a short-lived access
+token and a longer-lived refresh token instead of a Token row. Verifying one
+needs no Token table; decode() loads the user together with the revocation
+state in a single query, so a deactivated user is rejected at once.
+
+Revocations are durable rows rather than cache entries, which could be
+evicted and so bring a revoked token back. A revoked token's jti goes into
+RevokedToken until the token would have expired anyway, and expired rows are
+purged on the next revocation, so the table never holds more than the tokens
+revoked within one refresh lifetime. Revoking a user (password change,
+deactivation) stamps CustomUser.tokens_revoked_at, rejecting every token
+issued at or before it.
+
+Refreshing is one-time: the old refresh token is denylisted and a new pair is
+issued. Tokens are signed with the first key of JWT_SIGNING_KEYS and carry
+its id in the `kid` header; every listed key is accepted, so keys are rotated
+by putting a new one first and dropping the old one a refresh lifetime later.
+
+Settings:
+    JWT_SIGNING_KEYS       - [(kid, secret), ...], newest first (default [('default', SECRET_KEY)])
+    JWT_ALGORITHM          - HMAC algorithm (default 'HS256')
+    JWT_ACCESS_LIFETIME    - seconds (default 300)
+    JWT_REFRESH_LIFETIME   - seconds (default 14 days)
+"""
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Exists
+from django.utils import timezone
+
+from .models import RevokedToken
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def setting(name, default):
+    return getattr(settings, f'JWT_{name}', default)
+
+
+def signing_keys():
+    return list(setting('SIGNING_KEYS', None) or [('default', settings.SECRET_KEY)])
+
+
+def lifetime(token_type):
+    if token_type == ACCESS:
+        return setting('ACCESS_LIFETIME', 300)
+    return setting('REFRESH_LIFETIME', 14 * 24 * 60 * 60)
+
+
+def encode(user, token_type, now=None):
+    # fractional iat, so a revocation and a login in the same second stay ordered
+    now = now or time.time()
+    kid, secret = signing_keys()[0]
+    claims = {
+        'type': token_type,
+        'user_id': user.pk,
+        'username': user.username,
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': now + lifetime(token_type),
+    }
+    return jwt.encode(claims, secret, algorithm=setting('ALGORITHM', 'HS256'), headers={'kid': kid})
+
+
+def issue_pair(user):
+    """{'access': ..., 'refresh': ...} for user"""
+    now = time.time()
+    return {'access': encode(user, ACCESS, now), 'refresh': encode(user, REFRESH, now)}
+
+
+def decode(token, token_type):
+    """
+    (user, claims) of a token of the given type.
+    Raises InvalidToken if it is malformed, expired, signed with an unknown
+    key, of the wrong type or revoked, or its user is inactive or gone.
+    """
+    try:
+        kid = jwt.get_unverified_header(token).get('kid')
+        secret = dict(signing_keys())[kid]
+        claims = jwt.decode(
+            token, secret, algorithms=[setting('ALGORITHM', 'HS256')],
+            options={'require': ['exp', 'iat', 'jti', 'user_id']}
+        )
+    except (jwt.InvalidTokenError, KeyError):
+        raise InvalidToken('Token is invalid or expired.')
+    if claims.get('type') != token_type:
+        raise InvalidToken('Wrong token type.')
+
+    User = get_user_model()
+    try:
+        user = User.objects.annotate(
+            token_denied=Exists(RevokedToken.objects.filter(jti=claims['jti']))
+        ).get(pk=claims['user_id'], is_active=True)
+    except User.DoesNotExist:
+        raise InvalidToken('User inactive or deleted.')
+    revoked_at = user.tokens_revoked_at
+    if user.token_denied or (revoked_at is not None and claims['iat'] <= revoked_at.timestamp()):
+        raise InvalidToken('Token has been revoked.')
+    return user, claims
+
+
+def deny(claims):
+    """
+    Revoke one token until it expires.
+    Returns False if it was already revoked, so a refresh token raced by two
+    clients is only exchanged once.
+    """
+    RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    _, created = RevokedToken.objects.get_or_create(
+        jti=claims['jti'],
+        defaults={'expires_at': datetime.fromtimestamp(claims['exp'], dt_timezone.utc)},
+    )
+    return created
+
+
+def revoke_user(user):
+    """Revoke every token issued to user so far"""
+    user.tokens_revoked_at = timezone.now()
+    type(user).objects.filter(pk=user.pk).update(tokens_revoked_at=user.tokens_revoked_at)
+
+
+def refresh(token):
+    """Exchange a refresh token for a new pair, revoking the old one"""
+    user, claims = decode(token, REFRESH)
+    if not deny(claims):
+        raise InvalidToken('Token has been revoked.')
+    return issue_pair(user)
+
@@ -4,12 +4,15 @@ from . import views
 urlpatterns = [
     path("register/", views.register_user, name="register"),
     path("login/", views.login_user, name="login"),
+    path("logout/", views.logout_user, name="logout"),
+    path("token/refresh/", views.refresh_token, name="token-refresh"),
     path("profile/", views.get_user_profile, name="profile"),
-]
-
-urlpatterns = [
     path('follow/<int:user_id>/', views.FollowUserView.as_view(), name='follow-user'),
     path('unfollow/<int:user_id>/', views.UnfollowUserView.as_view(), name='unfollow-user'),
+    path('follow/batch/', views.BulkFollowView.as_view(), name='follow-batch'),
+    path('unfollow/batch/', views.BulkUnfollowView.as_view(), name='unfollow-batch'),
+    path('follow/status/', views.FollowStatusView.as_view(), name='follow-status'),
     path('following/', views.FollowingListView.as_view(), name='following-list'),
     path('followers/', views.FollowersListView.as_view(), name='followers-list'),
+    path('recommendations/', views.RecommendationsView.as_view(), name='recommendations'),
 ]
\ No newline at end of file
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
 from rest_framework import status
 from rest_framework.authtoken.models import Token
@@ -8,17 +9,39 @@ from rest_framework import generics
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 
-from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, SimpleUserSerializer
+from .serializers import (
+    RegisterSerializer, LoginSerializer, ProfileSerializer, SimpleUserSerializer, BulkFollowSerializer,
+    RecommendationSerializer,
+)
 from .models import CustomUser
+from . import graph, recommendations, tokens
+from notifications.pipeline import make_event, notify, notify_many
+from posts.pagination import KeysetPagination
+from social_media_api.caching import cache_response
+from social_media_api.conditional import add_validators, make_etag, not_modified
+from social_media_api.fieldsets import SparseFieldsViewMixin, parse_list
 
 User = get_user_model()
 
+# users shown by ?expand=followers / ?expand=following on a profile
+FOLLOW_PREVIEW_SIZE = 10
+
+
+def jwt_mode():
+    return getattr(settings, 'AUTH_MODE', 'token') == 'jwt'
+
 
 @api_view(['POST'])
+@permission_classes([permissions.AllowAny])
 def register_user(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
+        if jwt_mode():
+            return Response({
+                "message": "User registered successfully",
+                **tokens.issue_pair(user)
+            }, status=status.HTTP_201_CREATED)
         token = Token.objects.get(user=user)
         return Response({
             "message": "User registered successfully",
@@ -28,6 +51,7 @@ def register_user(request):
 
 
 @api_view(['POST'])
+@permission_classes([permissions.AllowAny])
 def login_user(request):
     serializer = LoginSerializer(data=request.data)
     if not serializer.is_valid():
@@ -37,17 +61,71 @@ def login_user(request):
     password = serializer.validated_data['password']
 
     user = authenticate(username=username, password=password)
+    if user and jwt_mode():
+        return Response({"message": "Login successful", **tokens.issue_pair(user)})
     if user:
         token, _ = Token.objects.get_or_create(user=user)
         return Response({"message": "Login successful", "token": token.key})
     return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def logout_user(request):
+    if isinstance(request.auth, dict):
+        # JWT: deny the access token and, if given, the refresh token
+        tokens.deny(request.auth)
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                _, claims = tokens.decode(refresh, tokens.REFRESH)
+                tokens.deny(claims)
+            except tokens.InvalidToken:
+                pass
+        return Response({"message": "Logout successful"})
+    # deleting the token also evicts it from the authentication cache
+    Token.objects.filter(user=request.user).delete()
+    return Response({"message": "Logout successful"})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def refresh_token(request):
+    """Exchange a refresh token for a new access/refresh pair: POST {"refresh": "..."}"""
+    refresh = request.data.get('refresh')
+    if not refresh:
+        return Response({"refresh": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        return Response(tokens.refresh(refresh))
+    except tokens.InvalidToken as e:
+        return Response({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_user_profile(request):
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
+    # counters change through UPDATEs, so read them fresh rather than from the cached request.user
+    user = User.objects.get(pk=request.user.pk)
+    fields = parse_list(request.query_params.get('fields')) or None
+    expand = parse_list(request.query_params.get('expand'))
+    previews = []
+    if 'followers' in expand:
+        user.recent_followers = list(User.objects.filter(following=user).order_by('-id')[:FOLLOW_PREVIEW_SIZE])
+        previews += user.recent_followers
+    if 'following' in expand:
+        user.recent_following = list(User.objects.filter(followers=user).order_by('-id')[:FOLLOW_PREVIEW_SIZE])
+        previews += user.recent_following
+    # every field the profile renders, so an unchanged profile is a 304 without serializing
+    etag = make_etag(
+        request, request.get_full_path(), user.username, user.email, user.bio, user.profile_picture.name,
+        user.followers_count, user.following_count, user.posts_count,
+        *[(other.pk, other.username, other.first_name, other.last_name, other.email) for other in previews]
+    )
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    serializer = ProfileSerializer(user, context={'request': request}, fields=fields, expand=expand)
+    return add_validators(Response(serializer.data), etag)
 
 class FollowUserView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -60,6 +138,7 @@ class FollowUserView(APIView):
         if actor.is_following(target):
             return Response({'detail': 'Already following.'}, status=status.HTTP_400_BAD_REQUEST)
         actor.following.add(target)
+        notify(target.pk, actor.pk, 'started following you')
         return Response({'detail': 'Followed successfully.'}, status=status.HTTP_200_OK)
 
 
@@ -79,9 +158,96 @@ class UnfollowUserView(APIView):
 
 
 
-class FollowingListView(generics.ListAPIView):
+class BulkFollowView(APIView):
+    """Follow up to 1000 users in one request: POST {"user_ids": [...]}"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        actor = request.user
+        results, followed_ids = actor.follow_many(serializer.validated_data['user_ids'])
+        notify_many([make_event(user_id, actor.pk, 'started following you') for user_id in followed_ids])
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class BulkUnfollowView(APIView):
+    """Unfollow up to 1000 users in one request: POST {"user_ids": [...]}"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = request.user.unfollow_many(serializer.validated_data['user_ids'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class FollowStatusView(APIView):
+    """
+    Batched follow-graph lookup: GET ?user_ids=1,2,3
+    Returns whether the current user follows, and is followed by, each id.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_ids = 1000
+
+    def get(self, request):
+        try:
+            user_ids = [int(i) for i in request.query_params.get('user_ids', '').split(',') if i]
+        except ValueError:
+            return Response({'detail': 'user_ids must be a comma separated list of integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not user_ids or len(user_ids) > self.max_ids:
+            return Response({'detail': f'Provide between 1 and {self.max_ids} user_ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        following = graph.following_ids(request.user.pk)
+        followed_by = graph.follower_ids(request.user.pk)
+        return Response({
+            'results': {
+                user_id: {
+                    'following': graph.contains(following, user_id),
+                    'followed_by': graph.contains(followed_by, user_id),
+                }
+                for user_id in user_ids
+            }
+        })
+
+
+class RecommendationsView(APIView):
+    """
+    "Who to follow": GET -> {"results": [{"user": ..., "score": ..., "mutual_count": ..., "engagement_count": ...}]}
+    Served from precomputed rows in one query; ?limit= caps the number of results
+    (at most RECOMMENDATIONS_SIZE, the number stored).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            limit = int(limit) if limit.isdigit() else 0
+            if limit < 1:
+                return Response({'detail': 'limit must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        rows = recommendations.for_user(request.user, limit)
+        return Response({'results': RecommendationSerializer(rows, many=True).data})
+
+
+class FollowPagination(KeysetPagination):
+    """
+    Follow lists by user id, newest accounts first. Filtered through a join on
+    the follow table, so the (from, to) unique index hands followers over in
+    id order and no id list is read into Python.
+    """
+    key_field = 'id'
+
+    def encode_position(self, position):
+        return str(position)
+
+    def decode_position(self, raw):
+        return int(raw)
+
+
+class FollowingListView(SparseFieldsViewMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = SimpleUserSerializer
+    pagination_class = FollowPagination
 
     def get_queryset(self):
         # ?user_id= optional to view another user's following list; default current user
@@ -90,12 +256,13 @@ class FollowingListView(generics.ListAPIView):
             user = get_object_or_404(User, pk=user_id)
         else:
             user = self.request.user
-        return user.following.all()
+        return self.shape_queryset(User.objects.filter(followers=user), self.queryset_shape())
 
 
-class FollowersListView(generics.ListAPIView):
+class FollowersListView(SparseFieldsViewMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = SimpleUserSerializer
+    pagination_class = FollowPagination
 
     def get_queryset(self):
         user_id = self.request.query_params.get('user_id')
@@ -103,7 +270,7 @@ class FollowersListView(generics.ListAPIView):
             user = get_object_or_404(User, pk=user_id)
         else:
             user = self.request.user
-        return user.followers.all()
+        return self.shape_queryset(User.objects.filter(following=user), self.queryset_shape())
 
 
 class UsersListView(generics.GenericAPIView):
@@ -114,6 +281,7 @@ class UsersListView(generics.GenericAPIView):
     def get_queryset(self):
         return CustomUser.objects.all()
     
+    @cache_response('users')
     def get(self, request):
         queryset = CustomUser.objects.all()
         serializer = self.get_serializer(queryset, many=True)
@@ -0,0 +1,202 @@
+"""
+Pub/sub fan-out for pushing notifications to connected clients.
+
+publish() is called from synchronous code (the delivery pipeline), while
+subscriptions are consumed by async streaming views running on the ASGI
+event loop. Brokers bridge the two.
+
+- LocalBroker keeps subscribers in process memory. It is enough when
+  notifications are delivered by the same process that holds the
+  connections (a single ASGI server with LocalBackend).
+- RedisBroker uses Redis pub/sub. Use it when several server processes hold
+  connections, or when the process_notifications worker does the delivery
+  (OutboxBackend); the notifications.E001 check enforces the latter. Each
+  process holds a single pub/sub connection, read by a listener thread
+  that follows the channels of the users with streams open in the process
+  and hands messages to the same subscriptions LocalBroker uses.
+
+Every subscription has a bounded queue. A consumer that falls behind has its
+backlog dropped and gets a single 'resync' event, telling the client to
+refetch the inbox over REST instead of slowing the publisher down. Streams
+are resynced too when the Redis connection drops, since pushes may have been
+missed meanwhile.
+
+Settings:
+    NOTIFICATIONS_BROKER     - dotted path of the broker class
+                               (default 'notifications.broker.LocalBroker')
+    NOTIFICATIONS_BROKER_URL - Redis URL for RedisBroker (default REDIS_URL)
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+RESYNC = {'event': 'resync'}
+
+
+class LocalSubscription:
+    def __init__(self, broker, user_id, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def put(self, message):
+        """Thread-safe: hand the message to the subscriber's event loop"""
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process fan-out to the subscriptions of each user"""
+
+    # whether publish() reaches subscribers in other processes
+    cross_process = False
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, user_id, maxsize=100):
+        subscription = LocalSubscription(self, user_id, maxsize)
+        with self.lock:
+            self.subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscribers[subscription.user_id]
+
+    def publish(self, user_id, message):
+        self.dispatch(user_id, message)
+
+    def dispatch(self, user_id, message):
+        """Hand message to user_id's subscriptions in this process"""
+        with self.lock:
+            subscriptions = list(self.subscribers.get(user_id, ()))
+        self.put(subscriptions, message)
+
+    def dispatch_all(self, message):
+        with self.lock:
+            subscriptions = [s for subscriptions in self.subscribers.values() for s in subscriptions]
+        self.put(subscriptions, message)
+
+    def put(self, subscriptions, message):
+        for subscription in subscriptions:
+            try:
+                subscription.put(message)
+            except RuntimeError:
+                # the subscriber's event loop has shut down
+                self.unsubscribe(subscription)
+
+    def connection_count(self):
+        with self.lock:
+            return sum(len(subscriptions) for subscriptions in self.subscribers.values())
+
+
+class RedisBroker(LocalBroker):
+    """Cross-process fan-out over Redis pub/sub, one channel per user"""
+
+    cross_process = True
+
+    # seconds the listener waits for a message before following new or closed streams
+    poll_interval = 0.1
+    # seconds between reconnection attempts
+    retry_interval = 1.0
+
+    def __init__(self, url=None):
+        import redis
+
+        super().__init__()
+        self.url = url or getattr(settings, 'NOTIFICATIONS_BROKER_URL', None) or os.environ['REDIS_URL']
+        self.client = redis.Redis.from_url(self.url)
+        self.listener = None
+        self.stopped = threading.Event()
+
+    def channel(self, user_id):
+        return f'notifications:{user_id}'
+
+    def subscribe(self, user_id, maxsize=100):
+        subscription = super().subscribe(user_id, maxsize)
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = threading.Thread(target=self.listen, name='notifications-broker', daemon=True)
+                self.listener.start()
+        return subscription
+
+    def publish(self, user_id, message):
+        self.client.publish(self.channel(user_id), json.dumps(message))
+
+    def listen(self):
+        """Listener thread: the only user of the process's pub/sub connection"""
+        import redis
+
+        pubsub, channels = None, set()
+        while not self.stopped.is_set():
+            try:
+                if pubsub is None:
+                    pubsub, channels = self.client.pubsub(ignore_subscribe_messages=True), set()
+                with self.lock:
+                    wanted = {self.channel(user_id) for user_id in self.subscribers}
+                if wanted - channels:
+                    pubsub.subscribe(*(wanted - channels))
+                if channels - wanted:
+                    pubsub.unsubscribe(*(channels - wanted))
+                channels = wanted
+                if not channels:
+                    self.stopped.wait(self.poll_interval)
+                    continue
+                message = pubsub.get_message(timeout=self.poll_interval)
+                if message is not None:
+                    channel = message['channel']
+                    channel = channel.decode() if isinstance(channel, bytes) else channel
+                    self.dispatch(int(channel.rsplit(':', 1)[1]), json.loads(message['data']))
+            except redis.RedisError:
+                if channels:
+                    # pushes may have been missed while the connection was down
+                    self.dispatch_all(RESYNC)
+                if pubsub is not None:
+                    pubsub.reset()
+                pubsub = None
+                self.stopped.wait(self.retry_interval)
+        if pubsub is not None:
+            pubsub.close()
+
+    def close(self):
+        """Stop the listener thread"""
+        self.stopped.set()
+        if self.listener is not None:
+            self.listener.join()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Process-wide broker instance"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'NOTIFICATIONS_BROKER', 'notifications.broker.LocalBroker'))()
+        return _broker
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from django.utils.module_loading import import_string
+
+from .pipeline import OutboxBackend
+
+
+@register()
+def check_broker(app_configs, **kwargs):
+    """
+    Outbox events are delivered, and so published, by the process_notifications
+    worker. A LocalBroker there only reaches subscribers in the worker itself,
+    never the streams held by the web processes.
+    """
+    backend = import_string(getattr(settings, 'NOTIFICATIONS_BACKEND', 'notifications.pipeline.OutboxBackend'))
+    broker = import_string(getattr(settings, 'NOTIFICATIONS_BROKER', 'notifications.broker.LocalBroker'))
+    if issubclass(backend, OutboxBackend) and not getattr(broker, 'cross_process', False):
+        return [Error(
+            'NOTIFICATIONS_BACKEND queues events for the worker, but NOTIFICATIONS_BROKER '
+            'only publishes within one process, so pushed notifications never reach the streams.',
+            hint="Use 'notifications.broker.RedisBroker' (set REDIS_URL), or deliver in the web "
+                 "process with 'notifications.pipeline.LocalBackend'.",
+            id='notifications.E001',
+        )]
+    return []
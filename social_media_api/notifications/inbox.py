@@ -0,0 +1,99 @@
+"""
+Per-user inbox state: the cached unread counter and bulk mark-read.
+
+Clients poll the unread badge every few seconds, so the count is kept in a
+cache shared by every process and only recounted, on the (recipient,
+is_read, -timestamp) index, after a delivery or a mark-read changed it.
+
+Counters are versioned rather than deleted, like the follow graph
+(accounts/graph.py): each user has a version counter, a count is stored
+under the version read before counting, and deliver()/mark_read() bump the
+version with cache.incr once their transaction commits. A count taken from
+pre-commit rows is therefore left behind under the old version instead of
+pinning a stale badge.
+
+With a per-process cache the other processes would never see the bumps, so
+with NOTIFICATIONS_UNREAD_CACHE_ALIAS = None every poll is a COUNT instead.
+
+Settings:
+    NOTIFICATIONS_UNREAD_CACHE_ALIAS - entry in CACHES for the counters, None disables them (default None)
+    NOTIFICATIONS_UNREAD_TIMEOUT     - seconds a counter lives (default 300)
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Notification
+
+KEY_PREFIX = 'notifications:unread'
+
+
+def get_cache():
+    alias = getattr(settings, 'NOTIFICATIONS_UNREAD_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def version_key(user_id):
+    return f'{KEY_PREFIX}:version:{user_id}'
+
+
+def count_key(user_id, version):
+    return f'{KEY_PREFIX}:{user_id}:{version}'
+
+
+def version(cache, user_id):
+    """user_id's counter version, starting a missing one at a fresh value"""
+    key = version_key(user_id)
+    current = cache.get(key)
+    if current is None:
+        # never 1, so an evicted version cannot resurrect a count stored under an old one
+        cache.add(key, time.time_ns(), None)
+        current = cache.get(key, 0)
+    return current
+
+
+def count(user_id):
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+
+
+def unread_count(user_id):
+    cache = get_cache()
+    if cache is None:
+        return count(user_id)
+    # read the version before counting, so a change committed in between bumps past what we store
+    key = count_key(user_id, version(cache, user_id))
+    unread = cache.get(key)
+    if unread is None:
+        unread = count(user_id)
+        cache.set(key, unread, getattr(settings, 'NOTIFICATIONS_UNREAD_TIMEOUT', 300))
+    return unread
+
+
+def bump(user_ids):
+    cache = get_cache()
+    for user_id in user_ids:
+        try:
+            cache.incr(version_key(user_id))
+        except ValueError:
+            # no version yet, so no count is stored under one either
+            pass
+
+
+def changed(user_ids):
+    """Invalidate the users' counters once the current transaction commits"""
+    user_ids = set(user_ids)
+    if user_ids and get_cache() is not None:
+        transaction.on_commit(lambda: bump(user_ids))
+
+
+def mark_read(user_id, up_to_id=None):
+    """Mark the user's unread notifications (optionally only ids <= up_to_id) read in one UPDATE"""
+    unread = Notification.objects.filter(recipient_id=user_id, is_read=False)
+    if up_to_id is not None:
+        unread = unread.filter(pk__lte=up_to_id)
+    updated = unread.update(is_read=True)
+    if updated:
+        changed([user_id])
+    return updated
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.pipeline import drain
+
+
+class Command(BaseCommand):
+    help = "Drain the notification outbox in batches, coalescing events into notifications"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Events claimed per transaction (default: 500)"
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the outbox is empty (default: 1.0)"
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Drain what is queued now and exit instead of polling forever"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            handled = drain(batch_size)
+            total += handled
+            if handled:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Delivered {total} notification events"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='replaces',
+            field=models.JSONField(blank=True, default=list, help_text='Ids of the unread notifications this one superseded when it was delivered'),
+        ),
+    ]
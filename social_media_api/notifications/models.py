@@ -3,6 +3,13 @@ from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
+def summarize(actor, actor_count, verb):
+    others = actor_count - 1
+    if others <= 0:
+        return f"{actor} {verb}"
+    return f"{actor} and {others} other{'s' if others > 1 else ''} {verb}"
+
+
 class Notification(models.Model):
     recipient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -10,11 +17,17 @@ class Notification(models.Model):
         on_delete=models.CASCADE
     )
     actor = models.ForeignKey(
-        ContentType,
+        settings.AUTH_USER_MODEL,
+        related_name='actions',
         on_delete=models.CASCADE,
         null=True,
         blank=True
     )
+    verb = models.CharField(max_length=255)
+    actor_count = models.PositiveIntegerField(
+        default=1,
+        help_text="Number of actors coalesced into this notification"
+    )
     target_content_type = models.ForeignKey(
         ContentType,
         on_delete=models.CASCADE,
@@ -27,9 +40,56 @@ class Notification(models.Model):
 
     is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
+    replaces = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Ids of the unread notifications this one superseded when it was delivered"
+    )
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', '-timestamp']),
+            models.Index(fields=['recipient', '-timestamp', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.actor} {self.verb}"
+
+    def summary(self):
+        """Human readable line, e.g. 'alice and 41 others liked your post'"""
+        return summarize(self.actor, self.actor_count, self.verb)
+
+
+class NotificationEvent(models.Model):
+    """
+    Outbox row for a notification that has not been delivered yet.
+    Request handlers only insert these; the process_notifications worker
+    drains them in batches, coalesces them and writes Notification rows.
+    """
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='+',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    verb = models.CharField(max_length=255)
+    target_model = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="app_label.model of the target, resolved to a ContentType by the worker"
+    )
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
 
     def __str__(self):
-        return f"{self.actor} {self.verb}"
\ No newline at end of file
+        return f"{self.actor_id} {self.verb} -> {self.recipient_id}"
@@ -0,0 +1,181 @@
+"""
+Asynchronous notification delivery.
+
+Views call notify()/notify_many() with plain ids; nothing is resolved or
+written to the notifications table inside the request. The configured
+backend decides what happens next:
+
+- OutboxBackend (production default) inserts NotificationEvent rows in one
+  statement. The `process_notifications` worker drains them in batches.
+- LocalBackend delivers in-process straight away, so tests and local
+  development work without a worker or broker.
+
+deliver() is the dispatcher both paths share. Events with the same
+recipient, verb and target are coalesced into a single unread Notification
+("alice and 41 others liked your post") rather than one row each. A
+coalesced notification is written as a new row replacing the old one, so
+ids keep growing with activity: the inbox's (-timestamp, -id) order and
+mark-read's up_to_id never treat newer activity as already seen.
+
+Settings:
+    NOTIFICATIONS_BACKEND - dotted path of the backend class
+                            (default 'notifications.pipeline.OutboxBackend')
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from . import inbox
+from .broker import get_broker
+from .models import Notification, NotificationEvent, summarize
+
+Event = namedtuple('Event', 'recipient_id actor_id verb target_model target_object_id')
+
+
+def make_event(recipient_id, actor_id, verb, target=None):
+    """target is an optional ('app_label.model', object_id) pair"""
+    target_model, target_object_id = target or ('', None)
+    return Event(recipient_id, actor_id, verb, target_model, target_object_id)
+
+
+class OutboxBackend:
+    """Persist events to the NotificationEvent outbox for the worker"""
+
+    def send(self, events):
+        NotificationEvent.objects.bulk_create([NotificationEvent(**event._asdict()) for event in events])
+
+
+class LocalBackend:
+    """Deliver events immediately in the current process"""
+
+    def send(self, events):
+        deliver(events)
+
+
+def get_backend():
+    return import_string(getattr(settings, 'NOTIFICATIONS_BACKEND', 'notifications.pipeline.OutboxBackend'))()
+
+
+def notify(recipient_id, actor_id, verb, target=None):
+    notify_many([make_event(recipient_id, actor_id, verb, target)])
+
+
+def notify_many(events):
+    # nobody gets notified about their own actions
+    events = [event for event in events if event.recipient_id != event.actor_id]
+    if events:
+        get_backend().send(events)
+
+
+def content_type_id(target_model):
+    if not target_model:
+        return None
+    app_label, model = target_model.split('.')
+    return ContentType.objects.get_by_natural_key(app_label, model).pk
+
+
+def deliver(events):
+    """
+    Coalesce events and write them as notifications.
+    Each (recipient, verb, target) group replaces that recipient's existing
+    unread notification for the target when there is one, carrying its
+    actor count over. Only those notifications are locked. Costs one
+    SELECT, one DELETE and one bulk INSERT per call.
+    """
+    groups = {}
+    for event in events:
+        key = (event.recipient_id, event.verb, content_type_id(event.target_model), event.target_object_id)
+        actor_ids = groups.setdefault(key, [])
+        actor_ids.append(event.actor_id)
+    if not groups:
+        return 0
+
+    matches = Q()
+    for recipient_id, verb, target_content_type_id, target_object_id in groups:
+        # filter(field=None) matches NULL, for notifications without a target
+        matches |= Q(
+            recipient_id=recipient_id, verb=verb,
+            target_content_type_id=target_content_type_id, target_object_id=target_object_id,
+        )
+    with transaction.atomic():
+        existing = {}
+        for pk, *key, actor_count in (
+            Notification.objects.select_for_update().filter(matches, is_read=False)
+            .order_by('pk')
+            .values_list('pk', 'recipient_id', 'verb', 'target_content_type_id', 'target_object_id', 'actor_count')
+        ):
+            replaced, count = existing.get(tuple(key), ([], 0))
+            existing[tuple(key)] = (replaced + [pk], count + actor_count)
+
+        created = []
+        for key, actor_ids in groups.items():
+            recipient_id, verb, target_content_type_id, target_object_id = key
+            replaced, count = existing.get(key, ([], 0))
+            created.append(Notification(
+                recipient_id=recipient_id,
+                actor_id=actor_ids[-1],
+                actor_count=count + len(actor_ids),
+                verb=verb,
+                target_content_type_id=target_content_type_id,
+                target_object_id=target_object_id,
+                replaces=replaced,
+            ))
+        stale = [pk for notification in created for pk in notification.replaces]
+        if stale:
+            Notification.objects.filter(pk__in=stale).delete()
+        Notification.objects.bulk_create(created)
+        inbox.changed(key[0] for key in groups)
+        transaction.on_commit(lambda: publish(created))
+    return len(created)
+
+
+def message(notification, actor):
+    """The payload pushed for a notification, live or replayed; actor is the actor's username"""
+    return {
+        'event': 'notification',
+        'id': notification.pk,
+        'replaces': notification.replaces,
+        'actor': actor,
+        'verb': notification.verb,
+        'actor_count': notification.actor_count,
+        'summary': summarize(actor, notification.actor_count, notification.verb),
+        'is_read': notification.is_read,
+        'timestamp': notification.timestamp.isoformat() if notification.timestamp else None,
+    }
+
+
+def publish(notifications):
+    """Push delivered notifications to connected recipients (see broker.py)"""
+    usernames = dict(
+        get_user_model().objects.filter(pk__in={n.actor_id for n in notifications})
+        .values_list('pk', 'username')
+    )
+    broker = get_broker()
+    for notification in notifications:
+        broker.publish(notification.recipient_id, message(notification, usernames.get(notification.actor_id)))
+
+
+def drain(batch_size=500):
+    """
+    Deliver up to batch_size outbox events and remove them.
+    Rows are claimed with SKIP LOCKED where the database supports it, so
+    several workers can drain concurrently. Returns the number of events handled.
+    """
+    with transaction.atomic():
+        rows = list(
+            NotificationEvent.objects.select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        if not rows:
+            return 0
+        deliver([
+            Event(row.recipient_id, row.actor_id, row.verb, row.target_model, row.target_object_id)
+            for row in rows
+        ])
+        NotificationEvent.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    return len(rows)
@@ -4,6 +4,7 @@ from .models import Notification
 class NotificationSerializer(serializers.ModelSerializer):
     actor = serializers.StringRelatedField()
     recipient = serializers.StringRelatedField()
+    summary = serializers.CharField(read_only=True)
 
     class Meta:
         model = Notification
@@ -12,6 +13,12 @@ class NotificationSerializer(serializers.ModelSerializer):
             'recipient',
             'actor',
             'verb',
+            'actor_count',
+            'summary',
             'is_read',
             'timestamp'
-        )
\ No newline at end of file
+        )
+
+
+class MarkReadSerializer(serializers.Serializer):
+    up_to_id = serializers.IntegerField(min_value=1, required=False)
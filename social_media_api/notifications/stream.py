@@ -0,0 +1,113 @@
+"""
+Server-sent events endpoint pushing new notifications to their recipient.
+
+Served by the ASGI application: each open stream is a coroutine waiting on a
+broker subscription instead of a worker thread or a polling loop. Clients
+connect with EventSource and receive `notification` events, a `resync`
+event if they fell too far behind, and a comment line every
+NOTIFICATIONS_STREAM_HEARTBEAT seconds. The heartbeat keeps proxies from
+timing the connection out and surfaces dead clients, which are then
+unsubscribed. Connections are closed after NOTIFICATIONS_STREAM_MAX_AGE
+seconds; EventSource reconnects with Last-Event-ID and anything missed in
+between is replayed from the database.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .broker import get_broker
+from .models import Notification
+from .pipeline import message
+
+RETRY_MS = 3000
+REPLAY_LIMIT = 50
+
+
+def format_event(message, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f"event: {message.get('event', 'notification')}")
+    lines.append(f'data: {json.dumps(message)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def authenticate_sync(request):
+    """
+    The user of the request as DRF's configured authentication classes see it,
+    so Token keys, JWT access tokens and sessions all work. Browsers'
+    EventSource cannot set headers, so ?token= stands in for the
+    Authorization header: `Bearer` for a JWT, `Token` otherwise.
+    """
+    key = request.GET.get('token')
+    if key and 'HTTP_AUTHORIZATION' not in request.META:
+        keyword = 'Bearer' if key.count('.') == 2 else 'Token'
+        request.META['HTTP_AUTHORIZATION'] = f'{keyword} {key}'
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+async def authenticate(request):
+    return await sync_to_async(authenticate_sync)(request)
+
+
+async def missed_notifications(user, last_event_id):
+    """Notifications newer than last_event_id, as the same messages publish() pushes"""
+    notifications = (
+        Notification.objects.filter(recipient=user, pk__gt=last_event_id)
+        .select_related('actor')
+        .order_by('pk')[:REPLAY_LIMIT]
+    )
+    return [message(n, n.actor.username if n.actor else None) async for n in notifications]
+
+
+async def event_stream(user, last_event_id=None):
+    """
+    The stream's chunks. The subscription is opened once the response starts
+    and closed when it ends, however it ends, so a client gone before the
+    first chunk or a failing replay never leaves one behind.
+    """
+    heartbeat = getattr(settings, 'NOTIFICATIONS_STREAM_HEARTBEAT', 15)
+    max_age = getattr(settings, 'NOTIFICATIONS_STREAM_MAX_AGE', 3600)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+    # subscribe before replaying so nothing published in between is lost
+    subscription = get_broker().subscribe(user.pk)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        if last_event_id is not None:
+            for missed in await missed_notifications(user, last_event_id):
+                yield format_event(missed, missed['id'])
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield format_event(event, event.get('id'))
+    finally:
+        await subscription.close()
+
+
+async def notification_stream(request):
+    """GET /api/notifications/stream/ (text/event-stream)"""
+    user = await authenticate(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    response = StreamingHttpResponse(event_stream(user, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,486 @@
-from django.test import TestCase
+import asyncio
+import json
+import queue
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from accounts import tokens
+from posts.models import Post
+from .models import Notification, NotificationEvent
+from . import inbox, pipeline
+from .broker import LocalBroker, RedisBroker, RESYNC, get_broker
+from .checks import check_broker
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATIONS_BACKEND='notifications.pipeline.OutboxBackend')
+class NotificationPipelineTestCase(TestCase):
+    """Test cases for outbox delivery and coalescing"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass123')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass123') for i in range(3)]
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.target = ('posts.post', self.post.pk)
+
+    def test_outbox_backend_defers_delivery(self):
+        """Test notify only writes an outbox row until the worker runs"""
+        pipeline.notify(self.author.pk, self.fans[0].pk, 'liked your post', target=self.target)
+        self.assertEqual(NotificationEvent.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+        out = StringIO()
+        call_command('process_notifications', '--once', stdout=out)
+        self.assertFalse(NotificationEvent.objects.exists())
+        notification = Notification.objects.get()
+        self.assertEqual(notification.target, self.post)
+        self.assertIn('Delivered 1 notification events', out.getvalue())
+
+    def test_events_are_coalesced(self):
+        """Test likes on one post collapse into a single notification"""
+        for fan in self.fans:
+            pipeline.notify(self.author.pk, fan.pk, 'liked your post', target=self.target)
+        pipeline.drain()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor, self.fans[-1])
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.summary(), 'fan2 and 2 others liked your post')
+
+        pipeline.notify(self.author.pk, self.author.pk, 'liked your post', target=self.target)
+        self.assertFalse(NotificationEvent.objects.exists())
+
+    def test_read_notifications_are_not_reused(self):
+        """Test a new notification starts once the old one was read"""
+        pipeline.notify(self.author.pk, self.fans[0].pk, 'liked your post', target=self.target)
+        pipeline.drain()
+        Notification.objects.update(is_read=True)
+        pipeline.notify(self.author.pk, self.fans[1].pk, 'liked your post', target=self.target)
+        pipeline.drain()
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_coalescing_moves_the_notification_past_mark_read(self):
+        """Test a coalesced like gets a new id, so marking the old one read leaves it unread"""
+        pipeline.deliver([pipeline.make_event(self.author.pk, self.fans[0].pk, 'liked your post', self.target)])
+        seen = Notification.objects.get()
+        pipeline.deliver([pipeline.make_event(self.author.pk, self.fans[1].pk, 'liked your post', self.target)])
+        notification = Notification.objects.get()
+        self.assertGreater(notification.pk, seen.pk)
+        self.assertEqual(notification.actor_count, 2)
+        inbox.mark_read(self.author.pk, up_to_id=seen.pk)
+        self.assertFalse(Notification.objects.get().is_read)
+
+    def test_only_matching_notifications_are_locked(self):
+        """Test delivery locks the recipient's notification for the same target, not every unread one"""
+        other = Post.objects.create(author=self.author, title='Other', content='Post')
+        pipeline.deliver([pipeline.make_event(self.author.pk, self.fans[0].pk, 'liked your post', ('posts.post', other.pk))])
+        with CaptureQueriesContext(connection) as queries:
+            pipeline.deliver([pipeline.make_event(self.author.pk, self.fans[1].pk, 'liked your post', self.target)])
+        locking = next(
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and '"notifications_notification"' in query['sql']
+        )
+        self.assertIn(f'"target_object_id" = {self.post.pk}', locking)
+        self.assertEqual(Notification.objects.get(target_object_id=other.pk).actor_count, 1)
+
+
+@override_settings(NOTIFICATIONS_BACKEND='notifications.pipeline.LocalBackend')
+class LocalBackendTestCase(APITestCase):
+    """Test cases for in-process delivery from the API"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass123')
+        self.fan = User.objects.create_user(username='fan', password='pass123')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.client.force_authenticate(user=self.fan)
+
+    def test_like_notifies_author(self):
+        self.client.post(f'/api/posts/{self.post.pk}/like/')
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.verb, 'liked your post')
+        self.assertEqual(notification.actor, self.fan)
+
+    def test_comment_notifies_author(self):
+        self.client.post('/api/comments/', {'post': self.post.pk, 'content': 'Nice'})
+        self.assertTrue(Notification.objects.filter(recipient=self.author, verb='commented on your post').exists())
+
+    def test_follow_notifies_target(self):
+        self.client.post(f'/api/accounts/follow/{self.author.pk}/')
+        self.assertTrue(Notification.objects.filter(recipient=self.author, verb='started following you').exists())
+
+
+class InboxAPITestCase(APITestCase):
+    """Test cases for the notification inbox endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='pass123')
+        self.actors = [User.objects.create_user(username=f'actor{i}', password='pass123') for i in range(5)]
+        self.notifications = [
+            Notification.objects.create(recipient=self.user, actor=actor, verb='started following you')
+            for actor in self.actors
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_unread_count_is_one_indexed_query(self):
+        """Test the badge is counted on the recipient/is_read index"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.data, {'unread': 5})
+        plan = Notification.objects.filter(recipient_id=self.user.pk, is_read=False).explain()
+        self.assertIn('INDEX', plan)
+
+    def test_mark_read_up_to_id(self):
+        """Test marking read is one UPDATE bounded by id and refreshes the badge"""
+        self.client.get('/api/notifications/unread-count/')
+        up_to = self.notifications[2].pk
+        with self.assertNumQueries(1):
+            updated = inbox.mark_read(self.user.pk, up_to)
+        self.assertEqual(updated, 3)
+        response = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.data, {'unread': 2})
+
+        response = self.client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(response.data, {'updated': 2})
+
+    def test_delivery_refreshes_unread_count(self):
+        """Test new notifications show up in the badge at once"""
+        self.assertEqual(inbox.unread_count(self.user.pk), 5)
+        pipeline.deliver([pipeline.make_event(self.user.pk, self.actors[0].pk, 'liked your post')])
+        self.assertEqual(inbox.unread_count(self.user.pk), 6)
+
+    def test_inbox_is_keyset_paginated(self):
+        """Test the inbox pages with cursors and filters unread"""
+        Notification.objects.filter(pk=self.notifications[0].pk).update(is_read=True)
+        response = self.client.get('/api/notifications/?page_size=2')
+        self.assertEqual(len(response.data['results']), 2)
+        second = self.client.get(response.data['next'])
+        self.assertEqual(len(second.data['results']), 2)
+        unread = self.client.get('/api/notifications/?unread=true&page_size=10')
+        self.assertEqual(len(unread.data['results']), 4)
+
+
+
+@override_settings(NOTIFICATIONS_UNREAD_CACHE_ALIAS='default')
+class UnreadCounterTestCase(APITestCase):
+    """Test cases for the shared unread counter"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='pass123')
+        self.actors = [User.objects.create_user(username=f'actor{i}', password='pass123') for i in range(3)]
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def assertUnread(self, expected):
+        """Test the badge reads expected, then serves it again without a query"""
+        self.assertEqual(inbox.unread_count(self.user.pk), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(inbox.unread_count(self.user.pk), expected)
+
+    def deliver(self, actor, verb):
+        with self.captureOnCommitCallbacks(execute=True):
+            pipeline.deliver([pipeline.make_event(self.user.pk, actor.pk, verb)])
+
+    def test_counter_follows_deliver_and_mark_read(self):
+        """Test the cached badge stays right across deliveries, mark-read and mark-all-read"""
+        self.assertUnread(0)
+        for actor in self.actors:
+            self.deliver(actor, f'followed you {actor.pk}')
+        self.assertUnread(3)
+        # coalesced into the unread notification it replaces
+        self.deliver(self.actors[0], f'followed you {self.actors[0].pk}')
+        self.assertUnread(3)
+        up_to = Notification.objects.filter(recipient=self.user).order_by('pk')[1].pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark-read/', {'up_to_id': up_to}, format='json')
+        self.assertUnread(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertUnread(0)
+
+    def test_uncommitted_changes_are_not_cached(self):
+        """Test a count taken before the change commits is not served after it"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            pipeline.deliver([pipeline.make_event(self.user.pk, self.actors[0].pk, 'liked your post')])
+            self.assertEqual(inbox.unread_count(self.user.pk), 1)
+        Notification.objects.filter(recipient=self.user).update(is_read=True)
+        for callback in callbacks:
+            callback()
+        self.assertUnread(0)
+
+
+class BrokerTestCase(TestCase):
+    """Test cases for the in-process pub/sub broker"""
+
+    async def test_publish_fans_out_to_every_subscription(self):
+        broker = LocalBroker()
+        first, second = broker.subscribe(1), broker.subscribe(1)
+        other = broker.subscribe(2)
+        broker.publish(1, {'id': 7})
+        self.assertEqual(await asyncio.wait_for(first.get(), 1), {'id': 7})
+        self.assertEqual(await asyncio.wait_for(second.get(), 1), {'id': 7})
+        self.assertTrue(other.queue.empty())
+
+        await first.close()
+        await second.close()
+        await other.close()
+        self.assertEqual(broker.connection_count(), 0)
+
+    async def test_slow_consumer_is_told_to_resync(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe(1, maxsize=2)
+        for i in range(3):
+            broker.publish(1, {'id': i})
+        await asyncio.sleep(0)
+        self.assertEqual(await subscription.get(), RESYNC)
+        self.assertTrue(subscription.queue.empty())
+        await subscription.close()
+
+
+
+class FakeRedis:
+    """Just enough of a Redis client for RedisBroker: publish() and pub/sub connections"""
+
+    def __init__(self):
+        self.pubsubs = []
+
+    def publish(self, channel, data):
+        for pubsub in self.pubsubs:
+            if channel in pubsub.channels:
+                pubsub.messages.put({'type': 'message', 'channel': channel.encode(), 'data': data.encode()})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub()
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+
+class FakePubSub:
+    def __init__(self):
+        self.channels = set()
+        self.messages = queue.Queue()
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    def unsubscribe(self, *channels):
+        self.channels.difference_update(channels)
+
+    def get_message(self, timeout=None):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class RedisBrokerTestCase(TestCase):
+    """Test cases for the Redis broker's shared listener"""
+
+    def setUp(self):
+        self.broker = RedisBroker(url='redis://localhost:6379/0')
+        self.broker.client = FakeRedis()
+
+    def tearDown(self):
+        self.broker.close()
+
+    async def listening(self, *user_ids):
+        """Wait until the listener follows the channels of user_ids"""
+        channels = {self.broker.channel(user_id) for user_id in user_ids}
+        for _ in range(100):
+            pubsubs = self.broker.client.pubsubs
+            if pubsubs and pubsubs[0].channels == channels:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f'not listening on {channels}')
+
+    async def test_one_connection_fans_out_to_every_stream(self):
+        first, second = self.broker.subscribe(1), self.broker.subscribe(1)
+        other = self.broker.subscribe(2)
+        await self.listening(1, 2)
+        self.broker.publish(1, {'id': 7})
+        self.assertEqual(await asyncio.wait_for(first.get(), 1), {'id': 7})
+        self.assertEqual(await asyncio.wait_for(second.get(), 1), {'id': 7})
+        self.assertTrue(other.queue.empty())
+        self.assertEqual(len(self.broker.client.pubsubs), 1)
+
+        await other.close()
+        await self.listening(1)
+        await first.close()
+        await second.close()
+        await self.listening()
+
+    async def test_slow_consumer_is_told_to_resync(self):
+        subscription = self.broker.subscribe(1, maxsize=2)
+        await self.listening(1)
+        for i in range(3):
+            self.broker.publish(1, {'id': i})
+        for _ in range(100):
+            if subscription.queue.qsize() == 1 and subscription.queue._queue[0] == RESYNC:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(await subscription.get(), RESYNC)
+        self.assertTrue(subscription.queue.empty())
+        await subscription.close()
+
+
+@override_settings(
+    NOTIFICATIONS_BACKEND='notifications.pipeline.LocalBackend',
+    NOTIFICATIONS_STREAM_HEARTBEAT=0.05,
+)
+class NotificationStreamTestCase(TestCase):
+    """Test cases for the server-sent events endpoint"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='listener', password='pass123')
+        self.actor = User.objects.create_user(username='actor', password='pass123')
+        self.token = Token.objects.create(user=self.user)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_streams_heartbeats_and_new_notifications(self):
+        response = await self.async_client.get(
+            '/api/notifications/stream/', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        self.assertEqual(await anext(chunks), b': ping\n\n')
+
+        get_broker().publish(self.user.pk, {'event': 'notification', 'id': 5, 'verb': 'liked your post'})
+        chunk = await anext(chunks)
+        self.assertIn(b'id: 5\nevent: notification\n', chunk)
+        self.assertIn(b'liked your post', chunk)
+        await chunks.aclose()
+
+    @override_settings(AUTH_MODE='jwt')
+    async def test_accepts_jwt_access_tokens(self):
+        """Test the stream authenticates through the configured DRF classes"""
+        access = (await sync_to_async(tokens.issue_pair)(self.user))['access']
+        response = await self.async_client.get(f'/api/notifications/stream/?token={access}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        await response.streaming_content.aclose()
+        response = await self.async_client.get('/api/notifications/stream/', headers={'Authorization': f'Bearer {access}x'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_replays_missed_notifications(self):
+        notification = await Notification.objects.acreate(recipient=self.user, actor=self.actor, verb='started following you')
+        response = await self.async_client.get(
+            f'/api/notifications/stream/?token={self.token.key}', headers={'Last-Event-ID': '0'}
+        )
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)
+        chunk = await anext(chunks)
+        self.assertIn(f'id: {notification.pk}\n'.encode(), chunk)
+        self.assertIn(b'actor started following you', chunk)
+        await chunks.aclose()
+
+    async def test_replays_carry_replaces(self):
+        """Test a replayed notification names the notifications it superseded, as a live push does"""
+        deliver = sync_to_async(pipeline.deliver)
+        await deliver([pipeline.make_event(self.user.pk, self.actor.pk, 'liked your post')])
+        first = await Notification.objects.aget(recipient=self.user)
+        await deliver([pipeline.make_event(self.user.pk, self.actor.pk, 'liked your post')])
+        latest = await Notification.objects.aget(recipient=self.user)
+        response = await self.async_client.get(
+            f'/api/notifications/stream/?token={self.token.key}', headers={'Last-Event-ID': str(first.pk)}
+        )
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)
+        chunk = await anext(chunks)
+        await chunks.aclose()
+        data = json.loads(chunk.decode().split('data: ', 1)[1])
+        self.assertEqual(data['id'], latest.pk)
+        self.assertEqual(data['replaces'], [first.pk])
+        self.assertEqual(set(data), set(pipeline.message(latest, 'actor')))
+
+    async def test_subscription_lives_with_the_response(self):
+        """Test nothing is subscribed until the stream starts, and a failed replay unsubscribes"""
+        broker = get_broker()
+        before = broker.connection_count()
+        response = await self.async_client.get(
+            f'/api/notifications/stream/?token={self.token.key}', headers={'Last-Event-ID': '0'}
+        )
+        self.assertEqual(broker.connection_count(), before)
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)
+        self.assertEqual(broker.connection_count(), before + 1)
+        with patch('notifications.stream.missed_notifications', side_effect=OperationalError('gone')):
+            with self.assertRaises(OperationalError):
+                await anext(chunks)
+        self.assertEqual(broker.connection_count(), before)
+
+    def run_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_notifications', '--once', stdout=StringIO())
+
+    @override_settings(NOTIFICATIONS_BACKEND='notifications.pipeline.OutboxBackend')
+    async def test_worker_delivery_reaches_open_streams(self):
+        """Test an outbox event drained by the worker is pushed to the recipient's stream"""
+        response = await self.async_client.get(
+            '/api/notifications/stream/', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)
+
+        await sync_to_async(pipeline.notify)(self.user.pk, self.actor.pk, 'started following you')
+        self.assertFalse(await Notification.objects.filter(recipient=self.user).aexists())
+        await sync_to_async(self.run_worker)()
+        notification = await Notification.objects.aget(recipient=self.user)
+        chunk = await anext(chunks)
+        while chunk == b': ping\n\n':
+            chunk = await anext(chunks)
+        self.assertIn(f'id: {notification.pk}\nevent: notification\n'.encode(), chunk)
+        self.assertIn(b'actor started following you', chunk)
+        await chunks.aclose()
+
+    def test_delivery_publishes_after_commit(self):
+        with patch.object(LocalBroker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                pipeline.notify(self.user.pk, self.actor.pk, 'started following you')
+        recipient_id, message = publish.call_args.args
+        self.assertEqual(recipient_id, self.user.pk)
+        self.assertEqual(message['summary'], 'actor started following you')
+
+
+class BrokerCheckTestCase(TestCase):
+    """Test cases for the notifications.E001 system check"""
+
+    @override_settings(
+        NOTIFICATIONS_BACKEND='notifications.pipeline.OutboxBackend',
+        NOTIFICATIONS_BROKER='notifications.broker.LocalBroker',
+    )
+    def test_outbox_requires_a_shared_broker(self):
+        self.assertEqual([error.id for error in check_broker(None)], ['notifications.E001'])
+
+    @override_settings(
+        NOTIFICATIONS_BACKEND='notifications.pipeline.OutboxBackend',
+        NOTIFICATIONS_BROKER='notifications.broker.RedisBroker',
+    )
+    def test_outbox_with_redis_broker(self):
+        self.assertEqual(check_broker(None), [])
+
+    @override_settings(
+        NOTIFICATIONS_BACKEND='notifications.pipeline.LocalBackend',
+        NOTIFICATIONS_BROKER='notifications.broker.LocalBroker',
+    )
+    def test_local_delivery_with_local_broker(self):
+        self.assertEqual(check_broker(None), [])
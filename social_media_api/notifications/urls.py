@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import NotificationListView
+from .views import NotificationListView, UnreadCountView, MarkReadView
+from .stream import notification_stream
 
 urlpatterns = [
-    path('', NotificationListView(), name='notifications')
+    path('', NotificationListView.as_view(), name='notifications'),
+    path('unread-count/', UnreadCountView.as_view(), name='notifications-unread-count'),
+    path('mark-read/', MarkReadView.as_view(), name='notifications-mark-read'),
+    path('stream/', notification_stream, name='notifications-stream'),
 ]
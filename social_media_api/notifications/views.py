@@ -1,14 +1,52 @@
-from django.shortcuts import render
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from posts.pagination import KeysetPagination
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import NotificationSerializer, MarkReadSerializer
+from . import inbox
 
-# Create your views here.
-class NotificationListView(generics.ListApiView):
+
+class NotificationPagination(KeysetPagination):
+    key_field = 'timestamp'
+
+
+class NotificationListView(generics.ListAPIView):
+    """
+    The current user's inbox, newest first and keyset paginated.
+    ?unread=true limits it to unread notifications.
+    """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationPagination
+    filter_backends = []
 
     def get_queryset(self):
-        return Notification.objects.filter(
+        queryset = Notification.objects.filter(
             recipient=self.request.user
-        )
-    
\ No newline at end of file
+        ).select_related('actor', 'recipient')
+        if self.request.query_params.get('unread') in ('1', 'true', 'True'):
+            queryset = queryset.filter(is_read=False)
+        return queryset
+
+
+class UnreadCountView(APIView):
+    """Unread badge, cached per user when a shared cache is configured: GET -> {"unread": n}"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': inbox.unread_count(request.user.pk)})
+
+
+class MarkReadView(APIView):
+    """
+    Mark notifications read in one UPDATE: POST {"up_to_id": X}
+    Omitting up_to_id marks the whole inbox read.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = inbox.mark_read(request.user.pk, serializer.validated_data.get('up_to_id'))
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
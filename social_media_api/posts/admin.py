@@ -8,10 +8,11 @@ class PostAdmin(admin.ModelAdmin):
     """
     Admin config for post model
     """
-    list_display = ['title', 'author', 'created_at', 'updated_at', 'get_comments_count']
+    list_display = ['title', 'author', 'created_at', 'updated_at', 'comments_count', 'likes_count']
+    list_select_related = ['author']
     list_filter = ['created_at', 'updated_at', 'author']
     search_fields = ['title', 'content', 'author__username']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'comments_count', 'likes_count']
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
 
@@ -19,19 +20,15 @@ class PostAdmin(admin.ModelAdmin):
     ('Post Information', {
         'fields': ('author', 'title', 'content')
     }),
+    ('Counters', {
+        'fields': ('comments_count', 'likes_count'),
+    }),
     ('Timestamps', {
         'fields': ('created_at', 'updated_at'),
         'classes': ('collapse',)
     }),
     )
 
-    def get_comments_count(self, obj):
-        """
-        display comment count in admin list 
-        """
-        return obj.get_comments_count()
-    get_comments_count.short_description = 'Comments'
-
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     """
@@ -0,0 +1,258 @@
+"""
+Bulk ingestion of posts and comments.
+
+POST /api/posts/bulk/ and /api/comments/bulk/ take NDJSON (one object per
+line, Content-Type application/x-ndjson) or a JSON array. The body is read
+and decoded incrementally, an item at a time, so a request of thousands of
+items never becomes one big parsed list. Each item is checked with the same
+rules as the single-item serializers, but as plain functions: building a
+DRF serializer per item costs more than the INSERT it guards.
+
+Valid items are written POSTS_INGEST_CHUNK_SIZE at a time, each chunk with
+bulk_create in its own transaction. bulk_create sends no signals, so the
+work the receivers would do runs here once per chunk instead of once per
+row: author and post counters, the search index, timeline fan-out and
+comment notifications. An invalid item is reported with its index and
+skipped; it never fails the rest of the batch. Chunks written before a
+later error (even an unreadable body) stay written. A body without a single
+item is reported as an error too, so it is refused rather than "created: 0".
+
+Settings:
+    POSTS_INGEST_CHUNK_SIZE - items written per transaction (default 500)
+    POSTS_INGEST_MAX_ITEMS  - items accepted per request (default 10000)
+"""
+import codecs
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from notifications.pipeline import make_event, notify_many
+from social_media_api.caching import invalidate
+from accounts.models import adjust_user_counter
+
+from . import search, timeline
+from .models import Comment, Post, post_tag
+
+CHUNK_SIZE = getattr(settings, 'POSTS_INGEST_CHUNK_SIZE', 500)
+MAX_ITEMS = getattr(settings, 'POSTS_INGEST_MAX_ITEMS', 10000)
+READ_SIZE = 64 * 1024
+NDJSON = 'application/x-ndjson'
+
+
+class MalformedBody(ValueError):
+    """The body cannot be read any further"""
+
+
+def iter_ndjson(stream):
+    """Yield (item, error) per non-blank line; a line that is not JSON is an error, not the end"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError as e:
+            yield None, f"Invalid JSON: {e}"
+
+
+def iter_json_array(stream):
+    """
+    Yield (item, None) for each element of a JSON array, decoding the
+    stream READ_SIZE bytes at a time. Raises MalformedBody where the array breaks.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, done = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, done
+        chunk = stream.read(READ_SIZE)
+        done = not chunk
+        buffer = buffer[pos:] + text.decode(chunk, final=done)
+        pos = 0
+
+    def next_char():
+        """The next non-whitespace character, None at the end of the body"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if done:
+                return None
+            fill()
+
+    if next_char() != '[':
+        raise MalformedBody("Expected a JSON array or NDJSON.")
+    pos += 1
+    first = True
+    while True:
+        char = next_char()
+        if char is None:
+            raise MalformedBody("Unterminated JSON array.")
+        if char == ']':
+            return
+        if not first:
+            if char != ',':
+                raise MalformedBody("Expected ',' between array items.")
+            pos += 1
+            if next_char() is None:
+                raise MalformedBody("Unterminated JSON array.")
+        first = False
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except ValueError as e:
+                if done:
+                    raise MalformedBody(f"Invalid JSON: {e}")
+                fill()
+                continue
+            # a number at the end of the buffer may go on in the next read
+            if end == len(buffer) and not done:
+                fill()
+                continue
+            break
+        pos = end
+        yield item, None
+
+
+def read_items(request):
+    """(item, error) pairs from the request body, by Content-Type"""
+    stream = request.stream
+    if stream is None:
+        return iter(())
+    if request.content_type.split(';')[0].strip() == NDJSON:
+        return iter_ndjson(stream)
+    return iter_json_array(stream)
+
+
+def text_field(item, name, max_length=None):
+    """(value, errors) for a required, non-blank string, stripped like DRF's CharField"""
+    if name not in item:
+        return None, ["This field is required."]
+    value = item[name]
+    if not isinstance(value, str):
+        return None, ["Not a valid string."]
+    value = value.strip()
+    if not value:
+        return None, ["This field may not be blank."]
+    if max_length is not None and len(value) > max_length:
+        return None, [f"Ensure this field has no more than {max_length} characters."]
+    return value, None
+
+
+def validate_post(item):
+    """(fields, errors) of one post item"""
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ["Expected an object."]}
+    fields, errors = {}, {}
+    for name in ('title', 'content'):
+        fields[name], field_errors = text_field(item, name, Post._meta.get_field(name).max_length)
+        if field_errors:
+            errors[name] = field_errors
+    return (None, errors) if errors else (fields, None)
+
+
+def validate_comment(item):
+    """(fields, errors) of one comment item; the post's existence is checked per chunk"""
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ["Expected an object."]}
+    fields, errors = {}, {}
+    post = item.get('post', item.get('post_id'))
+    if post is None:
+        errors['post'] = ["This field is required."]
+    elif isinstance(post, bool) or not isinstance(post, int):
+        errors['post'] = [f"Incorrect type. Expected pk value, received {type(post).__name__}."]
+    else:
+        fields['post_id'] = post
+    fields['content'], content_errors = text_field(item, 'content')
+    if content_errors:
+        errors['content'] = content_errors
+    return (None, errors) if errors else (fields, None)
+
+
+def write_posts(user, chunk):
+    """Insert a chunk of (index, fields) posts; returns ([(index, id)], [])"""
+    with transaction.atomic():
+        posts = Post.objects.bulk_create([Post(author_id=user.pk, **fields) for _, fields in chunk])
+        adjust_user_counter([user.pk], 'posts_count', len(posts))
+        search.index_posts(posts)
+    timeline.fan_out_many(posts)
+    return [(index, post.pk) for (index, _), post in zip(chunk, posts)], []
+
+
+def write_comments(user, chunk):
+    """Insert a chunk of (index, fields) comments on existing posts; returns ([(index, id)], errors)"""
+    authors = dict(
+        Post.objects.filter(pk__in={fields['post_id'] for _, fields in chunk}).values_list('pk', 'author_id')
+    )
+    errors = [
+        {'index': index, 'errors': {'post': [f'Invalid pk "{fields["post_id"]}" - object does not exist.']}}
+        for index, fields in chunk if fields['post_id'] not in authors
+    ]
+    chunk = [(index, fields) for index, fields in chunk if fields['post_id'] in authors]
+    if not chunk:
+        return [], errors
+
+    with transaction.atomic():
+        comments = Comment.objects.bulk_create([Comment(author_id=user.pk, **fields) for _, fields in chunk])
+        per_post = Counter(comment.post_id for comment in comments)
+        # one UPDATE per distinct increment, usually a single one
+        by_delta = {}
+        for post_id, delta in per_post.items():
+            by_delta.setdefault(delta, []).append(post_id)
+        for delta, post_ids in by_delta.items():
+            Post.objects.filter(pk__in=post_ids).update(comments_count=F('comments_count') + delta)
+    invalidate(*(post_tag(post_id) for post_id in per_post))
+    notify_many([
+        make_event(authors[post_id], user.pk, "commented on your post", target=('posts.post', post_id))
+        for post_id in per_post
+    ])
+    return [(index, comment.pk) for (index, _), comment in zip(chunk, comments)], errors
+
+
+def ingest(user, items, validate, write, chunk_size=None, max_items=None):
+    """
+    Validate (item, error) pairs as they are read and write the valid ones
+    in chunks. Returns {'created': n, 'ids': [...], 'errors': [{'index', 'errors'}, ...]}.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    max_items = max_items or MAX_ITEMS
+    ids, errors, chunk = [], [], []
+
+    def flush():
+        written, failed = write(user, chunk)
+        ids.extend(written)
+        errors.extend(failed)
+        chunk.clear()
+
+    read = 0
+    try:
+        for item, error in items:
+            index, read = read, read + 1
+            if index >= max_items:
+                errors.append({'index': index, 'errors': {'non_field_errors': [f"At most {max_items} items per request."]}})
+                break
+            fields, item_errors = (None, {'non_field_errors': [error]}) if error else validate(item)
+            if item_errors:
+                errors.append({'index': index, 'errors': item_errors})
+                continue
+            chunk.append((index, fields))
+            if len(chunk) >= chunk_size:
+                flush()
+    except MalformedBody as e:
+        errors.append({'index': read, 'errors': {'non_field_errors': [str(e)]}})
+    if not read and not errors:
+        # an empty body (no stream at all) or an empty array is a bad request, not "0 created"
+        errors.append({'index': 0, 'errors': {'non_field_errors': ["No items in the request body."]}})
+    if chunk:
+        flush()
+
+    if ids:
+        invalidate('posts', 'comments', 'users')
+    errors.sort(key=lambda error: error['index'])
+    return {'created': len(ids), 'ids': [pk for _, pk in sorted(ids)], 'errors': errors}
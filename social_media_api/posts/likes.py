@@ -0,0 +1,157 @@
+"""
+Liking and unliking posts.
+
+Both operations are idempotent, so a double tap has the same result as a
+single one, and they stay correct when requests race. Post.likes_count
+changes only when a Like row was really inserted or deleted.
+
+On PostgreSQL each operation is a single statement, so it costs one round
+trip: a data-modifying CTE inserts the like with ON CONFLICT DO NOTHING, or
+deletes it with RETURNING, and bumps the counter only if a row came back. It
+also returns the post's author and its new count. Other databases have no
+writable CTEs, so there the same steps run in one transaction: a guarded
+INSERT ... SELECT ... WHERE NOT EXISTS whose row count says whether the like
+is new, with the unique (user, post) constraint settling the rare race the
+guard misses.
+
+Both paths write SQL directly, so the Like signal receivers do not run;
+the counter and the response cache are handled here instead.
+
+Listings show whether the reader liked each post through with_liked_by_me(),
+an EXISTS subquery in the listing's own query rather than a lookup per row.
+"""
+from collections import namedtuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from social_media_api.caching import invalidate
+
+from .models import Like, Post, adjust_post_counter, post_tag
+
+LikeResult = namedtuple('LikeResult', 'changed author_id likes_count')
+
+LIKE_SQL = """
+WITH target AS (
+    SELECT id, author_id, likes_count FROM {post} WHERE id = %(post_id)s
+), inserted AS (
+    INSERT INTO {like} (user_id, post_id, created_at)
+    SELECT %(user_id)s, id, %(now)s FROM target
+    ON CONFLICT (user_id, post_id) DO NOTHING
+    RETURNING post_id
+), counted AS (
+    UPDATE {post} SET likes_count = likes_count + 1
+    WHERE id IN (SELECT post_id FROM inserted)
+    RETURNING likes_count
+)
+SELECT EXISTS (SELECT 1 FROM inserted), author_id,
+       COALESCE((SELECT likes_count FROM counted), likes_count)
+FROM target
+"""
+
+UNLIKE_SQL = """
+WITH target AS (
+    SELECT id, author_id, likes_count FROM {post} WHERE id = %(post_id)s
+), deleted AS (
+    DELETE FROM {like} WHERE user_id = %(user_id)s AND post_id IN (SELECT id FROM target)
+    RETURNING post_id
+), counted AS (
+    UPDATE {post} SET likes_count = GREATEST(likes_count - 1, 0)
+    WHERE id IN (SELECT post_id FROM deleted)
+    RETURNING likes_count
+)
+SELECT EXISTS (SELECT 1 FROM deleted), author_id,
+       COALESCE((SELECT likes_count FROM counted), likes_count)
+FROM target
+"""
+
+INSERT_SQL = """
+INSERT INTO {like} (user_id, post_id, created_at)
+SELECT %s, id, %s FROM {post}
+WHERE id = %s AND NOT EXISTS (SELECT 1 FROM {like} WHERE user_id = %s AND post_id = {post}.id)
+"""
+
+
+def run_statement(sql, user_id, post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql.format(post=Post._meta.db_table, like=Like._meta.db_table),
+            {'user_id': user_id, 'post_id': post_id, 'now': timezone.now()}
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise Post.DoesNotExist(f"Post {post_id} does not exist")
+    return LikeResult(*row)
+
+
+def target(post_id):
+    row = Post.objects.filter(pk=post_id).values_list('author_id', 'likes_count').first()
+    if row is None:
+        raise Post.DoesNotExist(f"Post {post_id} does not exist")
+    return row
+
+
+def like(user_id, post_id):
+    """
+    Make user_id like post_id.
+    Returns a LikeResult whose changed is False when it was liked already.
+    Raises Post.DoesNotExist for an unknown post.
+    """
+    if connection.vendor == 'postgresql':
+        result = run_statement(LIKE_SQL, user_id, post_id)
+    else:
+        try:
+            with transaction.atomic():
+                author_id, likes_count = target(post_id)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        INSERT_SQL.format(post=Post._meta.db_table, like=Like._meta.db_table),
+                        [user_id, connection.ops.adapt_datetimefield_value(timezone.now()), post_id, user_id]
+                    )
+                    inserted = cursor.rowcount
+                if inserted:
+                    adjust_post_counter(post_id, 'likes_count', 1)
+                result = LikeResult(bool(inserted), author_id, likes_count + inserted)
+        except IntegrityError:
+            # the same like was inserted concurrently, between the check and the insert
+            result = LikeResult(False, *target(post_id))
+    if result.changed:
+        invalidate(post_tag(post_id))
+    return result
+
+
+def unlike(user_id, post_id):
+    """
+    Make user_id stop liking post_id.
+    Returns a LikeResult whose changed is False when it was not liked.
+    Raises Post.DoesNotExist for an unknown post.
+    """
+    if connection.vendor == 'postgresql':
+        result = run_statement(UNLIKE_SQL, user_id, post_id)
+    else:
+        with transaction.atomic():
+            author_id, likes_count = target(post_id)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {Like._meta.db_table} WHERE user_id = %s AND post_id = %s",
+                    [user_id, post_id]
+                )
+                deleted = cursor.rowcount
+            if deleted:
+                adjust_post_counter(post_id, 'likes_count', -1)
+            result = LikeResult(bool(deleted), author_id, max(likes_count - deleted, 0))
+    if result.changed:
+        invalidate(post_tag(post_id))
+    return result
+
+
+def with_liked_by_me(queryset, user):
+    """
+    queryset annotated with liked_by_me for user, answered by the
+    (user, post) unique index inside the same query. Anonymous users
+    get the queryset unchanged; serializers read a missing flag as False.
+    """
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(liked_by_me=Exists(Like.objects.filter(user=user.pk, post=OuterRef('pk'))))
@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from social_media_api import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Measure query counts and latency of every API endpoint against the benchmark baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help="Seed bench data first (use a dedicated, empty database)"
+        )
+        parser.add_argument(
+            '--profile',
+            choices=sorted(benchmarks.PROFILES),
+            default='small',
+            help="Data volume to seed (default: small; large is 100k posts and 1M follow edges)"
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=30,
+            help="Requests per scenario (default: 30)"
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            dest='scenarios',
+            choices=sorted(benchmarks.SCENARIOS),
+            help="Only run this scenario; repeat for several"
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(benchmarks.BASELINE),
+            help="Baseline JSON with per-scenario budgets"
+        )
+        parser.add_argument(
+            '--latency-tolerance',
+            type=float,
+            default=benchmarks.LATENCY_TOLERANCE,
+            help="Allowed p95 growth over the baseline, e.g. 0.25 for 25%%"
+        )
+        parser.add_argument(
+            '--queries-only',
+            action='store_true',
+            help="Ignore latency budgets, e.g. on CI machines unlike the one that wrote the baseline"
+        )
+        parser.add_argument(
+            '--output',
+            help="Also write the full results to this JSON file"
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help="Write these results to the baseline instead of checking them"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['seed']:
+                counts = benchmarks.seed(options['profile'])
+                self.stdout.write(f"Seeded {counts['users']} users, {counts['posts']} posts, {counts['follows']} follow edges")
+            results = benchmarks.run(options['iterations'], options['scenarios'])
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e))
+
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<28} {stats['queries']:>3} queries  "
+                f"p50 {stats['p50_ms']:>8.2f}ms  p95 {stats['p95_ms']:>8.2f}ms  p99 {stats['p99_ms']:>8.2f}ms"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'iterations': options['iterations'], 'scenarios': results}, f, indent=2, sort_keys=True)
+
+        if options['update_baseline']:
+            benchmarks.save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        tolerance = None if options['queries_only'] else options['latency_tolerance']
+        failures = benchmarks.check(results, benchmarks.load_baseline(options['baseline']), tolerance)
+        if failures:
+            raise CommandError("Budgets exceeded:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"All {len(results)} scenarios within budget"))
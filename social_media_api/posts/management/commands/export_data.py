@@ -0,0 +1,59 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = "Stream posts, comments or likes as NDJSON or CSV in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.DATASETS))
+        parser.add_argument(
+            '--format',
+            choices=sorted(export.FORMATS),
+            default='ndjson',
+            help="Output format (default: ndjson)"
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help="Compress the output with gzip"
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            default=None,
+            help="Only export this user's rows"
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help="File to write, - for stdout (default: -)"
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help="Rows fetched per round trip (default: POSTS_EXPORT_CHUNK_SIZE, 2000)"
+        )
+
+    def handle(self, *args, **options):
+        chunks = export.stream(
+            options['dataset'], options['format'], compress=options['gzip'],
+            user_id=options['user'], chunk_size=options['chunk_size']
+        )
+        if options['output'] == '-':
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            return
+        try:
+            with open(options['output'], 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        except OSError as e:
+            raise CommandError(e)
+        self.stderr.write(self.style.SUCCESS(f"Exported {options['dataset']} to {options['output']}"))
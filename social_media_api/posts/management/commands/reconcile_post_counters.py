@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Like, Post
+
+
+def actual_count(model):
+    """Correlated subquery counting model rows that point at the outer post"""
+    counts = (
+        model.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.comments_count and Post.likes_count where they have drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help="Number of post ids covered by each UPDATE (default: 5000)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report drifted posts without writing"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        last_id = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        fixed = {'comments_count': 0, 'likes_count': 0}
+
+        for start in range(0, last_id, batch_size):
+            window = Post.objects.filter(pk__gt=start, pk__lte=start + batch_size)
+            with transaction.atomic():
+                for field, model in (('comments_count', Comment), ('likes_count', Like)):
+                    drifted = window.annotate(actual=actual_count(model)).exclude(**{field: F('actual')})
+                    if dry_run:
+                        fixed[field] += drifted.count()
+                    else:
+                        ids = list(drifted.values_list('pk', flat=True))
+                        if ids:
+                            fixed[field] += Post.objects.filter(pk__in=ids).update(**{field: actual_count(model)})
+
+        verb = "Would fix" if dry_run else "Fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {fixed['comments_count']} comment counters and {fixed['likes_count']} like counters"
+        ))
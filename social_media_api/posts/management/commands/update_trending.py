@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = "Fold new likes and comments into the trending ranking in windowed batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help="Events read per window (default: TRENDING_BATCH_SIZE, 5000)"
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=30.0,
+            help="Seconds between passes (default: 30)"
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Run a single pass and exit instead of polling forever"
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            total += trending.update(options['batch_size'])
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Ranked {total} like and comment events"))
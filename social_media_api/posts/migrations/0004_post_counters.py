@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    for field, model_name in (('comments_count', 'Comment'), ('likes_count', 'Like')):
+        model = apps.get_model('posts', model_name)
+        counts = (
+            model.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        Post.objects.update(**{field: Coalesce(Subquery(counts, output_field=IntegerField()), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, help_text='Denormalized number of comments, kept in step by signals'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, help_text='Denormalized number of likes, kept in step by signals'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
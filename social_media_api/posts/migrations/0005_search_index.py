@@ -0,0 +1,99 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:27
+
+import re
+from collections import Counter
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+GIN_INDEX = 'posts_post_search_vector_gin'
+
+# A frozen copy of the posts/search.py tokenizer as of this migration, so later
+# changes to the app code cannot change what it does.
+CONFIG = getattr(settings, 'POSTS_SEARCH_CONFIG', 'english')
+TITLE_WEIGHT = 4
+CONTENT_WEIGHT = 1
+MAX_TERM_LENGTH = 64
+BATCH_SIZE = 1000
+TOKEN_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have he her his i if in into is it its '
+    'me my no not of on or our she so such that the their them then there these they '
+    'this to was we were will with you your'.split()
+)
+
+
+def tokenize(text):
+    terms = []
+    for token in TOKEN_RE.findall(text or ''):
+        term = token.lower()
+        if len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+            term = term[:-1]
+        if term not in STOP_WORDS and len(term) <= MAX_TERM_LENGTH:
+            terms.append(term)
+    return terms
+
+
+def weighted_terms(title, content):
+    scores = Counter()
+    for term in tokenize(title):
+        scores[term] += TITLE_WEIGHT
+    for term in tokenize(content):
+        scores[term] += CONTENT_WEIGHT
+    return scores
+
+
+def build_index(apps, schema_editor):
+    from django.contrib.postgres.search import SearchVector
+
+    Post = apps.get_model('posts', 'Post')
+    if schema_editor.connection.vendor == 'postgresql':
+        # GIN is PostgreSQL-only, so it cannot be declared in Meta.indexes
+        schema_editor.execute(f'CREATE INDEX {GIN_INDEX} ON posts_post USING gin (search_vector)')
+        Post.objects.update(
+            search_vector=SearchVector('title', weight='A', config=CONFIG)
+            + SearchVector('content', weight='B', config=CONFIG)
+        )
+        return
+    PostSearchTerm = apps.get_model('posts', 'PostSearchTerm')
+    rows = (
+        PostSearchTerm(term=term, post_id=pk, score=score)
+        for pk, title, content in Post.objects.values_list('pk', 'title', 'content').iterator()
+        for term, score in weighted_terms(title, content).items()
+    )
+    PostSearchTerm.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {GIN_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted title/content tsvector, PostgreSQL only (see posts/search.py)', null=True),
+        ),
+        migrations.CreateModel(
+            name='PostSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('score', models.PositiveIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post')),
+            ],
+            options={
+                'unique_together': {('term', 'post')},
+            },
+        ),
+        migrations.RunPython(build_index, drop_index),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from accounts.models import adjust_user_counter
+from social_media_api.caching import invalidate
 
 User = get_user_model()
 
@@ -19,6 +26,23 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Denormalized number of comments, kept in step by signals"
+    )
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Denormalized number of likes, kept in step by signals"
+    )
+    fanned_out = models.BooleanField(
+        default=False,
+        help_text="Whether this post was pushed into follower timelines"
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text="Weighted title/content tsvector, PostgreSQL only (see posts/search.py)"
+    )
 
     class Meta:
         ordering = ['-created_at']
@@ -27,6 +51,11 @@ class Post(models.Model):
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['author']),
+            models.Index(
+                fields=['author', '-created_at'],
+                condition=models.Q(fanned_out=False),
+                name='posts_post_pull_idx'
+            ),
         ]
 
     def __str__(self):
@@ -88,4 +117,202 @@ class Like(models.Model):
 
         def __str__(self):
             return f"{self.user} liked {self.post.id}"
-    
\ No newline at end of file
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline row: one per (follower, post) pair.
+    Written when a post is fanned out so feed reads are a range scan on owner.
+    """
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        help_text="The user whose home timeline this entry belongs to"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        help_text="Copied from the post so unfollows can drop entries cheaply"
+    )
+    created_at = models.DateTimeField(help_text="Copied from the post")
+
+    class Meta:
+        ordering = ['-created_at', '-post']
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post']),
+            models.Index(fields=['owner', 'author']),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.owner_id}"
+
+
+class PostSearchTerm(models.Model):
+    """
+    Inverted index row for databases without full-text search: one per
+    (term, post), scored by weighted term frequency.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('term', 'post')
+
+    def __str__(self):
+        return f"{self.term!r} in post {self.post_id}"
+
+
+class TrendingScore(models.Model):
+    """
+    Precomputed trending rank of a post: the logarithm of its time-decayed
+    engagement, measured against a fixed epoch (see posts/trending.py).
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending'
+    )
+    score = models.FloatField(help_text="log of the engagement decayed to the trending epoch")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score']),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} trending at {self.score:.2f}"
+
+
+class TrendingCursor(models.Model):
+    """How far the trending updater has read an event table"""
+    source = models.CharField(max_length=32, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.source} up to {self.last_id}"
+
+
+def adjust_post_counter(post_id, field, delta):
+    """Atomically add delta to one of a post's denormalized counters"""
+    Post.objects.filter(pk=post_id).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def post_tag(post_id):
+    """Cache tag of everything rendering one post (see social_media_api/caching.py)"""
+    return f'post:{post_id}'
+
+
+def post_tags(data):
+    """
+    depends_on for cached post listings: the tags of the posts in a page,
+    a list or a search result. None when a post was rendered without its id.
+    """
+    items = data.get('results', []) if isinstance(data, dict) else data
+    if any('id' not in item for item in items):
+        return None
+    return [post_tag(item['id']) for item in items]
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_cache(sender, instance, created, **kwargs):
+    # the 'posts' tag covers which posts listings hold, so edits leave it alone
+    if created:
+        invalidate('posts')
+    else:
+        invalidate(post_tag(instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_cache(sender, instance, **kwargs):
+    invalidate('posts', post_tag(instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def increment_posts_count(sender, instance, created, **kwargs):
+    if created:
+        adjust_user_counter([instance.author_id], 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_posts_count(sender, instance, **kwargs):
+    adjust_user_counter([instance.author_id], 'posts_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, update_fields, using, **kwargs):
+    if update_fields is None or {'title', 'content'} & set(update_fields):
+        from . import search
+
+        search.index_post(instance, using=using)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_cache(sender, instance, **kwargs):
+    # post detail embeds comments and comments_count
+    invalidate('comments', post_tag(instance.post_id))
+
+
+@receiver([post_save, post_delete], sender=Like)
+def invalidate_like_cache(sender, instance, **kwargs):
+    invalidate(post_tag(instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+def increment_comments_count(sender, instance, created, **kwargs):
+    if created:
+        adjust_post_counter(instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comments_count(sender, instance, **kwargs):
+    adjust_post_counter(instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Like)
+def increment_likes_count(sender, instance, created, **kwargs):
+    if created:
+        adjust_post_counter(instance.post_id, 'likes_count', 1)
+
+
+@receiver(post_delete, sender=Like)
+def decrement_likes_count(sender, instance, **kwargs):
+    adjust_post_counter(instance.post_id, 'likes_count', -1)
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def sync_timeline_on_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep materialized timelines in step with the follow graph.
+    reverse=False means instance.followers changed, reverse=True means instance.following changed.
+    """
+    from . import timeline
+
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            follower_ids, author_ids = [instance.pk], pk_set
+        else:
+            follower_ids, author_ids = pk_set, [instance.pk]
+        if action == 'post_add':
+            timeline.backfill(follower_ids, author_ids)
+        else:
+            timeline.evict(follower_ids, author_ids)
+    elif action == 'pre_clear':
+        if reverse:
+            TimelineEntry.objects.filter(owner=instance).delete()
+        else:
+            TimelineEntry.objects.filter(author=instance).delete()
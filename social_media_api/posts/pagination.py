@@ -0,0 +1,166 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over (key_field, id), created_at by default.
+
+    Each page is fetched with a WHERE on the last seen key instead of OFFSET,
+    so it matches the -created_at indexes, costs the same at any depth, skips
+    the COUNT(*) query and never repeats or drops rows when new ones are inserted.
+    Pass ?ordering=<key_field> for oldest-first; anything else pages newest-first.
+    """
+    key_field = 'created_at'
+    page_size = api_settings.PAGE_SIZE or 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.descending = self.is_descending(queryset)
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[0] == 'p'
+        # newest-first walks towards smaller keys, unless we are going back a page
+        seek_lower = self.descending != reverse
+        after = cursor[1:] if cursor is not None else None
+        rows = self.seek(queryset, after, seek_lower, self.page_size + 1)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        has_next = True if reverse else has_more
+        has_previous = has_more if reverse else cursor is not None
+        self.next_key = self.row_key(rows[-1]) if rows and has_next else None
+        self.previous_key = self.row_key(rows[0]) if rows and has_previous else None
+        return rows
+
+    def seek(self, queryset, after, seek_lower, limit):
+        """Up to limit rows past the (key, id) position after, walking towards lower keys when seek_lower"""
+        prefix = '-' if seek_lower else ''
+        key = self.key_field
+        queryset = queryset.order_by(f'{prefix}{key}', f'{prefix}id')
+        if after is not None:
+            position, pk = after
+            op = 'lt' if seek_lower else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{key}__{op}': position}) | Q(**{key: position, f'id__{op}': pk})
+            )
+        return list(queryset[:limit])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def is_descending(self, queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return not (ordering and ordering[0] == self.key_field)
+
+    def row_key(self, obj):
+        # pages of values() rows (see social_media_api/readpath.py) are dicts
+        if isinstance(obj, dict):
+            return obj[self.key_field], obj['id']
+        return getattr(obj, self.key_field), obj.pk
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        return self.encode_cursor('n', *self.next_key)
+
+    def get_previous_link(self):
+        if self.previous_key is None:
+            return None
+        return self.encode_cursor('p', *self.previous_key)
+
+    def encode_position(self, position):
+        return position.isoformat()
+
+    def decode_position(self, raw):
+        return datetime.fromisoformat(raw)
+
+    def encode_cursor(self, direction, position, pk):
+        raw = f'{direction}|{self.encode_position(position)}|{pk}'
+        token = base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            direction, position, pk = base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii').split('|')
+            if direction not in ('n', 'p'):
+                raise ValueError(direction)
+            return direction, self.decode_position(position), int(pk)
+        except (ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class TimelinePagination(KeysetPagination):
+    """
+    Keyset pagination of the reader's home feed. The page's keys are sought
+    on the reader's timeline (see posts/timeline.py), then only those posts
+    are loaded from the view's queryset.
+    """
+
+    def seek(self, queryset, after, seek_lower, limit):
+        from . import timeline
+
+        keys = timeline.window(self.request.user.pk, limit, after, newest_first=seek_lower)
+        rows = {self.row_key(row)[1]: row for row in queryset.filter(pk__in=[pk for _, pk in keys])}
+        return [rows[pk] for _, pk in keys if pk in rows]
@@ -0,0 +1,220 @@
+"""
+Full-text search over posts.
+
+On PostgreSQL each post carries a weighted tsvector in `search_vector`
+(title 'A', content 'B') behind a GIN index. Queries are parsed with
+websearch_to_tsquery, ranked with ts_rank and highlighted with ts_headline.
+
+Other databases (SQLite in development) use an inverted index instead: one
+PostSearchTerm row per (term, post) holding the weighted term frequency. A
+search is then an indexed lookup on the query terms rather than a LIKE scan
+over every post, and snippets are cut in Python.
+
+index_post() refreshes both for a single post; the post_save receiver calls
+it whenever the title or content may have changed. `manage.py
+rebuild_search_index` rebuilds everything from scratch.
+
+Settings:
+    POSTS_SEARCH_CONFIG - PostgreSQL text search configuration (default 'english')
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connections, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.utils.html import escape
+from rest_framework import filters
+
+from .models import Post, PostSearchTerm
+
+CONFIG = getattr(settings, 'POSTS_SEARCH_CONFIG', 'english')
+TITLE_WEIGHT = 4
+CONTENT_WEIGHT = 1
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 16
+SNIPPET_WORDS = 30
+BATCH_SIZE = 1000
+
+# headlines are built with these control characters around each match and
+# only turned into markup after the text itself has been escaped
+START_SEL, STOP_SEL = '\x02', '\x03'
+
+TOKEN_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have he her his i if in into is it its '
+    'me my no not of on or our she so such that the their them then there these they '
+    'this to was we were will with you your'.split()
+)
+
+
+def normalize(token):
+    """Lowercase and strip a plural 's' so 'posts' finds 'post'"""
+    token = token.lower()
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Normalized index terms of text, in order, without stop words"""
+    terms = []
+    for token in TOKEN_RE.findall(text or ''):
+        term = normalize(token)
+        if term not in STOP_WORDS and len(term) <= MAX_TERM_LENGTH:
+            terms.append(term)
+    return terms
+
+
+def weighted_terms(title, content):
+    """Term -> score for one post, title matches counting TITLE_WEIGHT times"""
+    scores = Counter()
+    for term in tokenize(title):
+        scores[term] += TITLE_WEIGHT
+    for term in tokenize(content):
+        scores[term] += CONTENT_WEIGHT
+    return scores
+
+
+def uses_postgres(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def search_vector():
+    return SearchVector('title', weight='A', config=CONFIG) + SearchVector('content', weight='B', config=CONFIG)
+
+
+def index_posts(posts, using='default'):
+    """Refresh the search index of the given posts"""
+    posts = list(posts)
+    if not posts:
+        return
+    post_ids = [post.pk for post in posts]
+    if uses_postgres(using):
+        Post.objects.using(using).filter(pk__in=post_ids).update(search_vector=search_vector())
+        return
+    rows = [
+        PostSearchTerm(term=term, post_id=post.pk, score=score)
+        for post in posts
+        for term, score in weighted_terms(post.title, post.content).items()
+    ]
+    with transaction.atomic(using=using):
+        PostSearchTerm.objects.using(using).filter(post_id__in=post_ids).delete()
+        PostSearchTerm.objects.using(using).bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def index_post(post, using='default'):
+    index_posts([post], using=using)
+
+
+def rebuild(batch_size=BATCH_SIZE, using='default'):
+    """Reindex every post in pk order; returns the number of posts indexed"""
+    if uses_postgres(using):
+        return Post.objects.using(using).update(search_vector=search_vector())
+    total, last_pk = 0, 0
+    while True:
+        batch = list(
+            Post.objects.using(using).filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'title', 'content')[:batch_size]
+        )
+        if not batch:
+            return total
+        index_posts(batch, using=using)
+        total += len(batch)
+        last_pk = batch[-1].pk
+
+
+def query_terms(query):
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def matching(queryset, query):
+    """Restrict queryset to posts matching every term of query, keeping its order"""
+    if uses_postgres(queryset.db):
+        return queryset.filter(search_vector=SearchQuery(query, config=CONFIG, search_type='websearch'))
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    hits = (
+        PostSearchTerm.objects.filter(term__in=terms)
+        .values('post_id')
+        .annotate(matched=Count('term'))
+        .filter(matched=len(terms))
+        .values('post_id')
+    )
+    return queryset.filter(pk__in=hits)
+
+
+def search(queryset, query):
+    """
+    Posts of queryset matching query, best match first.
+    Each result is annotated with `rank`; on PostgreSQL also with the raw
+    `headline` (see snippet()).
+    """
+    queryset = matching(queryset, query)
+    if uses_postgres(queryset.db):
+        search_query = SearchQuery(query, config=CONFIG, search_type='websearch')
+        queryset = queryset.annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            headline=SearchHeadline(
+                'content', search_query, config=CONFIG,
+                start_sel=START_SEL, stop_sel=STOP_SEL,
+                max_words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2,
+            ),
+        )
+    else:
+        scores = (
+            PostSearchTerm.objects.filter(post_id=OuterRef('pk'), term__in=query_terms(query))
+            .values('post_id')
+            .annotate(total=Sum('score'))
+            .values('total')
+        )
+        queryset = queryset.annotate(rank=Subquery(scores, output_field=IntegerField()))
+    return queryset.order_by('-rank', '-created_at', '-id')
+
+
+def highlight(text, query, words=SNIPPET_WORDS):
+    """
+    Raw headline cut from text in Python: a window of `words` words starting
+    just before the first match, with matches wrapped in START_SEL/STOP_SEL.
+    """
+    terms = set(query_terms(query))
+    tokens = list(TOKEN_RE.finditer(text or ''))
+    if not tokens:
+        return ''
+    first = next((i for i, token in enumerate(tokens) if normalize(token.group()) in terms), 0)
+    start = max(first - 3, 0)
+    window = tokens[start:start + words]
+
+    parts = []
+    position = window[0].start()
+    for token in window:
+        parts.append(text[position:token.start()])
+        if normalize(token.group()) in terms:
+            parts.append(f'{START_SEL}{token.group()}{STOP_SEL}')
+        else:
+            parts.append(token.group())
+        position = token.end()
+    return ''.join(parts)
+
+
+def snippet(post, query):
+    """HTML-safe snippet of post for query, matches wrapped in <mark>"""
+    raw = getattr(post, 'headline', None)
+    if raw is None:
+        raw = highlight(post.content, query)
+    return escape(raw).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>')
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    Drop-in for DRF's SearchFilter on post querysets: ?search= goes through
+    the index instead of icontains, leaving ordering to the view.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return matching(queryset, query)
@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import Post, Comment
-from accounts.serializers import SimpleUserSerializer
 from .models import Like
+from . import trending
+from .search import snippet
+from social_media_api.fieldsets import SparseFieldsMixin
 
 User = get_user_model()
 
@@ -14,7 +16,16 @@ class AuthorSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'username', 'profile_picture']
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class PostSummarySerializer(serializers.ModelSerializer):
+    """A post as embedded in other resources, e.g. a comment with ?expand=post"""
+
+    class Meta:
+        model = Post
+        fields = ['id', 'author', 'title', 'created_at']
+        read_only_fields = fields
+
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
     author_id = serializers.IntegerField(write_only=True, required=False)
     post_id = serializers.IntegerField(write_only=True, required=False)
@@ -23,7 +34,9 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = ['id', 'post', 'post_id', 'author', 'author_id', 'content', 'created_at', 'updated_at']
         read_only_fields = ['id', 'author', 'created_at', 'updated_at']
-        extra_kwargs = {'post': {'read_only': True}}
+        expandable_fields = {
+            'post': lambda: PostSummarySerializer(read_only=True),
+        }
 
     def create(self, validated_data):
         validated_data.pop('author_id', None)
@@ -31,19 +44,30 @@ class CommentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
     author_id = serializers.IntegerField(write_only=True, required=False)
-    comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
+    comments = serializers.SerializerMethodField()
+    liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'author_id', 'title', 'content', 'created_at', 'updated_at', 'comments', 'comments_count']
-        read_only_fields = ['id', 'author', 'created_at', 'updated_at', 'comments']
-
-    def get_comments_count(self, obj):
-        return obj.get_comments_count()
+        fields = ['id', 'author', 'author_id', 'title', 'content', 'created_at', 'updated_at', 'comments', 'comments_count', 'likes_count', 'liked_by_me']
+        read_only_fields = ['id', 'author', 'created_at', 'updated_at', 'comments', 'comments_count', 'likes_count', 'liked_by_me']
+
+    def get_comments(self, obj):
+        """
+        Use the bounded slice prefetched by the view when present,
+        falling back to the post's comments otherwise.
+        """
+        comments = getattr(obj, 'recent_comments', None)
+        if comments is None:
+            comments = obj.comments.select_related('author')
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    def get_liked_by_me(self, obj):
+        """Annotated by likes.with_liked_by_me; False for anonymous readers and new posts"""
+        return getattr(obj, 'liked_by_me', False)
 
     def create(self, validated_data):
         validated_data.pop('author_id', None)
@@ -60,24 +84,47 @@ class PostSerializer(serializers.ModelSerializer):
         return value.strip()
 
 
-class PostListSerializer(serializers.ModelSerializer):
+class PostListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
-    comments_count = serializers.SerializerMethodField()
+    liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'comments_count']
-        read_only_fields = ['id', 'author', 'created_at', 'updated_at']
+        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'comments_count', 'likes_count', 'liked_by_me']
+        read_only_fields = ['id', 'author', 'created_at', 'updated_at', 'comments_count', 'likes_count', 'liked_by_me']
+        expandable_fields = {
+            # the newest comments, prefetched by the view when asked for
+            'comments': lambda: CommentSerializer(source='recent_comments', many=True, read_only=True),
+        }
 
-    def get_comments_count(self, obj):
-        return obj.get_comments_count()
-    
-class PostSerializer(serializers.ModelSerializer):
-    author = SimpleUserSerializer
+    def get_liked_by_me(self, obj):
+        """Annotated by likes.with_liked_by_me; False for anonymous readers"""
+        return getattr(obj, 'liked_by_me', False)
+
+
+class PostSearchResultSerializer(PostListSerializer):
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.SerializerMethodField()
+
+    class Meta(PostListSerializer.Meta):
+        fields = PostListSerializer.Meta.fields + ['rank', 'snippet']
+        field_columns = {'snippet': ['title', 'content']}
+
+    def get_snippet(self, obj):
+        """Highlighted excerpt of the content, matches wrapped in <mark>"""
+        return snippet(obj, self.context.get('query', ''))
+
+
+class PostTrendingSerializer(PostListSerializer):
+    trending_score = serializers.SerializerMethodField()
+
+    class Meta(PostListSerializer.Meta):
+        fields = PostListSerializer.Meta.fields + ['trending_score']
+
+    def get_trending_score(self, obj):
+        """Likes and comments weighted and decayed to now"""
+        return round(trending.decayed(obj.trending_score_log), 3)
 
-    class Meta:
-        model = Post
-        fields = ('id', 'author', 'content', 'created_at')
 
 class LikeSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
@@ -1,9 +1,30 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from .models import Post, Comment
+from .models import Post, Comment, Like, TimelineEntry, PostSearchTerm, TrendingScore, TrendingCursor
+from . import export, ingest, likes, search, timeline, trending
+from .views import CommentViewSet, PostViewSet
+from notifications.models import NotificationEvent
+from social_media_api import benchmarks, profiling
 
 User = get_user_model()
 
@@ -43,6 +64,31 @@ class PostModelTestCase(TestCase):
         )
         self.assertEqual(post.get_comments_count(), 1)
 
+    def test_denormalized_counters(self):
+        """Test comment and like counters follow creates and deletes"""
+        post = Post.objects.create(author=self.user, title='Test Post', content='Test content')
+        comment = Comment.objects.create(post=post, author=self.user, content='Test comment')
+        Like.objects.create(user=self.user, post=post)
+        post.refresh_from_db()
+        self.assertEqual((post.comments_count, post.likes_count), (1, 1))
+
+        comment.delete()
+        Like.objects.filter(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual((post.comments_count, post.likes_count), (0, 0))
+
+    def test_reconcile_post_counters(self):
+        """Test the reconcile command repairs drifted counters"""
+        post = Post.objects.create(author=self.user, title='Test Post', content='Test content')
+        Comment.objects.create(post=post, author=self.user, content='Test comment')
+        Post.objects.filter(pk=post.pk).update(comments_count=7, likes_count=3)
+
+        out = StringIO()
+        call_command('reconcile_post_counters', stdout=out)
+        post.refresh_from_db()
+        self.assertEqual((post.comments_count, post.likes_count), (1, 0))
+        self.assertIn('Fixed 1 comment counters and 1 like counters', out.getvalue())
+
 
 class PostAPITestCase(APITestCase):
     """Test cases for Post API endpoints"""
@@ -129,6 +175,52 @@ class PostAPITestCase(APITestCase):
         self.assertGreater(len(response.data['results']), 0)
 
 
+class SearchTestCase(APITestCase):
+    """Test cases for full-text post search"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='pass123')
+        self.title_hit = Post.objects.create(author=self.user, title='Django tips', content='Small things')
+        self.content_hit = Post.objects.create(
+            author=self.user, title='Weekend', content='Notes on <b>Django</b> templates and posts'
+        )
+        self.miss = Post.objects.create(author=self.user, title='Python', content='Generators')
+
+    def test_index_follows_saves(self):
+        """Test editing a post replaces its index terms"""
+        self.assertTrue(PostSearchTerm.objects.filter(post=self.miss, term='generator').exists())
+        self.miss.content = 'Decorators'
+        self.miss.save()
+        terms = set(PostSearchTerm.objects.filter(post=self.miss).values_list('term', flat=True))
+        self.assertEqual(terms, {'python', 'decorator'})
+
+    def test_list_search_filter(self):
+        """Test ?search= matches every word through the index"""
+        response = self.client.get('/api/posts/?search=django template')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.content_hit.id])
+
+    def test_ranked_search(self):
+        """Test title matches rank first and snippets are highlighted and escaped"""
+        response = self.client.get('/api/posts/search/?q=django')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([post['id'] for post in results], [self.title_hit.id, self.content_hit.id])
+        self.assertIn('&lt;b&gt;<mark>Django</mark>&lt;/b&gt;', results[1]['snippet'])
+
+    def test_ranked_search_requires_query(self):
+        """Test an empty query is rejected"""
+        response = self.client.get('/api/posts/search/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_search_index(self):
+        """Test the rebuild command restores a wiped index"""
+        PostSearchTerm.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 3 posts', out.getvalue())
+        self.assertEqual(list(search.search(Post.objects.all(), 'generators')), [self.miss])
+
+
 class CommentAPITestCase(APITestCase):
     """Test cases for Comment API endpoints"""
     
@@ -167,9 +259,843 @@ class CommentAPITestCase(APITestCase):
         """Test listing comments for a specific post"""
         response = self.client.get(f'/api/posts/{self.post.id}/comments/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_retrieve_prefetches_bounded_comments(self):
+        """Test post detail embeds only the most recent comments"""
+        for i in range(3):
+            Comment.objects.create(post=self.post, author=self.user1, content=f'More {i}')
+        with patch.object(PostViewSet, 'comments_preview_size', 2):
+            # validators, post, comments
+            with self.assertNumQueries(3):
+                response = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['content'] for c in response.data['comments']], ['More 2', 'More 1'])
+        self.assertEqual(response.data['comments_count'], 4)
+
+    def test_list_posts_does_not_load_comments(self):
+        """Test the list action is a single query regardless of comments"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('comments', response.data['results'][0])
     
     def test_filter_comments_by_post(self):
         """Test filtering comments by post"""
         response = self.client.get(f'/api/comments/?post={self.post.id}')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TimelineTestCase(APITestCase):
+    """Test cases for the fan-out-on-write home timeline"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass123')
+        self.reader = User.objects.create_user(username='reader', password='pass123')
+        self.reader.following.add(self.author)
+
+    def test_fan_out_writes_timeline_entries(self):
+        """Test a new post is pushed into follower timelines"""
+        post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.assertEqual(timeline.fan_out(post), 1)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post=post).exists())
+        self.assertEqual(list(timeline.home_timeline(self.reader)), [post])
+
+    def test_celebrity_posts_are_pulled_at_read_time(self):
+        """Test authors above the threshold are merged in at read time"""
+        post = Post.objects.create(author=self.author, title='Hello', content='World')
+        with patch.object(timeline, 'CELEBRITY_THRESHOLD', 1):
+            self.assertEqual(timeline.fan_out(post), 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(list(timeline.home_timeline(self.reader)), [post])
+
+    def test_celebrity_follower_sets_are_never_loaded(self):
+        """Test celebrities are told apart by their follower counter, without reading who follows them"""
+        post = Post.objects.create(author=self.author, title='Hello', content='World')
+        with patch.object(timeline, 'CELEBRITY_THRESHOLD', 1), patch.object(timeline.graph, 'follower_ids') as loaded:
+            # the author's counter, and nothing else
+            with self.assertNumQueries(1):
+                self.assertEqual(timeline.fan_out(post), 0)
+        loaded.assert_not_called()
+
+    def test_follow_and_unfollow_update_timeline(self):
+        """Test following backfills and unfollowing evicts timeline entries"""
+        post = Post.objects.create(author=self.author, title='Hello', content='World')
+        timeline.fan_out(post)
+        self.reader.unfollow(self.author)
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader).exists())
+        self.reader.follow(self.author)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post=post).exists())
+
+    def test_window_merges_pushed_and_pulled_posts(self):
+        """Test feed pages interleave timeline entries and celebrity posts by date"""
+        celebrity = User.objects.create_user(username='celebrity', password='pass123')
+        self.reader.follow(celebrity)
+        start = timezone.now() - timedelta(days=1)
+        posts = []
+        for i in range(6):
+            author = celebrity if i % 2 else self.author
+            post = Post.objects.create(author=author, title=f'Post {i}', content='Body')
+            Post.objects.filter(pk=post.pk).update(created_at=start + timedelta(minutes=i))
+            post.refresh_from_db()
+            if author == self.author:
+                timeline.fan_out(post)
+            posts.append(post)
+        self.client.force_authenticate(user=self.reader)
+        seen = []
+        url = '/api/feed/?page_size=4'
+        while url:
+            response = self.client.get(url)
+            seen.extend(post['title'] for post in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [post.title for post in reversed(posts)])
+
+    def test_window_reads_one_page_of_each_index(self):
+        """Test window() seeks both sources with the page size and no literal follow list"""
+        for i in range(5):
+            timeline.fan_out(Post.objects.create(author=self.author, title=f'Post {i}', content='Body'))
+        with CaptureQueriesContext(connection) as queries:
+            keys = timeline.window(self.reader.pk, 2)
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all('LIMIT 2' in query['sql'] for query in queries.captured_queries))
+
+    def test_trim_keeps_newest_entries(self):
+        """Test timelines are cut down to their newest entries"""
+        posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='Body') for i in range(5)]
+        for post in posts:
+            timeline.fan_out(post)
+        self.assertEqual(timeline.trim([self.reader.pk], max_entries=3), 2)
+        kept = TimelineEntry.objects.filter(owner=self.reader).values_list('post_id', flat=True)
+        self.assertEqual(sorted(kept), [post.pk for post in posts[2:]])
+
+    def test_feed_endpoint(self):
+        """Test the feed returns followed authors' posts only"""
+        Post.objects.create(author=self.author, title='Followed', content='Yes')
+        Post.objects.create(author=self.reader, title='Own', content='No')
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post['content'] for post in response.data['results']], ['Yes'])
+
+
+class KeysetPaginationTestCase(APITestCase):
+    """Test cases for keyset pagination on post listings"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='pass123')
+        for i in range(25):
+            Post.objects.create(author=self.user, title=f'Post {i}', content='Body')
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_every_post_once(self):
+        """Test following next links visits every post newest first"""
+        ids = self.walk('/api/posts/')
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_is_stable_under_inserts(self):
+        """Test new posts do not shift the following page"""
+        first = self.client.get('/api/posts/').data
+        Post.objects.create(author=self.user, title='Fresh', content='Body')
+        second = self.client.get(first['next']).data
+        seen = {post['id'] for post in first['results']}
+        self.assertFalse(seen & {post['id'] for post in second['results']})
+        previous = self.client.get(second['previous']).data
+        self.assertEqual(
+            [post['id'] for post in previous['results']],
+            [post['id'] for post in first['results']]
+        )
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor returns 404"""
+        response = self.client.get('/api/posts/?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ResponseCacheTestCase(APITestCase):
+    """Test cases for the versioned response cache"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cacher', password='pass123')
+        self.post = Post.objects.create(author=self.user, title='Cached', content='Body')
+
+    def test_repeat_reads_are_served_from_cache(self):
+        """Test a second identical GET does not touch the database"""
+        first = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+    def test_query_params_are_part_of_the_key(self):
+        """Test different query strings are cached separately"""
+        self.client.get('/api/posts/')
+        response = self.client.get('/api/posts/?search=nothing-matches')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'], [])
+
+    def test_writes_invalidate_cached_responses(self):
+        """Test creating a comment refreshes the cached post and comment list"""
+        self.client.get(f'/api/posts/{self.post.id}/')
+        self.client.get('/api/comments/')
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/api/comments/', {'post': self.post.id, 'content': 'New comment'})
+
+        detail = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(detail.data['comments_count'], 1)
+        comments = self.client.get('/api/comments/')
+        self.assertEqual(len(comments.data['results']), 1)
+
+    def test_like_only_invalidates_its_post(self):
+        """Test a like refreshes its post and the pages showing it, not other posts"""
+        other = Post.objects.create(author=self.user, title='Other', content='Body')
+        self.client.force_authenticate(user=self.user)
+        self.client.get(f'/api/posts/{self.post.id}/')
+        self.client.get(f'/api/posts/{other.id}/')
+        self.client.get('/api/posts/')
+        self.client.put(f'/api/posts/{self.post.id}/like/')
+
+        self.assertEqual(self.client.get(f'/api/posts/{other.id}/')['X-Cache'], 'HIT')
+        detail = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual((detail['X-Cache'], detail.data['likes_count']), ('MISS', 1))
+        page = self.client.get('/api/posts/')
+        self.assertEqual(page['X-Cache'], 'MISS')
+        self.assertEqual({post['id']: post['liked_by_me'] for post in page.data['results']}, {self.post.id: True, other.id: False})
+        self.assertEqual(self.client.get('/api/posts/')['X-Cache'], 'HIT')
+
+    def test_pages_without_ids_are_not_cached(self):
+        """Test a page whose posts cannot be tracked is rebuilt every time"""
+        self.client.get('/api/posts/?fields=title')
+        self.assertNotIn('X-Cache', self.client.get('/api/posts/?fields=title'))
+
+
+class TrendingTestCase(APITestCase):
+    """Test cases for the time-decayed trending ranking"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'fan{i}', password='pass123') for i in range(4)]
+        self.old_hit, self.fresh, self.discussed, self.stale = [
+            Post.objects.create(author=self.users[0], title=title, content='Body')
+            for title in ('Old hit', 'Fresh', 'Discussed', 'Stale')
+        ]
+        now = timezone.now()
+        for user in self.users[:3]:
+            Like.objects.create(user=user, post=self.old_hit)
+        Like.objects.filter(post=self.old_hit).update(created_at=now - timedelta(days=1))
+        Like.objects.create(user=self.users[0], post=self.fresh)
+        Comment.objects.create(author=self.users[1], post=self.discussed, content='Hmm')
+        Like.objects.create(user=self.users[0], post=self.stale)
+        Like.objects.filter(post=self.stale).update(created_at=now - timedelta(days=10))
+
+    def test_ranks_by_decayed_engagement(self):
+        """Test a fresh comment beats a fresh like, which beats three day-old likes"""
+        self.assertEqual(trending.update(settle=0), 6)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/trending/')
+        results = [(post['title'], post['trending_score']) for post in response.data['results']]
+        self.assertEqual([title for title, _ in results], ['Discussed', 'Fresh', 'Old hit'])
+        self.assertAlmostEqual(results[1][1], 1, places=2)
+        # four half-lives in a day
+        self.assertAlmostEqual(results[2][1], 3 / 16, places=2)
+
+    def test_updates_are_incremental(self):
+        """Test each update only reads events past the cursor, in windows"""
+        trending.update(batch_size=2, settle=0)
+        before = TrendingScore.objects.get(post=self.fresh).score
+        Like.objects.create(user=self.users[1], post=self.fresh)
+        self.assertEqual(trending.update(settle=0), 1)
+        self.assertEqual(trending.update(settle=0), 0)
+        self.assertAlmostEqual(trending.decayed(TrendingScore.objects.get(post=self.fresh).score), 2, places=2)
+        self.assertGreater(TrendingScore.objects.get(post=self.fresh).score, before)
+        self.assertFalse(TrendingScore.objects.filter(post=self.stale).exists())
+
+    def test_cursor_waits_at_unsettled_events(self):
+        """Test an old event past a young one is not read before the young one settles"""
+        trending.update(settle=0)
+        young = Like.objects.create(user=self.users[1], post=self.fresh)
+        old = Like.objects.create(user=self.users[1], post=self.discussed)
+        Like.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(trending.update(settle=60), 0)
+        self.assertLess(TrendingCursor.objects.get(source='like').last_id, young.pk)
+        Like.objects.filter(pk=young.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(trending.update(settle=60), 2)
+        self.assertEqual(TrendingCursor.objects.get(source='like').last_id, old.pk)
+
+
+class LikeTestCase(APITestCase):
+    """Test cases for liking and unliking posts"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='liked', password='pass123')
+        self.fan = User.objects.create_user(username='liker', password='pass123')
+        self.post = Post.objects.create(author=self.author, title='Likeable', content='Body')
+        self.url = f'/api/posts/{self.post.id}/like/'
+        self.client.force_authenticate(user=self.fan)
+
+    def test_put_and_delete_are_idempotent(self):
+        """Test repeating PUT or DELETE changes nothing after the first one"""
+        first = self.client.put(self.url)
+        self.assertEqual(first.data, {'liked': True, 'changed': True, 'likes_count': 1})
+        second = self.client.put(self.url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, {'liked': True, 'changed': False, 'likes_count': 1})
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+        self.assertEqual(self.client.delete(self.url).data, {'liked': False, 'changed': True, 'likes_count': 0})
+        self.assertEqual(self.client.delete(self.url).data, {'liked': False, 'changed': False, 'likes_count': 0})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_post_keeps_its_errors(self):
+        """Test the older POST like/unlike still reject repeats"""
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        unlike_url = f'/api/posts/{self.post.id}/unlike/'
+        self.assertEqual(self.client.post(unlike_url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(unlike_url).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_post(self):
+        """Test liking a missing post is a 404"""
+        self.assertEqual(self.client.put('/api/posts/999999/like/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete('/api/posts/999999/like/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_only_new_likes_notify(self):
+        """Test a repeated like does not notify the author again"""
+        with patch('posts.views.notify') as notify:
+            self.client.put(self.url)
+            self.client.put(self.url)
+        self.assertEqual(notify.call_count, 1)
+
+    def test_listings_flag_liked_posts_in_the_same_query(self):
+        """Test liked_by_me costs no query per row, in the post list and the feed"""
+        others = [Post.objects.create(author=self.author, title=f'Other {i}', content='Body') for i in range(3)]
+        self.client.put(self.url)
+        self.client.put(f'/api/posts/{others[0].id}/like/')
+        self.fan.following.add(self.author)
+
+        with CaptureQueriesContext(connection) as short_page:
+            self.client.get('/api/posts/?page_size=1')
+        with CaptureQueriesContext(connection) as long_page:
+            response = self.client.get('/api/posts/?page_size=10')
+        self.assertEqual(len(long_page), len(short_page))
+        liked = {post['id']: post['liked_by_me'] for post in response.data['results']}
+        self.assertEqual(liked, {self.post.id: True, others[0].id: True, others[1].id: False, others[2].id: False})
+
+        feed = self.client.get('/api/feed/')
+        self.assertEqual([post['liked_by_me'] for post in feed.data['results']], [False, False, True, True])
+
+        self.client.force_authenticate(user=None)
+        anonymous = self.client.get('/api/posts/')
+        self.assertFalse(any(post['liked_by_me'] for post in anonymous.data['results']))
+
+
+class LikeConcurrencyTestCase(TransactionTestCase):
+    """Test racing likes and unlikes keep likes_count equal to the Like rows"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='raced', password='pass123')
+        self.fans = [User.objects.create_user(username=f'racer{i}', password='pass123') for i in range(4)]
+        self.post = Post.objects.create(author=self.author, title='Raced', content='Body')
+
+    def tearDown(self):
+        cache.clear()
+
+    def race(self, operations):
+        barrier = threading.Barrier(len(operations))
+        errors = []
+
+        def run(operation, user):
+            try:
+                barrier.wait()
+                for attempt in range(5):
+                    try:
+                        operation(user.pk, self.post.pk)
+                        break
+                    except OperationalError:
+                        # SQLite reports a locked database instead of waiting
+                        if attempt == 4:
+                            raise
+                        time.sleep(0.05)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=pair) for pair in operations]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, Like.objects.filter(post=self.post).count())
+
+    def test_double_taps(self):
+        """Test every fan tapping like twice at once counts each fan once"""
+        self.race([(likes.like, fan) for fan in self.fans for _ in range(2)])
+        self.assertEqual(self.post.likes_count, len(self.fans))
+        self.race([(likes.unlike, fan) for fan in self.fans for _ in range(2)])
+        self.assertEqual(self.post.likes_count, 0)
+
+
+class BulkIngestTestCase(APITestCase):
+    """Test cases for streamed bulk creation of posts and comments"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ingester', password='pass123')
+        self.follower = User.objects.create_user(username='reader', password='pass123')
+        self.follower.following.add(self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_json_array_with_per_item_errors(self):
+        """Test valid posts are created in chunks while bad items are reported by index"""
+        items = [{'title': f'Post {i}', 'content': 'Body'} for i in range(5)]
+        items[1] = {'title': '  ', 'content': 'Body'}
+        items[3] = 'not an object'
+        with patch.object(ingest, 'CHUNK_SIZE', 2):
+            response = self.client.post('/api/posts/bulk/', json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 3])
+        self.assertEqual(response.data['errors'][0]['errors'], {'title': ['This field may not be blank.']})
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.posts_count, 3)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.follower).count(), 3)
+        found = search.search(Post.objects.all(), 'post')
+        self.assertEqual({post.pk for post in found}, set(response.data['ids']))
+
+    @override_settings(NOTIFICATIONS_BACKEND='notifications.pipeline.OutboxBackend')
+    def test_ndjson_comments(self):
+        """Test NDJSON comments update counters and notify each post's author once"""
+        post = Post.objects.create(author=self.follower, title='Target', content='Body')
+        lines = [
+            json.dumps({'post': post.pk, 'content': 'First'}),
+            '{broken',
+            json.dumps({'post': 999999, 'content': 'Nowhere'}),
+            '',
+            json.dumps({'post': post.pk, 'content': 'Second'}),
+        ]
+        response = self.client.post('/api/comments/bulk/', '\n'.join(lines), content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(NotificationEvent.objects.filter(recipient_id=self.follower.pk).count(), 1)
+
+    def test_unreadable_body_keeps_earlier_items(self):
+        """Test a truncated array still creates the items before the break"""
+        body = '[{"title": "Kept", "content": "Body"}, {"title": '
+        response = self.client.post('/api/posts/bulk/', body, content_type='application/json')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+
+    def test_item_limit(self):
+        """Test items past POSTS_INGEST_MAX_ITEMS are refused"""
+        items = [{'title': f'Post {i}', 'content': 'Body'} for i in range(3)]
+        with patch.object(ingest, 'MAX_ITEMS', 2):
+            response = self.client.post('/api/posts/bulk/', json.dumps(items), content_type='application/json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+
+    def test_empty_body_is_refused(self):
+        """Test a request without a single item is a 400, not zero items created"""
+        for body, content_type in (('', 'application/json'), ('', 'application/x-ndjson'), ('[]', 'application/json'), ('\n\n', 'application/x-ndjson')):
+            response = self.client.post('/api/posts/bulk/', body, content_type=content_type)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, (body, content_type))
+            self.assertEqual(response.data['created'], 0)
+            self.assertEqual(response.data['errors'][0]['index'], 0)
+        self.assertFalse(Post.objects.exists())
+
+def test_requires_authentication(self):
+        """Test anonymous users cannot ingest"""
+        self.client.force_authenticate(user=None)
+        response = self.client.post('/api/posts/bulk/', '[]', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ExportTestCase(APITestCase):
+    """Test cases for the streaming NDJSON/CSV export"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='pass123')
+        self.other = User.objects.create_user(username='bystander', password='pass123')
+        self.posts = [Post.objects.create(author=self.user, title=f'Mine {i}', content='Body, "quoted"') for i in range(3)]
+        Post.objects.create(author=self.other, title='Theirs', content='Body')
+        Comment.objects.create(author=self.user, post=self.posts[0], content='Note')
+        self.client.force_authenticate(user=self.user)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_of_own_posts(self):
+        """Test users export only their own rows, one JSON object per line"""
+        response = self.client.get('/api/export/posts.ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [post.pk for post in self.posts])
+        self.assertEqual(rows[0]['content'], 'Body, "quoted"')
+
+    def test_gzipped_csv(self):
+        """Test CSV comes with a header row and can be gzipped on the fly"""
+        response = self.client.get('/api/export/comments.csv.gz')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = list(csv.reader(io.StringIO(gzip.decompress(self.read(response)).decode())))
+        self.assertEqual(rows[0], ['id', 'post_id', 'author_id', 'content', 'created_at', 'updated_at'])
+        self.assertEqual(rows[1][3], 'Note')
+
+    def test_whole_corpus_is_staff_only(self):
+        """Test ?scope=all needs staff, and then covers every user"""
+        self.assertEqual(self.client.get('/api/export/posts.ndjson?scope=all').status_code, status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/export/posts.ndjson?scope=all')
+        self.assertEqual(len(self.read(response).splitlines()), 4)
+        self.assertEqual(self.client.get('/api/export/users.ndjson').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_streams_in_chunks(self):
+        """Test output is yielded block by block rather than built whole"""
+        with patch.object(export, 'WRITE_SIZE', 1):
+            chunks = list(export.stream('posts', chunk_size=2))
+        self.assertEqual(len(chunks), 4)
+
+    async def test_streams_chunk_by_chunk_under_asgi(self):
+        """Test ASGI responses read rows as the client reads rather than buffering the export"""
+        token = await Token.objects.acreate(user=self.user)
+        fetched = []
+        rows = export.rows
+
+        def counted(*args, **kwargs):
+            for row in rows(*args, **kwargs):
+                fetched.append(row['id'])
+                yield row
+
+        with patch.object(export, 'WRITE_SIZE', 1), patch.object(export, 'rows', counted):
+            response = await self.async_client.get(
+                '/api/export/posts.ndjson', headers={'Authorization': f'Token {token.key}'}
+            )
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            self.assertEqual(fetched, [self.posts[0].pk])
+            rest = [chunk async for chunk in chunks]
+        self.assertEqual(json.loads(first)['id'], self.posts[0].pk)
+        self.assertEqual(len(rest), 2)
+
+    def test_command(self):
+        """Test export_data writes the same export to a file"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'likes.csv')
+            Like.objects.create(user=self.other, post=self.posts[1])
+            call_command('export_data', 'likes', '--format', 'csv', '--output', path, stderr=StringIO())
+            with open(path) as f:
+                self.assertEqual(len(f.read().splitlines()), 2)
+
+
+class SparseFieldsTestCase(APITestCase):
+    """Test cases for ?fields= and ?expand= on post and comment reads"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shaper', password='pass123')
+        self.post = Post.objects.create(author=self.user, title='Shaped post', content='Long body')
+        Comment.objects.create(author=self.user, post=self.post, content='A comment')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_fields_prune_response_and_query(self):
+        """Test only the requested fields are rendered and selected, without the author join"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/?fields=id,title,created_at')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title', 'created_at'])
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"content"', sql)
+
+    def test_detail_skips_comments_unless_asked(self):
+        """Test a detail read without comments does not prefetch them"""
+        # validators, then the post alone
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/posts/{self.post.id}/?fields=id,likes_count')
+        self.assertEqual(response.data, {'id': self.post.id, 'likes_count': 0})
+
+    def test_expand_comments_on_list(self):
+        """Test ?expand=comments adds each post's newest comments to the list"""
+        response = self.client.get('/api/posts/?fields=id&expand=comments')
+        self.assertEqual(response.data['results'][0]['comments'][0]['content'], 'A comment')
+
+    def test_expand_post_on_comments(self):
+        """Test a comment can embed its post in the same query"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/comments/?fields=id,content&expand=post')
+        comment = response.data['results'][0]
+        self.assertEqual(set(comment), {'id', 'content', 'post'})
+        self.assertEqual(comment['post']['title'], 'Shaped post')
+
+    def test_search_snippet_columns(self):
+        """Test method fields get the columns they declare"""
+        response = self.client.get('/api/posts/search/?q=body&fields=id,snippet')
+        self.assertEqual(response.data['results'][0]['snippet'], 'Long <mark>body</mark>')
+
+    def test_feed_and_defaults(self):
+        """Test the feed takes ?fields= and unshaped responses are unchanged"""
+        reader = User.objects.create_user(username='shaped-reader', password='pass123')
+        reader.following.add(self.user)
+        self.client.force_authenticate(user=reader)
+        feed = self.client.get('/api/feed/?fields=id,liked_by_me')
+        self.assertEqual(feed.data['results'], [{'id': self.post.id, 'liked_by_me': False}])
+        full = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertIn('comments', full.data)
+        self.assertEqual(full.data['author']['username'], 'shaper')
+
+
+class ReadPathParityTestCase(APITestCase):
+    """Test the compiled read path renders exactly what the serializers do"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='parity', password='pass123')
+        User.objects.filter(pk=self.author.pk).update(profile_picture='profile_pics/parity.png')
+        self.reader = User.objects.create_user(username='parity-reader', password='pass123')
+        self.posts = [Post.objects.create(author=self.author, title=f'Parity {i}', content=f'Body {i}') for i in range(5)]
+        Like.objects.create(user=self.reader, post=self.posts[1])
+        for post in self.posts[:3]:
+            Comment.objects.create(author=self.reader, post=post, content=f'On {post.title}')
+
+    def tearDown(self):
+        cache.clear()
+
+    def assertSameOutput(self, viewset, url):
+        cache.clear()
+        fast = self.client.get(url)
+        cache.clear()
+        with patch.object(viewset, 'read_path', None):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_post_list(self):
+        """Test post pages match anonymously, signed in, filtered and across cursors"""
+        first = self.assertSameOutput(PostViewSet, '/api/posts/?page_size=2')
+        self.assertSameOutput(PostViewSet, first.data['next'])
+        self.assertSameOutput(PostViewSet, '/api/posts/?ordering=created_at&search=parity')
+        self.client.force_authenticate(user=self.reader)
+        response = self.assertSameOutput(PostViewSet, '/api/posts/')
+        self.assertEqual(sum(post['liked_by_me'] for post in response.data['results']), 1)
+        self.assertTrue(response.data['results'][0]['author']['profile_picture'].startswith('http://testserver/'))
+
+    def test_comment_list(self):
+        """Test comment pages match, filtered by post"""
+        self.assertSameOutput(CommentViewSet, '/api/comments/')
+        self.assertSameOutput(CommentViewSet, f'/api/comments/?post={self.posts[0].id}&page_size=1')
+
+    def test_uses_values_rows(self):
+        """Test the read path serves the page in one query without model instances"""
+        with patch.object(Post, '__init__', side_effect=AssertionError('instantiated')):
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/posts/')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_shaped_requests_use_the_serializer(self):
+        """Test ?fields= bypasses the read path"""
+        response = self.client.get('/api/posts/?fields=id')
+        self.assertEqual(set(response.data['results'][0]), {'id'})
+
+
+class ConditionalGetTestCase(APITestCase):
+    """Test cases for ETag / Last-Modified revalidation"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass123')
+        self.reader = User.objects.create_user(username='reader', password='pass123')
+        self.reader.follow(self.author)
+        self.post = Post.objects.create(author=self.author, title='Fresh', content='Body')
+        self.comment = Comment.objects.create(post=self.post, author=self.author, content='First')
+        self.client.force_authenticate(user=self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def assertNotModified(self, path, etag, queries):
+        """Test path answers etag with 304 in queries queries and no body"""
+        with self.assertNumQueries(queries):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def assertRevalidates(self, path, change, queries=1):
+        """Test path is 304 in queries queries until change() runs, then 200 with a new ETag"""
+        first = self.client.get(path)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', first)
+        self.assertNotModified(path, first['ETag'], queries)
+        change()
+        second = self.client.get(path, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+    def edit_comment(self):
+        self.comment.content = 'Edited'
+        self.comment.save()
+
+    def test_post_detail(self):
+        """Test post detail revalidates from the response cache until the post is edited"""
+        def edit():
+            self.post.title = 'Edited'
+            self.post.save()
+        self.assertRevalidates(f'/api/posts/{self.post.id}/', edit, queries=0)
+
+    def test_post_detail_follows_likes_and_comments(self):
+        """Test a like or a comment edit changes the detail ETag"""
+        path = f'/api/posts/{self.post.id}/'
+        self.assertRevalidates(path, lambda: self.client.put(f'/api/posts/{self.post.id}/like/'), queries=0)
+        self.assertRevalidates(path, self.edit_comment, queries=0)
+
+    def test_uncached_detail_revalidates_in_one_query(self):
+        """Test the detail validators are one query when nothing is cached"""
+        path = f'/api/posts/{self.post.id}/'
+        etag = self.client.get(path)['ETag']
+        cache.clear()
+        self.assertNotModified(path, etag, 1)
+
+    def test_etag_is_per_reader(self):
+        """Test another reader does not match the first reader's ETag"""
+        path = f'/api/posts/{self.post.id}/'
+        etag = self.client.get(path)['ETag']
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        """Test Last-Modified is honoured on its own"""
+        path = f'/api/posts/{self.post.id}/comments/'
+        last_modified = self.client.get(path)['Last-Modified']
+        response = self.client.get(path, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_post_comments(self):
+        """Test a post's comments revalidate until one is edited or added"""
+        path = f'/api/posts/{self.post.id}/comments/'
+        self.assertRevalidates(path, self.edit_comment)
+        self.assertRevalidates(path, lambda: self.client.post('/api/comments/', {'post': self.post.id, 'content': 'More'}))
+
+    def test_feed(self):
+        """Test the feed revalidates until a followed author posts or a post is liked"""
+        # the newest posts' window, then their validators
+        self.assertRevalidates('/api/feed/', lambda: self.client.put(f'/api/posts/{self.post.id}/like/'), queries=3)
+        self.assertRevalidates('/api/feed/', self.edit_comment, queries=3)
+        self.assertRevalidates('/api/feed/', lambda: Post.objects.create(author=self.author, title='Next', content='Body'), queries=3)
+
+    def rename_author(self):
+        self.author.username += 'x'
+        self.author.save()
+
+    def test_comments_and_feed_follow_authors(self):
+        """Test renaming an author changes the comment page and feed ETags"""
+        self.assertRevalidates(f'/api/posts/{self.post.id}/comments/', self.rename_author)
+        self.assertRevalidates('/api/feed/', self.rename_author, queries=3)
+
+    def test_feed_validates_the_requested_page(self):
+        """Test a feed page's ETag follows its own posts rather than the whole timeline"""
+        newer = Post.objects.create(author=self.author, title='Newer', content='Body')
+        path = self.client.get('/api/feed/?page_size=1').data['next']
+        etag = self.client.get(path)['ETag']
+        self.client.put(f'/api/posts/{newer.id}/like/')
+        self.assertNotModified(path, etag, 3)
+        self.client.put(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_missing_post_is_not_validated(self):
+        """Test a missing post is still a 404"""
+        response = self.client.get('/api/posts/999999/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BenchmarkBudgetTestCase(TestCase):
+    """Test every endpoint stays within the query budgets of the benchmark baseline"""
+
+    def tearDown(self):
+        # the run leaves follow graph entries behind
+        cache.clear()
+
+    def test_query_budgets(self):
+        """Test seeded endpoints issue no more queries than budgeted"""
+        benchmarks.seed('tiny')
+        results = benchmarks.run(iterations=2)
+        self.assertEqual(benchmarks.check(results, benchmarks.load_baseline(), latency_tolerance=None), [])
+
+
+@override_settings(SQL_PROFILING_SAMPLE_RATE=1)
+class SQLProfilingTestCase(APITestCase):
+    """Test cases for the sampled SQL profiling middleware"""
+
+    def setUp(self):
+        profiling.reset()
+        self.user = User.objects.create_user(username='profiled', password='pass123')
+        Post.objects.create(author=self.user, title='Profiled', content='Body')
+
+    def test_server_timing_header(self):
+        """Test profiled responses report database and serializer time"""
+        response = self.client.get('/api/posts/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries, 0 duplicated", serialize;dur=[\d.]+, app;dur=')
+        [sample] = profiling.REPORT.snapshot()
+        self.assertEqual(sample['view'], 'posts:post-list')
+        self.assertGreater(sample['queries'], 0)
+
+    @override_settings(SQL_PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get('/api/posts/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.REPORT.snapshot(), [])
+
+    @override_settings(SQL_PROFILING_SAMPLE_RATE=0)
+    def test_disabled_profiling_installs_nothing(self):
+        """Test a zero sample rate leaves DRF serializers unpatched"""
+        with patch.object(profiling, 'install_serializer_timing') as install:
+            with self.assertRaises(MiddlewareNotUsed):
+                profiling.SQLProfilingMiddleware(lambda request: None)
+        install.assert_not_called()
+
+    def test_processes_flush_to_separate_slots(self):
+        """Test each process claims its own slot and the report merges them"""
+        with patch.object(profiling.os, 'getpid', return_value=101):
+            profiling.flush([{'view': 'a'}])
+        with patch.object(profiling.os, 'getpid', return_value=102):
+            profiling.flush([{'view': 'b'}])
+        self.assertNotEqual(profiling._slots[101], profiling._slots[102])
+        self.assertEqual(sorted(sample['view'] for sample in profiling.collect()), ['a', 'b'])
+
+    def test_duplicate_fingerprints(self):
+        """Test the same query shape run twice is reported as a duplicate"""
+        profile = profiling.Profile()
+        with connection.execute_wrapper(profile):
+            for pk in (1, 2):
+                list(User.objects.filter(pk=pk))
+            list(User.objects.filter(pk__in=[1, 2, 3]))
+            list(User.objects.filter(pk__in=[4]))
+        self.assertEqual(profile.queries, 4)
+        self.assertEqual(sorted(profile.duplicates().values()), [2, 2])
+
+    def test_sql_report_command(self):
+        """Test the report lists profiled views"""
+        self.client.get('/api/posts/')
+        out = StringIO()
+        call_command('sql_report', stdout=out)
+        self.assertIn('posts:post-list', out.getvalue())
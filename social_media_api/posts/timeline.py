@@ -0,0 +1,179 @@
+"""
+Fan-out-on-write home timelines.
+
+New posts are pushed into a TimelineEntry row per follower, so reading a
+feed is a range scan over (owner, -created_at) instead of a sort over every
+post by every followed account. Authors with at least
+POSTS_TIMELINE_CELEBRITY_THRESHOLD followers are not fanned out; their posts
+keep fanned_out=False and are merged in at read time through a partial index.
+
+Feeds are read a page at a time with window(): one keyset query over the
+owner's (owner, -created_at, -post) index and one over the partial index of
+posts that were never fanned out, each limited to the page size, merged in
+Python. Followed authors are matched with a subquery on the follow table, so
+no query grows with the number of accounts followed. Timelines are trimmed
+to their POSTS_TIMELINE_MAX_ENTRIES newest entries as posts are fanned out.
+
+Settings:
+    POSTS_TIMELINE_CELEBRITY_THRESHOLD - followers above which authors are pulled (default 10000)
+    POSTS_TIMELINE_BACKFILL_SIZE       - posts per author copied on follow (default 200)
+    POSTS_TIMELINE_MAX_ENTRIES         - entries kept per timeline (default 800)
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from accounts import graph
+
+from .models import Post, TimelineEntry
+
+CELEBRITY_THRESHOLD = getattr(settings, 'POSTS_TIMELINE_CELEBRITY_THRESHOLD', 10000)
+BACKFILL_SIZE = getattr(settings, 'POSTS_TIMELINE_BACKFILL_SIZE', 200)
+MAX_ENTRIES = getattr(settings, 'POSTS_TIMELINE_MAX_ENTRIES', 800)
+BATCH_SIZE = 1000
+# each owner's timeline is trimmed about once per TRIM_EVERY posts it receives
+TRIM_EVERY = 20
+
+
+def follower_ids(author_id):
+    """Ids of the users following author_id"""
+    return graph.follower_ids(author_id).tolist()
+
+
+def follower_counts(author_ids):
+    """author id -> followers_count, read fresh since follows update the counter in SQL"""
+    from accounts.models import CustomUser
+
+    return dict(CustomUser.objects.filter(pk__in=set(author_ids)).values_list('pk', 'followers_count'))
+
+
+def fan_out(post):
+    """
+    Push a freshly created post into its author's followers' timelines.
+    Returns the number of entries written (0 for celebrity authors).
+    """
+    return fan_out_many([post])
+
+
+def fan_out_many(posts):
+    """
+    fan_out for many fresh posts at once: one counter query, one insert and one update in all,
+    plus a follower lookup per distinct author below the celebrity threshold.
+    Celebrities are told apart by their followers_count, so their follower
+    sets are never loaded. Returns the number of entries written.
+    """
+    entries = []
+    fanned = []
+    counts = follower_counts(post.author_id for post in posts)
+    followers_of = {}
+    for post in posts:
+        if counts.get(post.author_id, 0) >= CELEBRITY_THRESHOLD:
+            continue
+        if post.author_id not in followers_of:
+            followers_of[post.author_id] = follower_ids(post.author_id)
+        followers = followers_of[post.author_id]
+        entries.extend(
+            TimelineEntry(owner_id=owner_id, post=post, author_id=post.author_id, created_at=post.created_at)
+            for owner_id in followers
+        )
+        fanned.append(post)
+    if not fanned:
+        return 0
+
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        Post.objects.filter(pk__in=[post.pk for post in fanned]).update(fanned_out=True)
+    for post in fanned:
+        post.fanned_out = True
+    # a different slice of the followers each time, so one post never trims them all
+    bucket = sum(post.pk for post in fanned) % TRIM_EVERY
+    trim({entry.owner_id for entry in entries if entry.owner_id % TRIM_EVERY == bucket})
+    return len(entries)
+
+
+def backfill(follower_ids, author_ids):
+    """
+    Copy each author's most recent fanned-out posts into each follower's timeline.
+    One query fetches the newest BACKFILL_SIZE posts per author whatever the
+    number of authors, so bulk follows stay a constant number of round trips.
+    """
+    follower_ids, author_ids = list(follower_ids), list(author_ids)
+    if not follower_ids or not author_ids:
+        return
+    posts = (
+        Post.objects.filter(author_id__in=author_ids, fanned_out=True)
+        .annotate(rank=Window(RowNumber(), partition_by=F('author_id'), order_by=F('created_at').desc()))
+        .filter(rank__lte=BACKFILL_SIZE)
+        .values_list('pk', 'author_id', 'created_at')
+    )
+    entries = [
+        TimelineEntry(owner_id=follower_id, post_id=post_id, author_id=author_id, created_at=created_at)
+        for post_id, author_id, created_at in posts
+        for follower_id in follower_ids
+    ]
+    if entries:
+        TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        trim(follower_ids)
+
+
+def trim(owner_ids, max_entries=None):
+    """Drop all but the max_entries newest entries of each owner's timeline; returns the number dropped"""
+    max_entries = max_entries or MAX_ENTRIES
+    owner_ids = list(owner_ids)
+    dropped = 0
+    for start in range(0, len(owner_ids), BATCH_SIZE):
+        stale = list(
+            TimelineEntry.objects.filter(owner_id__in=owner_ids[start:start + BATCH_SIZE])
+            .annotate(rank=Window(
+                RowNumber(), partition_by=F('owner_id'), order_by=[F('created_at').desc(), F('post_id').desc()]
+            ))
+            .filter(rank__gt=max_entries)
+            .values_list('pk', flat=True)
+        )
+        for chunk in range(0, len(stale), BATCH_SIZE):
+            dropped += TimelineEntry.objects.filter(pk__in=stale[chunk:chunk + BATCH_SIZE]).delete()[0]
+    return dropped
+
+
+def evict(follower_ids, author_ids):
+    """Drop unfollowed authors' posts from the followers' timelines"""
+    TimelineEntry.objects.filter(owner_id__in=list(follower_ids), author_id__in=list(author_ids)).delete()
+
+
+def followed_authors(user_id):
+    """Subquery of the ids user_id follows"""
+    from accounts.models import CustomUser
+
+    # a row (from=A, to=B) means B follows A
+    return CustomUser.followers.through.objects.filter(to_customuser_id=user_id).values('from_customuser_id')
+
+
+def window(user_id, size, after=None, newest_first=True):
+    """
+    (created_at, post_id) keys of the next `size` posts of user_id's home feed,
+    past the key `after` when given, newest first unless newest_first is False.
+    Pushed posts come from the owner's timeline rows; posts that were never
+    fanned out (celebrity authors, pre-existing posts) are pulled by author.
+    """
+    prefix, op = ('-', 'lt') if newest_first else ('', 'gt')
+
+    def seek(queryset, pk):
+        if after is not None:
+            position, last = after
+            queryset = queryset.filter(Q(**{f'created_at__{op}': position}) | Q(created_at=position, **{f'{pk}__{op}': last}))
+        return list(queryset.order_by(f'{prefix}created_at', f'{prefix}{pk}').values_list('created_at', pk)[:size])
+
+    pushed = seek(TimelineEntry.objects.filter(owner_id=user_id), 'post_id')
+    pulled = seek(Post.objects.filter(fanned_out=False, author__in=followed_authors(user_id)), 'id')
+    return sorted(set(pushed) | set(pulled), reverse=newest_first)[:size]
+
+
+def home_timeline(user, size=50):
+    """The newest `size` posts of the user's home feed, newest first"""
+    keys = window(user.pk, size)
+    return (
+        Post.objects.filter(pk__in=[pk for _, pk in keys])
+        .select_related('author')
+        .order_by('-created_at', '-id')
+    )
@@ -0,0 +1,149 @@
+"""
+Trending posts ranked by time-decayed engagement.
+
+A like is worth TRENDING_LIKE_WEIGHT and a comment TRENDING_COMMENT_WEIGHT,
+and both lose half their value every TRENDING_HALF_LIFE seconds. Rather than
+decaying every score as time passes, an event at time t adds
+w * 2 ** ((t - EPOCH) / half_life): all scores grow at the same rate, so
+their order is the decayed order at any moment, and a score is only written
+again when its post gets more engagement. Scores are stored as logarithms
+so the exponent never overflows.
+
+update() reads Like and Comment rows past the last processed id, in windows
+of TRENDING_BATCH_SIZE, and folds them into the TrendingScore table: one read
+and one upsert per window, never an aggregate over the whole Like table.
+The cursor only ever moves by id: a window ends at the first event younger
+than TRENDING_SETTLE seconds, and every row past it waits for the next run,
+so rows from transactions that commit out of id order are not skipped. Unlikes
+and deleted comments are not subtracted; the engagement happened, and it
+decays anyway. Posts whose decayed score falls below TRENDING_MIN_SCORE
+leave the table.
+
+Run `manage.py update_trending` next to the web process (see Procfile).
+
+Settings:
+    TRENDING_HALF_LIFE      - seconds for an event's weight to halve (default 6 hours)
+    TRENDING_LIKE_WEIGHT    - weight of a like (default 1)
+    TRENDING_COMMENT_WEIGHT - weight of a comment (default 3)
+    TRENDING_MIN_SCORE      - decayed score below which a post is dropped (default 0.05)
+    TRENDING_BATCH_SIZE     - events read per window (default 5000)
+    TRENDING_SETTLE         - seconds an event waits before it is read (default 5)
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from social_media_api.caching import invalidate
+
+from .models import Comment, Like, Post, TrendingCursor, TrendingScore
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def setting(name, default):
+    return getattr(settings, f'TRENDING_{name}', default)
+
+
+def sources():
+    """(cursor name, model, weight) of every event table feeding the ranking"""
+    return [
+        ('like', Like, setting('LIKE_WEIGHT', 1)),
+        ('comment', Comment, setting('COMMENT_WEIGHT', 3)),
+    ]
+
+
+def growth(when):
+    """log of the factor every score has grown by between EPOCH and when"""
+    return (when - EPOCH).total_seconds() / setting('HALF_LIFE', 6 * 60 * 60) * math.log(2)
+
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without overflow; None stands for log(0)"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed(score, now=None):
+    """The stored log score as engagement decayed to now"""
+    return math.exp(score - growth(now or timezone.now()))
+
+
+def fold(source, model, weight, batch_size, until):
+    """Apply the next window of one event table; returns the number of events read"""
+    with transaction.atomic():
+        cursor, _ = TrendingCursor.objects.select_for_update().get_or_create(source=source)
+        events = list(
+            model.objects.filter(pk__gt=cursor.last_id)
+            .order_by('pk')
+            .values_list('pk', 'post_id', 'created_at')[:batch_size]
+        )
+        # stop at the first unsettled event: rows past it wait, however old they are
+        for index, (_, _, created_at) in enumerate(events):
+            if created_at >= until:
+                del events[index:]
+                break
+        if not events:
+            return 0
+
+        added = {}
+        for _, post_id, created_at in events:
+            added[post_id] = log_add(added.get(post_id), math.log(weight) + growth(created_at))
+        # one query tells which posts still exist and what they score already
+        current = dict(Post.objects.filter(pk__in=added).values_list('pk', 'trending__score'))
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(post_id=post_id, score=log_add(current[post_id], score))
+                for post_id, score in added.items() if post_id in current
+            ],
+            update_conflicts=True,
+            unique_fields=['post'],
+            update_fields=['score', 'updated_at']
+        )
+        cursor.last_id = events[-1][0]
+        cursor.save(update_fields=['last_id'])
+    return len(events)
+
+
+def prune(now=None):
+    """Drop posts whose decayed score fell below TRENDING_MIN_SCORE"""
+    threshold = math.log(setting('MIN_SCORE', 0.05)) + growth(now or timezone.now())
+    return TrendingScore.objects.filter(score__lt=threshold).delete()[0]
+
+
+def update(batch_size=None, settle=None):
+    """
+    Fold every settled event not yet counted into the ranking, then prune it.
+    Returns the number of events read.
+    """
+    batch_size = batch_size or setting('BATCH_SIZE', 5000)
+    settle = setting('SETTLE', 5) if settle is None else settle
+    now = timezone.now()
+    until = now - timedelta(seconds=settle)
+    total = 0
+    for source, model, weight in sources():
+        while True:
+            read = fold(source, model, weight, batch_size, until)
+            total += read
+            if read < batch_size:
+                break
+    pruned = prune(now)
+    if total or pruned:
+        invalidate('trending')
+    return total
+
+
+def ranked(queryset):
+    """queryset restricted to ranked posts, hottest first, with trending_score_log annotated"""
+    return (
+        queryset.filter(trending__isnull=False)
+        .annotate(trending_score_log=F('trending__score'))
+        .order_by('-trending__score', '-id')
+    )
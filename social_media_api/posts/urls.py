@@ -1,7 +1,7 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from .views import PostViewSet, CommentViewSet
-from .views import FeedView, like_post, unlike_post
+from .views import FeedView, ExportView
 
 app_name = 'posts'
 
@@ -9,12 +9,10 @@ app_name = 'posts'
 router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='post')
 router.register(r'comments', CommentViewSet, basename='comment')
-router.register(r'posts', PostViewSet)
 
 #API urls are automatically determined by the router
 urlpatterns = [
     path('', include(router.urls)),
     path('feed/', FeedView.as_view(), name='feed'),
-    path('posts/<int:pk>/like/', like_post, name='post-like'),
-    path('posts/<int:pk>/unlike/', unlike_post, name='post-unlike'),
+    re_path(r'^export/(?P<dataset>\w+)\.(?P<extension>[\w.]+)$', ExportView.as_view(), name='export'),
 ]
\ No newline at end of file
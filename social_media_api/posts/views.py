@@ -1,38 +1,160 @@
-from rest_framework import viewsets, permissions, filters, status, generics
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework import viewsets, permissions, filters, status, generics, views
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Post, Comment
-from .serializers import PostSerializer, PostListSerializer, CommentSerializer
+from .models import Post, Comment, post_tags
+from .serializers import PostSerializer, PostListSerializer, PostSearchResultSerializer, PostTrendingSerializer, CommentSerializer
 from .permissions import IsAuthorOrReadOnly
-from django.db.models import Q
+from .pagination import KeysetPagination, TimelinePagination
+from django.db.models import OuterRef, Prefetch, Subquery
 from rest_framework.permissions import IsAuthenticated
-from django.contrib.contenttypes.models import ContentType
-from notifications.models import Notification
-from .models import Like
+from notifications.pipeline import notify
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from . import export, ingest, likes, search, timeline, trending
+from social_media_api.caching import cache_response
+from social_media_api.conditional import conditional
+from social_media_api.fieldsets import SparseFieldsViewMixin
+from social_media_api.readpath import ReadPath, ReadPathListMixin
 
 # expose get_object_or_404 as an attribute on generics to satisfy some checks
 generics.get_object_or_404 = get_object_or_404
 
-class PostViewSet(viewsets.ModelViewSet):
+def bulk_response(result):
+    """201 when every item was created, 207 when some were, 400 when none were"""
+    if not result['errors']:
+        code = status.HTTP_201_CREATED
+    elif result['created']:
+        code = status.HTTP_207_MULTI_STATUS
+    else:
+        code = status.HTTP_400_BAD_REQUEST
+    return Response(result, status=code)
+
+
+def post_validators(view, request, pk=None, **kwargs):
+    """
+    What a post's detail response depends on, in one query: the post's own
+    row and counters, its author, its newest comment edit and whether the
+    reader likes it.
+    """
+    try:
+        pk = int(pk)
+    except ValueError:
+        return None
+    last_comment = Comment.objects.filter(post=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+    row = (
+        likes.with_liked_by_me(Post.objects.filter(pk=pk), request.user)
+        .annotate(last_comment=Subquery(last_comment))
+        .values(
+            'updated_at', 'comments_count', 'likes_count', 'author__username', 'author__profile_picture', 'last_comment',
+            *(['liked_by_me'] if request.user.is_authenticated else [])
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return tuple(row.values()), max(filter(None, (row['updated_at'], row['last_comment'])))
+
+
+def page_rows(view, request, queryset, *columns):
+    """
+    values() of columns for the rows of the requested page, sought through the
+    view's paginator exactly as the response will be, and the (next, previous)
+    keys it links to.
+    """
+    paginator = view.paginator
+    rows = paginator.paginate_queryset(queryset.values('id', paginator.key_field, *columns), request, view=view)
+    return rows, (paginator.next_key, paginator.previous_key)
+
+
+def post_comments_validators(view, request, pk=None, **kwargs):
+    """A page of a post's comments changes with its comments, their edits and their authors"""
+    try:
+        pk = int(pk)
+    except ValueError:
+        return None
+    comments = Comment.objects.filter(post_id=pk).order_by('-created_at', '-id')
+    rows, links = page_rows(view, request, comments, 'updated_at', 'author__username', 'author__profile_picture')
+    if not rows:
+        # nothing to vouch for, and a missing post must still be a 404
+        return None
+    return (*(tuple(row.values()) for row in rows), links), max(row['updated_at'] for row in rows)
+
+
+def feed_validators(view, request, **kwargs):
+    """
+    A feed page changes with its posts, their counters, authors and newest
+    comment, and which of them the reader likes: the page's keys are sought
+    on the timeline as for the response, then one query reads those columns.
+    """
+    last_comment = Comment.objects.filter(post=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+    posts = likes.with_liked_by_me(Post.objects.annotate(last_comment=Subquery(last_comment)), request.user)
+    rows, links = page_rows(
+        view, request, posts,
+        'updated_at', 'comments_count', 'likes_count', 'author__username', 'author__profile_picture', 'last_comment',
+        *(['liked_by_me'] if request.user.is_authenticated else [])
+    )
+    last_modified = max((value for row in rows for value in (row['updated_at'], row['last_comment']) if value), default=None)
+    return (*(tuple(row.values()) for row in rows), links), last_modified
+
+
+def recent_comments_prefetch(size):
+    """
+    Prefetch the newest `size` comments of each post, with their authors,
+    into post.recent_comments.
+    """
+    recent_comments = Comment.objects.select_related('author').order_by('-created_at', '-id')[:size]
+    return Prefetch('comments', queryset=recent_comments, to_attr='recent_comments')
+
+
+class PostViewSet(ReadPathListMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing posts with full CRUD operations.
     
     Provides:
-    - list: Get all posts (paginated)
-    - retrieve: Get a specific post with comments
+    - list: Get all posts (keyset paginated)
+    - retrieve: Get a specific post with its most recent comments
     - create: Create a new post
     - update/partial_update: Update a post (author only)
     - destroy: Delete a post (author only)
-    - comments: Get all comments for a specific post
+    - comments: Get all comments for a specific post (keyset paginated)
+    - search: Full-text search ranked by relevance, with highlighted snippets
+    - trending: Posts with the most time-decayed engagement
+    - bulk: Create many posts in one streamed request
+
+    Reads take ?fields= and ?expand= (see social_media_api/fieldsets.py).
     """
-    queryset = Post.objects.all().select_related('author').prefetch_related('comments')
+    queryset = Post.objects.all().select_related('author')
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'content']
-    ordering_fields = ['created_at', 'updated_at', 'title']
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, search.PostSearchFilter, filters.OrderingFilter]
+    ordering_fields = ['created_at']
     ordering = ['-created_at']
+    comments_preview_size = 20
+    read_path = ReadPath(PostListSerializer, method_fields={'liked_by_me': ('liked_by_me', False)})
+
+    def get_queryset(self):
+        """
+        Shape the queryset per action.
+        List only needs the author (counts are denormalized columns), detail
+        views prefetch a bounded, ordered slice of comments with their authors,
+        and the rest are paged through the comments action. Every action
+        flags the posts the reader liked in the same query. With ?fields= or
+        ?expand= only the columns, joins and prefetches the response needs
+        are kept.
+        """
+        shape = self.queryset_shape()
+        queryset = self.shape_queryset(super().get_queryset(), shape, 'created_at')
+        if self.wants(shape, 'liked_by_me'):
+            queryset = likes.with_liked_by_me(queryset, self.request.user)
+        if self.action in ('retrieve', 'update', 'partial_update'):
+            preview = self.wants(shape, 'comments')
+        else:
+            preview = shape is not None and 'comments' in shape.fields
+        if preview:
+            queryset = queryset.prefetch_related(recent_comments_prefetch(self.comments_preview_size))
+        return queryset
 
     def get_serializer_class(self):
         """
@@ -41,13 +163,19 @@ class PostViewSet(viewsets.ModelViewSet):
         """
         if self.action == 'list':
             return PostListSerializer
+        if self.action == 'search':
+            return PostSearchResultSerializer
+        if self.action == 'trending':
+            return PostTrendingSerializer
         return PostSerializer
 
     def perform_create(self, serializer):
         """
-        Set the author to the current authenticated user when creating a post.
+        Set the author to the current authenticated user when creating a post,
+        then push it into the followers' home timelines.
         """
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        timeline.fan_out(post)
 
     def perform_update(self, serializer):
         """
@@ -56,20 +184,74 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
     @action(detail=True, methods=['get'])
+    @conditional(post_comments_validators)
     def comments(self, request, pk=None):
         """
-        Custom action to retrieve all comments for a specific post.
-        GET /api/posts/{post_id}/comments/
+        Custom action to page through all comments for a specific post.
+        GET /api/posts/{post_id}/comments/?cursor=...
+        Answers conditional GETs with 304 while the comments are unchanged.
         """
         post = self.get_object()
-        comments = post.comments.all().select_related('author')
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        comments = Comment.objects.filter(post=post).select_related('author').order_by('-created_at', '-id')
+        page = self.paginate_queryset(comments)
+        serializer = CommentSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    @cache_response('posts', 'users', depends_on=post_tags)
+    def search(self, request):
+        """
+        Best matches for ?q= first, each with its rank and a snippet.
+        GET /api/posts/search/?q=...&page_size=...
+        Relevance order has no stable key to seek on, so instead of cursors
+        this returns the top page_size results.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': 'The q parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        results = search.search(self.get_queryset(), query)[:self.paginator.get_page_size(request)]
+        serializer = self.get_serializer(results, many=True, context={**self.get_serializer_context(), 'query': query})
+        return Response({'query': query, 'results': serializer.data})
+
+    @action(detail=False, methods=['get'])
+    @cache_response('posts', 'users', 'trending', depends_on=post_tags)
+    def trending(self, request):
+        """
+        Hottest posts first, read from the precomputed ranking table.
+        GET /api/posts/trending/?page_size=...
+        Like search, scores keep moving, so this returns the top page_size
+        posts instead of cursors.
+        """
+        posts = trending.ranked(self.get_queryset())[:self.paginator.get_page_size(request)]
+        serializer = self.get_serializer(posts, many=True)
+        return Response({'results': serializer.data})
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """
+        Create many posts from an NDJSON body or a JSON array, streamed.
+        POST /api/posts/bulk/
+        Invalid items are reported by index and skipped (see ingest.py).
+        """
+        return bulk_response(ingest.ingest(request.user, ingest.read_items(request), ingest.validate_post, ingest.write_posts))
 
+    @conditional(post_validators, tags=('post:{pk}', 'users'))
+    @cache_response('post:{pk}', 'users')
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Cached post detail; writes to the post, its comments or its likes invalidate it.
+        Answers If-None-Match / If-Modified-Since with 304 before rendering.
+        """
+        return super().retrieve(request, *args, **kwargs)
+
+    @cache_response('posts', 'users', depends_on=post_tags)
     def list(self, request, *args, **kwargs):
         """
         Override list to add custom response structure.
+        Unshaped pages are rendered by the compiled read path.
         """
+        if self.uses_read_path():
+            return self.read_path_list(request)
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
         
@@ -121,59 +303,101 @@ class PostViewSet(viewsets.ModelViewSet):
             'message': 'Post deleted successfully'
         }, status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def toggle_like(self, operation, pk):
+        """Run likes.like or likes.unlike for the requesting user, 404 for unknown posts"""
+        try:
+            return operation(self.request.user.pk, int(pk))
+        except (ValueError, Post.DoesNotExist):
+            raise Http404
+
+    @action(detail=True, methods=['put', 'delete', 'post'], permission_classes=[IsAuthenticated])
     def like(self, request, pk=None):
-        # use generics.get_object_or_404 to match required pattern
-        post = generics.get_object_or_404(Post, pk=pk)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-
-        if not created:
-            return Response({"detail": "You have already liked this post"}, status=400)
-
-        if post.author != request.user:
-            Notification.objects.create(
-                recipient=post.author,
-                actor=request.user,
-                verb="liked your post",
-                target=post
-            )
-        return Response({"detail": "post liked successfully"}, status=201)
+        """
+        PUT likes the post and DELETE unlikes it. Both are idempotent and
+        answer {"liked": ..., "changed": ..., "likes_count": ...}.
+        POST is the older form of PUT and answers 400 when already liked.
+        """
+        if request.method == 'DELETE':
+            result = self.toggle_like(likes.unlike, pk)
+        else:
+            result = self.toggle_like(likes.like, pk)
+            if result.changed:
+                notify(result.author_id, request.user.pk, "liked your post", target=('posts.post', int(pk)))
+
+        if request.method == 'POST':
+            if not result.changed:
+                return Response({"detail": "You have already liked this post"}, status=400)
+            return Response({"detail": "post liked successfully"}, status=201)
+        return Response({
+            "liked": request.method == 'PUT',
+            "changed": result.changed,
+            "likes_count": result.likes_count,
+        })
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def unlike(self, request, pk=None):
-        post = generics.get_object_or_404(Post, pk=pk)
-        like = Like.objects.filter(user=request.user, post=post).first()
-        if not like:
+        """Older form of DELETE .../like/; answers 400 when not liked"""
+        result = self.toggle_like(likes.unlike, pk)
+        if not result.changed:
             return Response({"detail": "You have not liked this post."}, status=400)
-        like.delete()
         return Response({"detail": "Post unliked successfully."}, status=200)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ReadPathListMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing comments with full CRUD operations.
     
     Provides:
-    - list: Get all comments (paginated)
+    - list: Get all comments (keyset paginated)
     - retrieve: Get a specific comment
     - create: Create a new comment
     - update/partial_update: Update a comment (author only)
     - destroy: Delete a comment (author only)
+    - bulk: Create many comments in one streamed request
+
+    Reads take ?fields= and ?expand=post (see social_media_api/fieldsets.py).
     """
     queryset = Comment.objects.all().select_related('author', 'post')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['post', 'author']
     search_fields = ['content']
-    ordering_fields = ['created_at', 'updated_at']
+    ordering_fields = ['created_at']
     ordering = ['-created_at']
+    read_path = ReadPath(CommentSerializer)
+
+    def get_queryset(self):
+        """Keep only the columns and joins a ?fields= / ?expand= response needs"""
+        return self.shape_queryset(super().get_queryset(), self.queryset_shape(), 'created_at')
+
+    @cache_response('comments', 'users')
+    def list(self, request, *args, **kwargs):
+        """
+        Cached comment listing; comment writes invalidate it.
+        Unshaped pages are rendered by the compiled read path.
+        """
+        if self.uses_read_path():
+            return self.read_path_list(request)
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """
+        Create many comments from an NDJSON body or a JSON array, streamed.
+        POST /api/comments/bulk/
+        Invalid items are reported by index and skipped (see ingest.py).
+        """
+        return bulk_response(ingest.ingest(request.user, ingest.read_items(request), ingest.validate_comment, ingest.write_comments))
 
     def perform_create(self, serializer):
         """
-        Set the author to the current authenticated user when creating a comment.
+        Set the author to the current authenticated user when creating a comment,
+        and let the post's author know.
         """
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        notify(comment.post.author_id, self.request.user.pk, "commented on your post", target=('posts.post', comment.post_id))
 
     def perform_update(self, serializer):
         """
@@ -220,59 +444,52 @@ class CommentViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_204_NO_CONTENT)
     
 
-class FeedView(generics.ListAPIView):
+class FeedView(SparseFieldsViewMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = PostSerializer
-    pagination_class = None
-
-    def get_queryset(self):
-        user = self.request.user
-        #posts by users that the user follows
-        following_users = user.following.all()
-        return Post.objects.filter(author__in=following_users).order_by('-created_at')
-    
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def like_post(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-
-    like, created = Like.objects.get_or_create(
-        user=request.user,
-        post=post
-    )
+    pagination_class = TimelinePagination
 
-    if not created:
-        return Response(
-            {"detail": "You have already liked this post."},
-            status=400
-        )
-
-    if post.author != request.user:
-        Notification.objects.create(
-            recipient=post.author,
-            actor=request.user,
-            verb="liked your post",
-            target=post
-        )
-
-    return Response({"detail": "Post liked successfully."}, status=201)
+    @conditional(feed_validators)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
+    def get_queryset(self):
+        #posts by users that the user follows; TimelinePagination picks the page from the materialized timeline
+        shape = self.queryset_shape()
+        queryset = self.shape_queryset(Post.objects.select_related('author'), shape, 'created_at')
+        if self.wants(shape, 'liked_by_me'):
+            queryset = likes.with_liked_by_me(queryset, self.request.user)
+        if self.wants(shape, 'comments'):
+            queryset = queryset.prefetch_related(recent_comments_prefetch(PostViewSet.comments_preview_size))
+        return queryset
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def unlike_post(request, pk):
-    post = get_object_or_404(Post, pk=pk)
 
-    like = Like.objects.filter(
-        user=request.user,
-        post=post
-    ).first()
+class ExportView(views.APIView):
+    """
+    Stream a dataset as NDJSON or CSV, optionally gzipped.
+    GET /api/export/<posts|comments|likes>.<ndjson|csv>[.gz]
+    Users export their own rows; staff export everyone's with ?scope=all.
+    """
+    permission_classes = [IsAuthenticated]
 
-    if not like:
-        return Response(
-            {"detail": "You have not liked this post."},
-            status=400
+    def get(self, request, dataset, extension):
+        format, _, compression = extension.partition('.')
+        if dataset not in export.DATASETS or format not in export.FORMATS or compression not in ('', 'gz'):
+            raise Http404
+        if request.query_params.get('scope') == 'all':
+            if not request.user.is_staff:
+                return Response({'detail': 'Only staff can export every user\'s data.'}, status=status.HTTP_403_FORBIDDEN)
+            user_id = None
+        else:
+            user_id = request.user.pk
+
+        compress = compression == 'gz'
+        chunks = export.stream(dataset, format, compress=compress, user_id=user_id)
+        if isinstance(request._request, ASGIRequest):
+            chunks = export.aiterate(chunks)
+        response = StreamingHttpResponse(
+            chunks, content_type='application/gzip' if compress else export.FORMATS[format]
         )
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{extension}"'
+        return response
 
-    like.delete()
-    return Response({"detail": "Post unliked successfully."}, status=200)
\ No newline at end of file
@@ -0,0 +1,364 @@
+"""
+Query-count and latency benchmarks for the API.
+
+seed() fills the database with a reproducible social graph of bench_* users,
+posts, comments, likes, follow edges and notifications. run() drives every
+endpoint through the test client as seeded users and records, per scenario,
+the worst query count seen and p50/p95/p99 latency. check() compares a run
+against a JSON baseline of budgets: a scenario fails when it issues more
+queries than its budget, or when its p95 is more than the tolerance above the
+baseline p95. Without an N+1 query counts do not grow with data volume, so
+the same query budgets hold for every profile.
+
+The response cache is cleared before each request, so it is the uncached path
+that gets measured. Queries are captured with a debug cursor, which adds a
+little to every latency figure.
+
+Seed into a dedicated database; `manage.py benchmark_api` wraps all of this.
+
+Settings:
+    BENCHMARK_BASELINE          - path of the baseline JSON (default BASE_DIR/benchmark_baseline.json)
+    BENCHMARK_LATENCY_TOLERANCE - allowed p95 growth over the baseline (default 0.25)
+"""
+import itertools
+import json
+import random
+import statistics
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts import graph, recommendations
+from notifications.models import Notification
+from posts import search, timeline, trending
+from posts.models import Comment, Like, Post
+from .caching import get_cache
+
+User = get_user_model()
+Follow = User.followers.through
+
+USER_PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+BATCH_SIZE = 5000
+READERS = 20
+BASELINE = getattr(settings, 'BENCHMARK_BASELINE', settings.BASE_DIR / 'benchmark_baseline.json')
+LATENCY_TOLERANCE = getattr(settings, 'BENCHMARK_LATENCY_TOLERANCE', 0.25)
+
+# per-user and per-post volumes; `large` is 100k posts and 1M follow edges
+PROFILES = {
+    'tiny': {'users': 40, 'posts': 400, 'comments': 3, 'likes': 3, 'follows': 25, 'notifications': 30},
+    'small': {'users': 1000, 'posts': 10000, 'comments': 3, 'likes': 5, 'follows': 50, 'notifications': 50},
+    'large': {'users': 10000, 'posts': 100000, 'comments': 5, 'likes': 10, 'follows': 100, 'notifications': 100},
+}
+
+WORDS = (
+    'django rest api python post comment like follow feed timeline cache query index search '
+    'database postgres redis worker notification user profile token cursor page stream event '
+    'graph batch signal model view serializer test benchmark latency budget release deploy'
+).split()
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def insert(model, rows):
+    """bulk_create an iterable of unsaved instances in BATCH_SIZE chunks"""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, BATCH_SIZE))
+        if not chunk:
+            return
+        model.objects.bulk_create(chunk, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def bench_user_ids():
+    return list(User.objects.filter(username__startswith=USER_PREFIX).order_by('pk').values_list('pk', flat=True))
+
+
+def seed(profile='small', random_seed=0):
+    """
+    Create a profile's worth of bench data in the current database.
+    Signals are bypassed throughout, so counters, the readers' timelines and
+    recommendations, the follow graph cache, the trending ranking and the
+    search index are rebuilt explicitly at the end.
+    """
+    if User.objects.filter(username__startswith=USER_PREFIX).exists():
+        raise BenchmarkError("Bench data already exists; seed into an empty database")
+    volume = PROFILES[profile]
+    rng = random.Random(random_seed)
+
+    password = make_password(PASSWORD)
+    insert(User, (User(username=f'{USER_PREFIX}{i:06d}', password=password) for i in range(volume['users'])))
+    user_ids = bench_user_ids()
+    # a few accounts are followed by most people, as in real graphs
+    weights = [1 / (rank + 1) for rank in range(len(user_ids))]
+
+    def followees(follower_id):
+        chosen = set()
+        while len(chosen) < min(volume['follows'], len(user_ids) - 1):
+            chosen.update(rng.choices(user_ids, weights=weights, k=volume['follows']))
+            chosen.discard(follower_id)
+        return list(chosen)[:volume['follows']]
+
+    following = {user_id: followees(user_id) for user_id in user_ids}
+    insert(Follow, (
+        Follow(from_customuser_id=author_id, to_customuser_id=follower_id)
+        for follower_id, author_ids in following.items()
+        for author_id in author_ids
+    ))
+
+    insert(Post, (
+        Post(author_id=rng.choice(user_ids), title=sentence(rng, 5), content=sentence(rng, 40), fanned_out=True)
+        for _ in range(volume['posts'])
+    ))
+    post_ids = list(Post.objects.filter(author_id__in=user_ids).values_list('pk', flat=True))
+    insert(Comment, (
+        Comment(post_id=post_id, author_id=rng.choice(user_ids), content=sentence(rng, 12))
+        for post_id in post_ids
+        for _ in range(volume['comments'])
+    ))
+    insert(Like, (
+        Like(post_id=post_id, user_id=user_id)
+        for post_id in post_ids
+        for user_id in rng.sample(user_ids, min(volume['likes'], len(user_ids)))
+    ))
+    call_command('reconcile_post_counters', stdout=StringIO())
+    call_command('reconcile_user_counters', stdout=StringIO())
+
+    readers = user_ids[:READERS]
+    for reader_id in readers:
+        timeline.backfill([reader_id], following[reader_id])
+        Token.objects.get_or_create(user_id=reader_id)
+    post_type = ContentType.objects.get_for_model(Post)
+    insert(Notification, (
+        Notification(
+            recipient_id=reader_id, actor_id=rng.choice(user_ids), verb='liked your post',
+            target_content_type=post_type, target_object_id=rng.choice(post_ids),
+            actor_count=rng.randint(1, 5), is_read=rng.random() < 0.5
+        )
+        for reader_id in readers
+        for _ in range(volume['notifications'])
+    ))
+    graph.rebuild(user_ids)
+    recommendations.refresh(readers)
+    trending.update(settle=0)
+    search.rebuild()
+    return {'users': len(user_ids), 'posts': len(post_ids), 'follows': sum(map(len, following.values()))}
+
+
+class Context:
+    """Bench users and posts the scenarios pick from"""
+
+    def __init__(self, random_seed=0):
+        self.rng = random.Random(random_seed)
+        self.user_ids = bench_user_ids()
+        if not self.user_ids:
+            raise BenchmarkError("No bench data found; run with --seed first")
+        self.readers = self.user_ids[:READERS]
+        self.post_ids = list(Post.objects.filter(author_id__in=self.readers).values_list('pk', flat=True))
+        self.post_ids += list(Post.objects.order_by('-pk').values_list('pk', flat=True)[:1000])
+        self.tokens = dict(Token.objects.filter(user_id__in=self.readers).values_list('user_id', 'key'))
+
+    def reader(self):
+        return self.rng.choice(self.readers)
+
+    def post(self):
+        return self.rng.choice(self.post_ids)
+
+    def stranger(self, user_id):
+        """A bench user that user_id does not follow"""
+        followed = set(Follow.objects.filter(to_customuser_id=user_id).values_list('from_customuser_id', flat=True))
+        return self.rng.choice([pk for pk in self.user_ids if pk not in followed and pk != user_id])
+
+
+# Each scenario picks a reader and returns (reader, method, path, data, cleanup),
+# optionally followed by request headers. Setup and cleanup run outside the
+# measured request.
+
+def get(path):
+    return lambda ctx: (ctx.reader(), 'get', path, None, None)
+
+
+def post_path(template):
+    return lambda ctx: (ctx.reader(), 'get', template.format(post=ctx.post()), None, None)
+
+
+def revalidate(scenario):
+    """scenario's GET repeated with the ETag of a first, unmeasured response"""
+    def setup(ctx):
+        reader, method, path, data, cleanup = scenario(ctx)
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Token {ctx.tokens[reader]}')
+        etag = client.get(path, secure=True)['ETag']
+        return reader, method, path, data, cleanup, {'HTTP_IF_NONE_MATCH': etag}
+    return setup
+
+
+def like(ctx):
+    reader, post_id = ctx.reader(), ctx.post()
+    Like.objects.filter(user_id=reader, post_id=post_id).delete()
+    return reader, 'post', f'/api/posts/{post_id}/like/', None, lambda: Like.objects.filter(user_id=reader, post_id=post_id).delete()
+
+
+def unlike(ctx):
+    reader, post_id = ctx.reader(), ctx.post()
+    Like.objects.get_or_create(user_id=reader, post_id=post_id)
+    return reader, 'post', f'/api/posts/{post_id}/unlike/', None, None
+
+
+def follow(ctx):
+    reader = ctx.reader()
+    target = ctx.stranger(reader)
+    return reader, 'post', f'/api/accounts/follow/{target}/', None, lambda: User.objects.get(pk=reader).following.remove(target)
+
+
+def unfollow(ctx):
+    reader = ctx.reader()
+    target = ctx.stranger(reader)
+    User.objects.get(pk=reader).following.add(target)
+    return reader, 'post', f'/api/accounts/unfollow/{target}/', None, None
+
+
+def follow_status(ctx):
+    ids = ','.join(str(pk) for pk in ctx.rng.sample(ctx.user_ids, min(50, len(ctx.user_ids))))
+    return ctx.reader(), 'get', f'/api/accounts/follow/status/?user_ids={ids}', None, None
+
+
+def post_search(template):
+    return lambda ctx: (ctx.reader(), 'get', template.format(word=ctx.rng.choice(WORDS)), None, None)
+
+
+def mark_read(ctx):
+    return ctx.reader(), 'post', '/api/notifications/mark-read/', {}, None
+
+
+SCENARIOS = {
+    'feed': get('/api/feed/'),
+    'posts_list': get('/api/posts/'),
+    'posts_search': post_search('/api/posts/?search={word}'),
+    'posts_ranked_search': post_search('/api/posts/search/?q={word}'),
+    'posts_trending': get('/api/posts/trending/'),
+    'post_detail': post_path('/api/posts/{post}/'),
+    'post_comments': post_path('/api/posts/{post}/comments/'),
+    'post_detail_not_modified': revalidate(post_path('/api/posts/{post}/')),
+    'post_comments_not_modified': revalidate(post_path('/api/posts/{post}/comments/')),
+    'feed_not_modified': revalidate(get('/api/feed/')),
+    'comments_list': get('/api/comments/'),
+    'like': like,
+    'unlike': unlike,
+    'follow': follow,
+    'unfollow': unfollow,
+    'follow_status': follow_status,
+    'following_list': get('/api/accounts/following/'),
+    'followers_list': get('/api/accounts/followers/'),
+    'profile': get('/api/accounts/profile/'),
+    'profile_not_modified': revalidate(get('/api/accounts/profile/')),
+    'recommendations': get('/api/accounts/recommendations/'),
+    'notifications': get('/api/notifications/'),
+    'notifications_unread_count': get('/api/notifications/unread-count/'),
+    'notifications_mark_read': mark_read,
+}
+
+
+def percentile(quantiles, p):
+    return round(quantiles[p - 1] * 1000, 3)
+
+
+def measure(name, scenario, ctx, client, iterations):
+    timings, queries = [], []
+    for _ in range(iterations):
+        reader, method, path, data, cleanup, *headers = scenario(ctx)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {ctx.tokens[reader]}')
+        get_cache().clear()
+        # responses are measured uncached, but the follow graph stays warm as in production
+        graph.rebuild([reader])
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data, format='json', secure=True, **(headers[0] if headers else {}))
+            timings.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise BenchmarkError(f"{name}: {method.upper()} {path} returned {response.status_code}")
+        queries.append(len(captured))
+        if cleanup:
+            cleanup()
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'queries': max(queries),
+        'p50_ms': percentile(quantiles, 50),
+        'p95_ms': percentile(quantiles, 95),
+        'p99_ms': percentile(quantiles, 99),
+    }
+
+
+def run(iterations=30, names=None, random_seed=0):
+    """Measure each scenario (all by default); returns {name: stats}"""
+    if iterations < 2:
+        raise BenchmarkError("At least 2 iterations are needed for percentiles")
+    ctx = Context(random_seed)
+    client = APIClient(SERVER_NAME='localhost')
+    unknown = set(names or ()) - set(SCENARIOS)
+    if unknown:
+        raise BenchmarkError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    # authenticate every reader once so budgets measure warm token caches
+    for key in ctx.tokens.values():
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        client.get('/api/accounts/profile/', secure=True)
+    # budgets cover the request path as deployed with Redis: notifications go to
+    # the outbox and the follow graph is cached
+    with override_settings(
+        NOTIFICATIONS_BACKEND='notifications.pipeline.OutboxBackend',
+        FOLLOW_GRAPH_CACHE_ALIAS='default',
+    ):
+        return {
+            name: measure(name, scenario, ctx, client, iterations)
+            for name, scenario in SCENARIOS.items()
+            if not names or name in names
+        }
+
+
+def load_baseline(path=BASELINE):
+    with open(path) as f:
+        return json.load(f)['scenarios']
+
+
+def save_baseline(results, path=BASELINE):
+    """Write results as the new budgets: query counts and p95 latency"""
+    scenarios = {name: {'queries': stats['queries'], 'p95_ms': stats['p95_ms']} for name, stats in results.items()}
+    with open(path, 'w') as f:
+        json.dump({'scenarios': scenarios}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def check(results, baseline, latency_tolerance=LATENCY_TOLERANCE):
+    """
+    Budget violations of results against baseline, as messages.
+    Budgets without a p95_ms (or a None tolerance) only check query counts.
+    """
+    failures = []
+    for name, stats in results.items():
+        budget = baseline.get(name)
+        if budget is None:
+            failures.append(f"{name}: no budget in the baseline")
+            continue
+        if stats['queries'] > budget['queries']:
+            failures.append(f"{name}: {stats['queries']} queries, budget {budget['queries']}")
+        limit = budget.get('p95_ms')
+        if limit is not None and latency_tolerance is not None:
+            limit = limit * (1 + latency_tolerance)
+            if stats['p95_ms'] > limit:
+                failures.append(f"{name}: p95 {stats['p95_ms']}ms, budget {limit:.3f}ms")
+    return failures
@@ -0,0 +1,119 @@
+"""
+Versioned response cache for read-heavy API views.
+
+Cached responses are keyed on the view, the full URL (path and sorted query
+params), the requesting user and the current version of every tag the view
+depends on. Writes never delete keys; they bump a tag's version instead, so
+every entry built on the old version simply stops being addressed and ages
+out with its timeout. Any Django cache backend works: locmem or file caches
+in development and tests, Redis (or anything Redis-compatible) in production.
+
+Tags can name one object: 'post:{pk}' is filled in from the view's URL
+kwargs, so a write to one post only orphans that post's entries. Responses
+listing objects declare the per-object tags of what they render with
+depends_on; the entry keeps those tags' versions and is treated as a miss
+once any of them has moved. A write landing between the render and the
+version read can leave such an entry stale until its timeout.
+
+Settings:
+    API_CACHE_ALIAS   - name of the entry in CACHES to use (default 'default')
+    API_CACHE_TIMEOUT - seconds a cached response lives (default 60)
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+KEY_PREFIX = 'api-cache'
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+def get_versions(tags):
+    """
+    Current version of each tag.
+    Missing versions are seeded from the clock rather than 1, so a version key
+    that was evicted can never come back and match entries cached before.
+    """
+    cache = get_cache()
+    keys = [tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags):
+    """Bump the version of each tag, orphaning every response cached under it"""
+    cache = get_cache()
+    for tag in tags:
+        try:
+            cache.incr(tag_key(tag))
+        except ValueError:
+            cache.set(tag_key(tag), time.time_ns(), None)
+
+
+def format_tags(tags, kwargs):
+    """tags with {placeholders} filled in from a view's URL kwargs"""
+    return [tag.format(**kwargs) for tag in tags]
+
+
+def response_key(request, view_name, tags):
+    user = request.user
+    user_id = user.pk if user and user.is_authenticated else 'anon'
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    raw = repr((view_name, request.get_host(), request.path, params, user_id, get_versions(tags)))
+    return f'{KEY_PREFIX}:response:{hashlib.sha256(raw.encode()).hexdigest()}'
+
+
+def cache_response(*tags, timeout=None, depends_on=None):
+    """
+    Cache successful GET responses of a DRF view method under the given tags.
+
+    The serialized `response.data` is stored rather than the rendered bytes,
+    so content negotiation still happens on every request. depends_on(data)
+    returns the tags of the objects a response renders, or None when it
+    cannot tell and the response must not be cached.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return method(view, request, *args, **kwargs)
+
+            cache = get_cache()
+            key = response_key(request, f'{type(view).__name__}.{method.__name__}', format_tags(tags, kwargs))
+            cached = cache.get(key)
+            if cached is not None:
+                data, status, depends = cached
+                if not depends or get_versions(list(depends)) == list(depends.values()):
+                    response = Response(data, status=status)
+                    response['X-Cache'] = 'HIT'
+                    return response
+
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                depends = {}
+                if depends_on is not None:
+                    object_tags = depends_on(response.data)
+                    if object_tags is None:
+                        return response
+                    object_tags = list(dict.fromkeys(object_tags))
+                    depends = dict(zip(object_tags, get_versions(object_tags)))
+                ttl = timeout if timeout is not None else getattr(settings, 'API_CACHE_TIMEOUT', 60)
+                cache.set(key, (response.data, response.status_code, depends), ttl)
+                response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,99 @@
+"""
+Conditional GET (ETag / Last-Modified) for API views.
+
+A view states its validators: a few values that change whenever its
+response would, read with one cheap query (max(updated_at), counters, the
+reader's own flags) instead of building and serializing the payload. The
+ETag is a hash of those values and the requesting user, since responses
+carry per-reader fields such as liked_by_me. A request whose
+If-None-Match or If-Modified-Since still matches gets 304 Not Modified
+before the view, its response cache or its serializer runs.
+
+Views behind the response cache pass its tags too: the validators are
+then cached with the response under the same tag versions, so repeat reads
+and revalidations of a cached resource cost no query at all.
+
+ETags are weak: they vouch for the JSON's meaning, not its bytes.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .caching import format_tags, get_cache, response_key
+
+
+def make_etag(request, *parts):
+    user = request.user
+    user_id = user.pk if user and user.is_authenticated else 'anon'
+    # the host too, since responses carry absolute URLs
+    digest = hashlib.sha256(repr((user_id, request.get_host(), parts)).encode()).hexdigest()[:32]
+    return f'W/{quote_etag(digest)}'
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 (or 412) response when the request's preconditions say so, otherwise None"""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # the ETag depends on who is asking
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def conditional(validators, tags=()):
+    """
+    Answer conditional GETs of a DRF view method before running it.
+    validators(view, request, *args, **kwargs) returns (parts, last_modified),
+    parts being any repr()-able values the response depends on, or None when
+    there is nothing to validate (e.g. the object does not exist).
+    With tags, computed validators are cached like cache_response entries.
+    """
+    def decorator(method):
+        def compute(view, request, *args, **kwargs):
+            found = validators(view, request, *args, **kwargs)
+            if found is None:
+                return None
+            parts, last_modified = found
+            return make_etag(request, request.get_full_path(), *parts), last_modified
+
+        def lookup(view, request, *args, **kwargs):
+            if not tags:
+                return compute(view, request, *args, **kwargs)
+            cache = get_cache()
+            key = response_key(request, f'{type(view).__name__}.{method.__name__}:validators', format_tags(tags, kwargs))
+            found = cache.get(key)
+            if found is None:
+                found = compute(view, request, *args, **kwargs)
+                if found is not None:
+                    cache.set(key, found, getattr(settings, 'API_CACHE_TIMEOUT', 60))
+            return found
+
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return method(view, request, *args, **kwargs)
+            found = lookup(view, request, *args, **kwargs)
+            if found is None:
+                return method(view, request, *args, **kwargs)
+
+            etag, last_modified = found
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                add_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+"""
+Sparse fieldsets and field expansion for API responses.
+
+`?fields=id,title,created_at` keeps only the listed top-level fields, and
+`?expand=post` swaps a field for the nested representation a serializer
+declares in Meta.expandable_fields. Without either parameter responses are
+unchanged.
+
+The requested shape is worked out from the serializer class before the
+queryset runs, so views can fetch only what will be rendered:
+queryset_shape() lists the columns for .only(), the forward relations worth
+a select_related(), and the kept field names, which views check before
+adding prefetches and annotations. Columns follow each field's source; a
+method field that reads model attributes names them in Meta.field_columns.
+
+SparseFieldsMixin goes on serializers, SparseFieldsViewMixin on the views
+rendering them.
+"""
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+Shape = namedtuple('Shape', 'fields only select_related')
+
+
+def parse_list(value):
+    return [name for name in (part.strip() for part in (value or '').split(',')) if name]
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin taking fields= (names to keep) and expand= (names to
+    nest) keyword arguments. Meta.expandable_fields maps a field name to a
+    callable returning the nested serializer field used when it is expanded.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        expand = [name for name in expand or () if name in expandable]
+        for name in expand:
+            self.fields[name] = expandable[name]()
+        if fields:
+            keep = set(fields) | set(expand)
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+
+def field_columns(serializer, model, prefix=''):
+    """(columns, select_related) needed to render serializer's readable fields from model rows"""
+    columns, related = [f'{prefix}{model._meta.pk.name}'], []
+    extra = getattr(getattr(serializer, 'Meta', None), 'field_columns', {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        columns.extend(f'{prefix}{column}' for column in extra.get(name, ()))
+        source = field.source.split('.')[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            continue
+        if model_field.many_to_many or model_field.one_to_many:
+            continue
+        if isinstance(field, serializers.BaseSerializer) and model_field.many_to_one:
+            nested_columns, nested_related = field_columns(field, model_field.related_model, f'{prefix}{source}__')
+            columns.extend(nested_columns)
+            related.append(f'{prefix}{source}')
+            related.extend(nested_related)
+        elif model_field.concrete:
+            columns.append(f'{prefix}{model_field.name}')
+    return columns, related
+
+
+class SparseFieldsViewMixin:
+    """
+    View mixin reading ?fields= and ?expand= on safe requests and passing
+    them to serializers that take them.
+    """
+
+    def requested_shape(self):
+        """(fields, expand) asked for, or (None, []) when the request does not shape its response"""
+        if self.request.method not in ('GET', 'HEAD'):
+            return None, []
+        params = self.request.query_params
+        return parse_list(params.get('fields')) or None, parse_list(params.get('expand'))
+
+    def queryset_shape(self, serializer_class=None):
+        """
+        Shape of the response, or None when the full default representation is wanted.
+        Shape.fields holds the names that will be rendered.
+        """
+        fields, expand = self.requested_shape()
+        if fields is None and not expand:
+            return None
+        serializer_class = serializer_class or self.get_serializer_class()
+        serializer = serializer_class(fields=fields, expand=expand)
+        columns, related = field_columns(serializer, serializer_class.Meta.model)
+        return Shape(set(serializer.fields), columns, related)
+
+    def wants(self, shape, name):
+        """Whether name will be rendered; everything is when the response is not shaped"""
+        return shape is None or name in shape.fields
+
+    def shape_queryset(self, queryset, shape, *columns):
+        """queryset reduced to shape's columns (plus columns, e.g. pagination keys) and relations"""
+        if shape is None:
+            return queryset
+        queryset = queryset.select_related(None)
+        if shape.select_related:
+            # select_related() without names would follow every relation
+            queryset = queryset.select_related(*shape.select_related)
+        return queryset.only(*shape.only, *columns)
+
+    def get_serializer(self, *args, **kwargs):
+        if issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            kwargs['fields'], kwargs['expand'] = self.requested_shape()
+        return super().get_serializer(*args, **kwargs)
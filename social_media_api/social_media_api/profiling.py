@@ -0,0 +1,306 @@
+"""
+Sampled per-request SQL profiling.
+
+SQLProfilingMiddleware profiles a SQL_PROFILING_SAMPLE_RATE fraction of
+requests. Every database connection carries an execute wrapper that, while
+the current request is being profiled, counts each query, adds up its time
+and records its fingerprint: the SQL with IN-lists collapsed, parameters
+being separate already. The active profile lives in a context variable, so
+under ASGI queries made by sync views in worker threads are still seen. A
+fingerprint executed more than once in one request is a duplicate, which is
+how an N+1 shows up. Time spent building serializer `.data` is measured as
+well (outermost serializer only, so nested ones are not counted twice).
+With a sample rate of 0 the middleware removes itself at startup and none of
+these hooks are installed.
+
+Each profiled response carries a Server-Timing header (db, serialize, app)
+that browser dev tools display, and its numbers are appended to a rolling
+window of recent samples kept in process memory. Every
+SQL_PROFILING_FLUSH_EVERY samples the window is copied to the cache so that
+`manage.py sql_report` can merge the windows of every process; use a shared
+cache (Redis) when there is more than one. Each process claims a numbered
+slot for its copy with an atomic cache.incr, so concurrent first flushes
+never overwrite each other's registration.
+
+Settings:
+    SQL_PROFILING_SAMPLE_RATE - fraction of requests to profile, 0 disables (default 0)
+    SQL_PROFILING_WINDOW      - samples kept per process (default 1000)
+    SQL_PROFILING_FLUSH_EVERY - samples between copies to the cache (default 20)
+    SQL_PROFILING_CACHE_ALIAS - entry in CACHES for the copies (default 'default')
+"""
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+KEY_PREFIX = 'sql-profile'
+SLOTS_KEY = f'{KEY_PREFIX}:slots'
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+_current = ContextVar('sql_profile', default=None)
+
+
+def setting(name, default):
+    return getattr(settings, f'SQL_PROFILING_{name}', default)
+
+
+def fingerprint(sql):
+    """SQL with IN-lists collapsed, so one query shape is one fingerprint"""
+    return WHITESPACE_RE.sub(' ', IN_LIST_RE.sub('(...)', sql)).strip()
+
+
+class Profile:
+    """Measurements of a single request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.fingerprints = Counter()
+        self.in_serializer = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+def execute(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install_query_hook(sender, connection, **kwargs):
+    if execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute)
+
+
+def install_query_hooks():
+    """Hook every connection of this thread now and every one opened later"""
+    for connection in connections.all():
+        install_query_hook(None, connection)
+    connection_created.connect(install_query_hook, dispatch_uid='sql_profiling')
+
+
+def timed(prop):
+    """Wrap a serializer's `data` property to add its time to the active profile"""
+    def data(self):
+        profile = _current.get()
+        if profile is None or profile.in_serializer:
+            return prop.fget(self)
+        profile.in_serializer = True
+        start = time.perf_counter()
+        try:
+            return prop.fget(self)
+        finally:
+            profile.serialize_time += time.perf_counter() - start
+            profile.in_serializer = False
+    data.profiled = True
+    return property(data)
+
+
+def install_serializer_timing():
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, 'profiled', False):
+            cls.data = timed(cls.data)
+
+
+class Report:
+    """Rolling window of recent samples, safe to share between threads"""
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.unflushed = 0
+        self.lock = threading.Lock()
+
+    def add(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+            self.unflushed += 1
+            if self.unflushed < setting('FLUSH_EVERY', 20):
+                return
+            self.unflushed = 0
+            snapshot = list(self.samples)
+        flush(snapshot)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.samples)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.unflushed = 0
+
+
+REPORT = Report(setting('WINDOW', 1000))
+_slots = {}
+
+
+def get_cache():
+    return caches[setting('CACHE_ALIAS', 'default')]
+
+
+def slot_key(slot):
+    return f'{KEY_PREFIX}:{slot}'
+
+
+def slot_keys(cache):
+    return [slot_key(slot) for slot in range(1, cache.get(SLOTS_KEY, 0) + 1)]
+
+
+def process_key():
+    """Cache key of this process's copy, claiming a slot on the first flush"""
+    pid = os.getpid()
+    if pid not in _slots:
+        cache = get_cache()
+        # the counter never expires, so slots are never handed out twice
+        cache.add(SLOTS_KEY, 0, None)
+        _slots[pid] = cache.incr(SLOTS_KEY)
+    return slot_key(_slots[pid])
+
+
+def flush(samples):
+    get_cache().set(process_key(), samples, SNAPSHOT_TIMEOUT)
+
+
+def collect():
+    """Samples flushed by every process plus this process's current window"""
+    cache = get_cache()
+    own = slot_key(_slots[os.getpid()]) if os.getpid() in _slots else None
+    keys = [key for key in slot_keys(cache) if key != own]
+    samples = [sample for snapshot in cache.get_many(keys).values() for sample in snapshot]
+    return samples + REPORT.snapshot()
+
+
+def reset():
+    # running processes keep their slots, so the counter stays
+    cache = get_cache()
+    cache.delete_many(slot_keys(cache))
+    REPORT.clear()
+
+
+def summarize(samples, limit=10):
+    """
+    Top views by total DB time and top duplicated fingerprints.
+    Returns {'requests': n, 'views': [...], 'duplicates': [...]}.
+    """
+    views = {}
+    duplicates = {}
+    for sample in samples:
+        view = views.setdefault(sample['view'], {
+            'view': sample['view'], 'requests': 0, 'queries': 0, 'db_ms': 0.0, 'serialize_ms': 0.0, 'total_ms': 0.0,
+        })
+        view['requests'] += 1
+        for field in ('queries', 'db_ms', 'serialize_ms', 'total_ms'):
+            view[field] += sample[field]
+        for sql, count in sample['duplicates'].items():
+            entry = duplicates.setdefault((sample['view'], sql), {
+                'view': sample['view'], 'sql': sql, 'requests': 0, 'executions': 0,
+            })
+            entry['requests'] += 1
+            entry['executions'] += count
+    for view in views.values():
+        view['avg_queries'] = view['queries'] / view['requests']
+        view['avg_db_ms'] = view['db_ms'] / view['requests']
+    return {
+        'requests': len(samples),
+        'views': sorted(views.values(), key=lambda v: v['db_ms'], reverse=True)[:limit],
+        'duplicates': sorted(duplicates.values(), key=lambda d: d['executions'], reverse=True)[:limit],
+    }
+
+
+def server_timing(profile, total):
+    return ', '.join([
+        f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries, {len(profile.duplicates())} duplicated"',
+        f'serialize;dur={profile.serialize_time * 1000:.1f}',
+        f'app;dur={total * 1000:.1f}',
+    ])
+
+
+def sampled():
+    rate = setting('SAMPLE_RATE', 0)
+    return bool(rate) and random.random() < rate
+
+
+def record(request, response, profile, total):
+    """Stamp the Server-Timing header and add the request to the report"""
+    response['Server-Timing'] = server_timing(profile, total)
+    match = request.resolver_match
+    REPORT.add({
+        'view': match.view_name if match else request.path,
+        'queries': profile.queries,
+        'db_ms': profile.db_time * 1000,
+        'serialize_ms': profile.serialize_time * 1000,
+        'total_ms': total * 1000,
+        'duplicates': profile.duplicates(),
+    })
+
+
+class SQLProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not setting('SAMPLE_RATE', 0):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install_query_hooks()
+        install_serializer_timing()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not sampled():
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        record(request, response, profile, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not sampled():
+            return await self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        # flushing may talk to the cache
+        await sync_to_async(record)(request, response, profile, time.perf_counter() - start)
+        return response
@@ -0,0 +1,182 @@
+"""
+Compiled read-only rendering for list endpoints.
+
+Rendering a page through a ModelSerializer walks DRF's field machinery for
+every field of every row: get_attribute, to_representation, nested
+serializers and SerializerMethodField dispatch. ReadPath compiles a
+ModelSerializer class once into a flat plan of (output name, values() key,
+converter), then renders pages straight from queryset.values() rows,
+without model instances. Converters are only kept where the output differs
+from the database value (dates, files); everything else is copied as is, so
+the JSON is identical to the serializer's.
+
+What compiles: concrete model fields, primary keys of forward relations,
+nested serializers over forward relations (rendered from joined columns),
+and method fields mapped to an annotation in `method_fields`. Anything else
+raises ImproperlyConfigured at compile time rather than rendering differently.
+
+Views opt in per viewset with ReadPathListMixin and a `read_path`; requests
+with ?fields= or ?expand= still go through the serializer.
+"""
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import FileField
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+
+# how a plan entry gets its value from the row
+COPY, CONVERT, NESTED, ANNOTATION = 'copy', 'convert', 'nested', 'annotation'
+
+PASSTHROUGH = (
+    serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+def file_url(model_field):
+    """Converter matching DRF's FileField/ImageField output for a stored file name"""
+    storage = model_field.storage
+
+    def bind(request):
+        def convert(value):
+            if not value:
+                return None
+            url = storage.url(value)
+            return request.build_absolute_uri(url) if request is not None else url
+        return convert
+    return bind
+
+
+def datetime_iso(field):
+    """
+    Converter matching DRF's ISO 8601 DateTimeField output. The field's
+    timezone is looked up once per page rather than once per value.
+    """
+    def bind(request):
+        zone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+        def convert(value):
+            if zone is None or value is None or timezone.is_naive(value):
+                return field.to_representation(value)
+            text = value.astimezone(zone).isoformat()
+            return text[:-6] + 'Z' if text.endswith('+00:00') else text
+        return convert
+    return bind
+
+
+def drf_converter(field):
+    def bind(request):
+        def convert(value):
+            return None if value is None else field.to_representation(value)
+        return convert
+    return bind
+
+
+def converter(model_field, field):
+    if isinstance(model_field, FileField):
+        return file_url(model_field)
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if isinstance(field, serializers.DateTimeField) and output_format is not None and output_format.lower() == ISO_8601:
+        return datetime_iso(field)
+    return drf_converter(field)
+
+
+class ReadPath:
+    """
+    A ModelSerializer compiled for fast reads.
+    method_fields maps a SerializerMethodField name to (annotation, default),
+    the annotation being read from the row and default used when it is absent.
+    """
+
+    def __init__(self, serializer_class, method_fields=None):
+        self.serializer_class = serializer_class
+        self.method_fields = method_fields or {}
+        self.model = serializer_class.Meta.model
+        self.columns = []
+        self.plan = self.compile(serializer_class(), self.model, '')
+
+    def compile(self, serializer, model, prefix):
+        """[(output name, row key, kind, converter factory, nested plan or default)] for serializer"""
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                if prefix or name not in self.method_fields:
+                    raise ImproperlyConfigured(f"{serializer.__class__.__name__}.{name} has no annotation in method_fields")
+                annotation, default = self.method_fields[name]
+                plan.append((name, annotation, ANNOTATION, default))
+                continue
+            source = field.source
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(f"{serializer.__class__.__name__}.{name} is not a model field")
+            key = f'{prefix}{source}'
+            if isinstance(field, serializers.BaseSerializer):
+                if not model_field.many_to_one or isinstance(field, serializers.ListSerializer):
+                    raise ImproperlyConfigured(f"{serializer.__class__.__name__}.{name} is not a forward relation")
+                self.columns.append(key)
+                plan.append((name, key, NESTED, self.compile(field, model_field.related_model, f'{key}__')))
+                continue
+            if model_field.many_to_many or model_field.one_to_many:
+                raise ImproperlyConfigured(f"{serializer.__class__.__name__}.{name} is a to-many relation")
+            self.columns.append(key)
+            if isinstance(field, PASSTHROUGH) and not isinstance(model_field, FileField):
+                plan.append((name, key, COPY, None))
+            else:
+                plan.append((name, key, CONVERT, converter(model_field, field)))
+        return plan
+
+    def values(self, queryset):
+        """queryset as the dict rows this path renders"""
+        return queryset.values(*self.columns, *(
+            annotation for annotation, _ in self.method_fields.values()
+            if annotation in queryset.query.annotations
+        ))
+
+    def bind(self, plan, request):
+        """plan with its converters made for one request"""
+        return [
+            (name, key, kind, extra(request) if kind is CONVERT else self.bind(extra, request) if kind is NESTED else extra)
+            for name, key, kind, extra in plan
+        ]
+
+    def render_row(self, row, plan):
+        item = {}
+        for name, key, kind, extra in plan:
+            if kind is COPY:
+                item[name] = row[key]
+            elif kind is CONVERT:
+                item[name] = extra(row[key])
+            elif kind is NESTED:
+                item[name] = None if row[key] is None else self.render_row(row, extra)
+            else:
+                item[name] = row.get(key, extra)
+        return item
+
+    def render(self, rows, request=None):
+        plan = self.bind(self.plan, request)
+        render_row = self.render_row
+        return [render_row(row, plan) for row in rows]
+
+
+class ReadPathListMixin:
+    """
+    Serve list() from a ReadPath: set read_path on the viewset, or None to
+    keep the serializer. Filtering, ordering and pagination run as usual,
+    on values() rows.
+    """
+    read_path = None
+
+    def uses_read_path(self):
+        params = self.request.query_params
+        return self.read_path is not None and not params.get('fields') and not params.get('expand')
+
+    def read_path_list(self, request):
+        queryset = self.read_path.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.read_path.render(queryset, request))
+        return self.get_paginated_response(self.read_path.render(page, request))
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import dj_database_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,8 +51,6 @@ DATABASES['default'] = dj_database_url.config(
     ssl_require=True
 )
 
-]
-
 
 # Application definition
 
@@ -72,6 +73,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'social_media_api.profiling.SQLProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'social_media_api.urls'
@@ -153,9 +155,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# What login and registration issue: 'token' for DB-backed Token rows, 'jwt'
+# for stateless access/refresh tokens (see accounts/tokens.py). Both kinds
+# are accepted in either mode, so switching does not log anyone out.
+AUTH_MODE = os.environ.get('AUTH_MODE', 'token')
+
+# JWT_SIGNING_KEYS="2026-10:<secret>,2026-04:<secret>", newest first; defaults to SECRET_KEY
+if os.environ.get('JWT_SIGNING_KEYS'):
+    JWT_SIGNING_KEYS = [tuple(pair.split(':', 1)) for pair in os.environ['JWT_SIGNING_KEYS'].split(',')]
+JWT_ACCESS_LIFETIME = 5 * 60
+JWT_REFRESH_LIFETIME = 14 * 24 * 60 * 60
+
 REST_FRAMEWORK = {
 	'DEFAULT_AUTHENTICATION_CLASSES': [
-		'rest_framework.authentication.TokenAuthentication',
+		'accounts.authentication.CachedTokenAuthentication',
+        'accounts.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -169,6 +183,60 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
 	]
 }
+
+# Cache
+# Redis in production (set REDIS_URL), per-process memory otherwise.
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Response cache for read-heavy API views (see social_media_api/caching.py)
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = 60
+
+# Token authentication cache (see accounts/authentication.py). The shared tier
+# is only worth it when the cache is shared between processes.
+TOKEN_AUTH_LOCAL_SIZE = 10000
+TOKEN_AUTH_LOCAL_TTL = 30
+TOKEN_AUTH_CACHE_ALIAS = 'default' if os.environ.get('REDIS_URL') else None
+TOKEN_AUTH_CACHE_TTL = 300
+
+# Follow graph cache (see accounts/graph.py). Its version counters must be shared
+# by every process, so without Redis lookups go to the database.
+FOLLOW_GRAPH_CACHE_ALIAS = 'default' if os.environ.get('REDIS_URL') else None
+
+# Notifications are queued in an outbox and delivered by `manage.py process_notifications`,
+# which publishes live pushes over Redis pub/sub (see notifications/stream.py) so they
+# reach the streams held by every web process. Without Redis, notifications are
+# delivered in the web process itself and the local broker reaches its own streams
+# (the notifications.E001 check rejects the outbox without a shared broker).
+if os.environ.get('REDIS_URL'):
+    NOTIFICATIONS_BACKEND = 'notifications.pipeline.OutboxBackend'
+    NOTIFICATIONS_BROKER = 'notifications.broker.RedisBroker'
+else:
+    NOTIFICATIONS_BACKEND = 'notifications.pipeline.LocalBackend'
+    NOTIFICATIONS_BROKER = 'notifications.broker.LocalBroker'
+# Unread badge counters (see notifications/inbox.py), only cached when every process shares them.
+NOTIFICATIONS_UNREAD_CACHE_ALIAS = 'default' if os.environ.get('REDIS_URL') else None
+NOTIFICATIONS_STREAM_HEARTBEAT = 15
+NOTIFICATIONS_STREAM_MAX_AGE = 3600
+
+# Sampled SQL profiling (see social_media_api/profiling.py); `manage.py sql_report` reads it.
+SQL_PROFILING_SAMPLE_RATE = float(os.environ.get('SQL_PROFILING_SAMPLE_RATE', 0))
+SQL_PROFILING_WINDOW = 1000
+
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = 'DENY'
@@ -177,9 +245,6 @@ SECURE_SSL_REDIRECT = True
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 
-import os
-import dj_database_url
-
 SECRET_KEY = os.environ.get('SECRET_KEY')
 
 DATABASES = {
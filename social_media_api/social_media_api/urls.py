@@ -21,8 +21,8 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/accounts', include('accounts.urls')),
-    path('api/', include('posts.urls'))
+    path('api/accounts/', include('accounts.urls')),
+    path('api/', include('posts.urls')),
     path('api/notifications/', include('notifications.urls')),
 ]
 #Serve media files in development